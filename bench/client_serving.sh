@@ -0,0 +1,60 @@
+#!/usr/bin/env bash
+# Compares the ways of serving the Flask client under the README's xargs workload, scaled down to one machine.
+# Starts a local server, then the client in every serving mode in turn, and prints the wall time of each run.
+# Run from anywhere: bench/client_serving.sh. The parameters below can be overridden from the environment.
+set -euo pipefail
+
+REQUESTS=${REQUESTS:-40}            # HTTP requests per run
+PARALLEL=${PARALLEL:-20}            # Requests in parallel, the simulated users
+RUNS=${RUNS:-2}                     # Runs per serving mode
+ITERATIONS=${ITERATIONS:-1000}      # Random positions per request
+FIBO_START=${FIBO_START:-800}
+FIBO_END=${FIBO_END:-10000}
+SERVER=${SERVER:-grpc-server}       # grpc-server or grpc-server-async
+SERVER_WORKERS=${SERVER_WORKERS:-4} # WORKERS of the server
+
+ROOT=$(cd "$(dirname "$0")/.." && pwd)
+URL="http://127.0.0.1:5000/fibonacci/random?iterations=${ITERATIONS}&output=false&fibo_start=${FIBO_START}&fibo_end=${FIBO_END}"
+pids=()
+
+cleanup() {
+    for pid in "${pids[@]}"; do
+        kill "$pid" 2>/dev/null || true
+    done
+    wait 2>/dev/null || true
+}
+trap cleanup EXIT
+
+wait_for() {
+    for _ in $(seq 1 100); do
+        curl -s -o /dev/null "$1" && return 0
+        sleep 0.2
+    done
+    echo "Timed out waiting for $1" >&2
+    exit 1
+}
+
+bench() {
+    local name=$1
+    shift
+    (cd "$ROOT/grpc-client/src" && exec env "$@" >/dev/null 2>&1) &
+    local client=$!
+    wait_for http://127.0.0.1:5000/metrics
+    for run in $(seq 1 "$RUNS"); do
+        TIMEFORMAT="${name}, run ${run}: %R sec"
+        time (seq 1 "$REQUESTS" | xargs -I{} -P"$PARALLEL" curl -s -o /dev/null "$URL")
+    done
+    kill "$client"
+    wait "$client" 2>/dev/null || true
+    # Let the port go before the next mode binds it
+    sleep 1
+}
+
+(cd "$ROOT/$SERVER/src" && WORKERS=$SERVER_WORKERS METRICS_PORT=8000 exec python main.py >/dev/null 2>&1) &
+pids+=($!)
+wait_for http://127.0.0.1:8000/metrics
+
+bench "Flask development server" python main.py
+bench "gunicorn, 1 worker with 16 threads" WORKERS=1 THREADS=16 gunicorn -c gunicorn.conf.py main:app
+bench "gunicorn, 2 workers with 16 threads" WORKERS=2 THREADS=16 gunicorn -c gunicorn.conf.py main:app
+bench "gunicorn, 1 worker with 1 thread" WORKERS=1 THREADS=1 gunicorn -c gunicorn.conf.py main:app
@@ -1,16 +1,20 @@
 from aiohttp import web
-from modules.grpc_client_round_robin import handle_increment, handle_fibonacci, handle_fibonacci_random
+from modules.grpc_client_round_robin import handle_metrics, handle_increment, handle_fibonacci, handle_fibonacci_random, handle_fibonacci_range, grpc_error_middleware, close_grpc_channel
 
 async def create_app():
-    app = web.Application()
+    app = web.Application(middlewares=[grpc_error_middleware])
 
     app.add_routes([
+        web.get('/metrics', handle_metrics),
         web.get('/increment', handle_increment),
         web.get('/fibonacci', handle_fibonacci),
-        web.get('/fibonacci/random', handle_fibonacci_random)
+        web.get('/fibonacci/random', handle_fibonacci_random),
+        web.get('/fibonacci/range', handle_fibonacci_range)
     ])
+    app.on_cleanup.append(close_grpc_channel)
     return app
 
 if __name__ == '__main__':
     app = create_app()
-    web.run_app(app, host='0.0.0.0', port=5000)
+    # Cancel the handler when the HTTP caller disconnects, which cancels its in-flight gRPC calls on the server too
+    web.run_app(app, host='0.0.0.0', port=5000, handler_cancellation=True)
@@ -0,0 +1,366 @@
+import time
+import random
+import asyncio
+import itertools
+import functools
+import grpc
+from prometheus_client import Counter, Gauge
+
+pool_in_flight = Gauge('client_channel_pool_in_flight', 'Number of gRPC calls in flight per pooled channel', ['slot'])
+pool_recycles = Counter('client_channel_pool_recycles_total', 'Total number of pooled gRPC channels replaced by a new connection')
+backend_in_flight = Gauge('client_backend_in_flight', 'Number of gRPC calls in flight per backend', ['backend'])
+backend_work = Gauge('client_backend_work', 'Estimated work of the gRPC calls in flight per backend', ['backend'])
+
+# How a channel is picked for each call
+POLICIES = ('round_robin', 'least_busy')
+
+
+def estimate_work(request):
+    """Estimate the work of a call from its request, the same way the server's admission control does.
+
+    Args:
+        request: The request message, or the request iterator of a client-streaming call.
+
+    Returns:
+        int: `n` for a single position, the largest `n` plus the number of positions for a batch,
+        the `end` of a range, and 1 for anything else.
+    """
+    n = getattr(request, 'n', None)
+    if n is None:
+        return max(getattr(request, 'end', 1), 1)
+    if isinstance(n, int):
+        return max(n, 1)
+    return max(n, default=0) + len(n)
+
+
+class _PooledChannel(grpc.aio.UnaryUnaryClientInterceptor, grpc.aio.UnaryStreamClientInterceptor,
+                     grpc.aio.StreamUnaryClientInterceptor, grpc.aio.StreamStreamClientInterceptor):
+    """One channel of a pool or balancer, counting its calls and their estimated work in flight through a client interceptor.
+
+    A retired channel takes no new calls and is closed once its last call has finished,
+    so recycling a connection never cancels a call. A channel is reserved from the moment it
+    is picked, before the interceptor runs on the event loop, until the call is done, so it
+    cannot be closed in between.
+
+    Attributes:
+        channel (grpc.aio.Channel): The channel the calls are made on.
+        multi_callables (dict): The stub methods already created on `channel`.
+        in_flight (int): The number of calls started and not yet finished.
+        work (int): The estimated work of the calls in flight, see `estimate_work`.
+        expires (float): The `time.monotonic()` after which the channel is replaced, or None.
+    """
+
+    def __init__(self, create_channel, in_flight_gauge, max_age=0, work_gauge=None):
+        self._gauge = in_flight_gauge
+        self._work_gauge = work_gauge
+        self._closing = None
+        self.channel = create_channel(interceptors=[self])
+        self.multi_callables = {}
+        self.in_flight = 0
+        self.work = 0
+        self.retired = False
+        self._reserved = 0
+        # Jittered, so the channels of the pool do not all reconnect at the same moment
+        self.expires = time.monotonic() + max_age * random.uniform(0.8, 1.2) if max_age > 0 else None
+
+    async def _intercept(self, continuation, client_call_details, request):
+        work = estimate_work(request)
+        self.in_flight += 1
+        self.work += work
+        self._gauge.inc()
+        if self._work_gauge is not None:
+            self._work_gauge.inc(work)
+        try:
+            call = await continuation(client_call_details, request)
+        except BaseException:
+            self._finished(work)
+            raise
+        call.add_done_callback(lambda call: self._finished(work))
+        return call
+
+    intercept_unary_unary = intercept_unary_stream = intercept_stream_unary = intercept_stream_stream = _intercept
+
+    def _finished(self, work):
+        self._gauge.dec()
+        if self._work_gauge is not None:
+            self._work_gauge.dec(work)
+        self.in_flight -= 1
+        self.work -= work
+        if self._unused():
+            self.close()
+
+    def _unused(self):
+        return self.retired and self.in_flight == 0 and self._reserved == 0
+
+    def reserve(self):
+        """Reserve the channel for a call about to be started on it.
+
+        Returns:
+            bool: False if the channel is retired and must not be used.
+        """
+        if self.retired:
+            return False
+        self._reserved += 1
+        return True
+
+    def release(self):
+        """End a reservation once its call is done or failed to start."""
+        self._reserved -= 1
+        if self._unused():
+            self.close()
+
+    def close(self):
+        """Close the channel in the background, cancelling its calls."""
+        if self._closing is None:
+            self._closing = asyncio.get_running_loop().create_task(self.channel.close())
+
+    def retire(self):
+        """Stop handing out the channel and close it once its calls have finished."""
+        self.retired = True
+        if self._unused():
+            self.close()
+
+
+class _PooledMultiCallable:
+    """A stub method of a pool or balancer that picks a channel for every call."""
+
+    def __init__(self, pool, kind, method, request_serializer, response_deserializer):
+        self._pool = pool
+        self._key = (kind, method, request_serializer, response_deserializer)
+
+    def __call__(self, *args, **kwargs):
+        pooled, multi_callable = self._pool._multi_callable(self._key)
+        try:
+            call = multi_callable(*args, **kwargs)
+        except BaseException:
+            pooled.release()
+            raise
+        # The interceptor only runs once the event loop gets to it, so the reservation lasts until the call is done
+        call.add_done_callback(lambda _: pooled.release())
+        return call
+
+
+class _MultiChannel:
+    """Several `_PooledChannel`s used like one channel; subclasses pick and reserve the channel of every call in `_pick`."""
+
+    def _pick(self):
+        raise NotImplementedError
+
+    def _multi_callable(self, key):
+        pooled = self._pick()
+        multi_callable = pooled.multi_callables.get(key)
+        if multi_callable is None:
+            kind, method, request_serializer, response_deserializer = key
+            multi_callable = pooled.multi_callables[key] = getattr(pooled.channel, kind)(
+                method, request_serializer=request_serializer, response_deserializer=response_deserializer
+            )
+        return pooled, multi_callable
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'unary_unary', method, request_serializer, response_deserializer)
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'unary_stream', method, request_serializer, response_deserializer)
+
+    def stream_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'stream_unary', method, request_serializer, response_deserializer)
+
+    def stream_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'stream_stream', method, request_serializer, response_deserializer)
+
+
+class ChannelPool(_MultiChannel):
+    """A pool of independent gRPC channels, each with its own HTTP/2 connection, used like one channel.
+
+    gRPC shares one connection between channels to the same target by default. Every channel
+    of the pool is created with `grpc.use_local_subchannel_pool`, so `size` channels open `size`
+    connections, and a ClusterIP service lets kube-proxy place each of them on a pod of its own
+    choice. A stub created on the pool picks a channel for every call, round-robin or the one
+    with the fewest calls in flight. A channel older than `max_age` seconds is replaced by a new
+    one when it is next picked, so the connections are periodically re-placed across the pods,
+    including pods that were added after the client started. Channels are created on first use,
+    inside the event loop that serves the requests.
+
+    Attributes:
+        size (int): The number of channels.
+        policy (str): `round_robin` or `least_busy`.
+        max_age (float): The seconds after which a channel is recycled, 0 to never recycle.
+    """
+
+    def __init__(self, create_channel, size=1, policy='round_robin', max_age=0):
+        """Initialize the pool without opening any channel yet.
+
+        Args:
+            create_channel (callable): Creates one channel, called with the channel options and interceptors to add.
+            size (int, optional): The number of channels (default is 1).
+            policy (str, optional): `round_robin` or `least_busy` (default is `round_robin`).
+            max_age (float, optional): The seconds after which a channel is recycled, 0 to never recycle (default is 0).
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown channel pool policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.size = max(size, 1)
+        self.policy = policy
+        self.max_age = max_age
+        self._create_channel = create_channel
+        self._slots = [None] * self.size
+        self._next = itertools.count()
+
+    def _pick(self):
+        offset = next(self._next) % self.size
+        if self.policy == 'least_busy':
+            # Ties go round-robin, so an idle pool still uses all of its connections
+            slot = min(range(self.size), key=lambda i: (self._slots[i].in_flight if self._slots[i] else 0, (i - offset) % self.size))
+        else:
+            slot = offset
+        pooled = self._slots[slot]
+        if pooled is not None and pooled.expires is not None and time.monotonic() >= pooled.expires:
+            pooled.retire()
+            pooled = None
+            pool_recycles.inc()
+        if pooled is None:
+            pooled = self._slots[slot] = _PooledChannel(
+                functools.partial(self._create_channel, options=[('grpc.use_local_subchannel_pool', 1)]), pool_in_flight.labels(slot=str(slot)), self.max_age,
+            )
+        pooled.reserve()
+        return pooled
+
+    async def close(self):
+        """Close every channel of the pool, cancelling their calls."""
+        slots, self._slots = self._slots, [None] * self.size
+        await asyncio.gather(*(pooled.channel.close() for pooled in slots if pooled is not None))
+
+
+class _Backends:
+    """One channel per backend address, shared by the calls to that backend.
+
+    The addresses are resolved again every `resolve_interval` seconds in a background task;
+    channels of removed backends are closed once their calls have finished. While nothing
+    resolves, the known backends are kept, or `fallback_address` is used if there are none yet.
+
+    Attributes:
+        resolve_interval (float): The seconds between two resolutions of the backend addresses.
+    """
+
+    def __init__(self, resolve, create_channel, fallback_address, resolve_interval=30):
+        """Initialize the backends without resolving or connecting yet.
+
+        Args:
+            resolve (callable): Coroutine function returning the current `host:port` backend addresses, or an empty list if resolution fails.
+            create_channel (callable): Creates the channel to one address, called with the address and the interceptors to add.
+            fallback_address (str): The address used as the only backend while nothing resolves.
+            resolve_interval (float, optional): The seconds between two resolutions (default is 30).
+        """
+        self.resolve_interval = resolve_interval
+        self._resolve = resolve
+        self._create_channel = create_channel
+        self._fallback_address = fallback_address
+        self._backends = {}
+        self._candidates = []
+        self._next_resolve = 0
+        self._resolving = None
+
+    def _update(self, addresses):
+        if not addresses:
+            # Keep the known backends while DNS fails
+            if self._backends:
+                return
+            addresses = [self._fallback_address]
+        for address in set(self._backends) - set(addresses):
+            self._backends.pop(address).retire()
+        for address in addresses:
+            if address not in self._backends:
+                self._backends[address] = _PooledChannel(
+                    functools.partial(self._create_channel, address), backend_in_flight.labels(backend=address), work_gauge=backend_work.labels(backend=address),
+                )
+        self._candidates = list(self._backends.values())
+
+    async def _refresh(self):
+        try:
+            self._update(await self._resolve())
+        finally:
+            self._next_resolve = time.monotonic() + self.resolve_interval
+            self._resolving = None
+
+    def _refresh_if_due(self):
+        if self._resolving is None and time.monotonic() >= self._next_resolve:
+            self._resolving = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def close(self):
+        """Close every backend channel, cancelling their calls."""
+        if self._resolving is not None:
+            self._resolving.cancel()
+        backends, self._backends, self._candidates = self._backends, {}, []
+        await asyncio.gather(*(pooled.channel.close() for pooled in backends.values()))
+
+
+class P2CBalancer(_Backends, _MultiChannel):
+    """A client-side balancer over one channel per backend address, used like one channel.
+
+    Every call goes to the less loaded of two randomly chosen backends (power of two choices),
+    where the load of a backend is the estimated work of its calls in flight, then their number.
+    Unlike gRPC's `round_robin`, a backend still busy with a few large `n` gets fewer new calls,
+    while sampling two instead of scanning all keeps herds of clients from piling on the same
+    least-loaded backend. The addresses are resolved again every `resolve_interval` seconds in
+    a background task, so picking a channel never waits for DNS; until the first resolution
+    has finished, calls go to `fallback_address`. Channels of removed backends are closed once
+    their calls have finished.
+    """
+
+    def _pick(self):
+        self._refresh_if_due()
+        if not self._candidates:
+            # Serve the first calls through the fallback address while the first resolution runs
+            self._update([])
+        candidates = self._candidates
+        if len(candidates) == 1:
+            pooled = candidates[0]
+        else:
+            first, second = random.sample(candidates, 2)
+            pooled = first if (first.work, first.in_flight) <= (second.work, second.in_flight) else second
+        # Picking and retiring both run on the event loop, so a candidate is never retired here
+        pooled.reserve()
+        return pooled
+
+
+class BackendChannels(_Backends):
+    """One long-lived channel per backend address, for calls that must reach every backend.
+
+    A FibonacciStream is pinned to the backend its channel connects to, so the `stream`
+    transport starts one stream per backend through `start_calls` instead of balancing each
+    call. The channels are kept across requests and the addresses are resolved again every
+    `resolve_interval` seconds in the background; only the first request waits for DNS.
+    """
+
+    async def start_calls(self, start):
+        """Start one call per current backend.
+
+        Args:
+            start (callable): Starts the call on a channel, called with the channel, the index of the backend and the number of backends.
+
+        Returns:
+            list: The started calls, in backend order.
+        """
+        self._refresh_if_due()
+        if not self._candidates and self._resolving is not None:
+            # Shielded, so a cancelled request does not cancel the resolution shared with the others
+            await asyncio.shield(self._resolving)
+        if not self._candidates:
+            self._update([])
+        # Reserving and retiring both run on the event loop, so every candidate is reserved
+        candidates = self._candidates
+        for pooled in candidates:
+            pooled.reserve()
+        calls = []
+        try:
+            for index, pooled in enumerate(candidates):
+                call = start(pooled.channel, index, len(candidates))
+                calls.append(call)
+                # The interceptor only runs once the event loop gets to it, so the reservation lasts until the call is done
+                call.add_done_callback(lambda _, pooled=pooled: pooled.release())
+        except BaseException:
+            for pooled in candidates[len(calls):]:
+                pooled.release()
+            for call in calls:
+                call.cancel()
+            raise
+        return calls
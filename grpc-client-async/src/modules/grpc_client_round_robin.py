@@ -1,102 +1,609 @@
 import os
+import sys
+import time
+import socket
+import asyncio
+import contextlib
 from aiohttp import web
 import grpc
 import random
+import orjson
+from collections import Counter
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from modules.proto import fibonacci_pb2, fibonacci_pb2_grpc
-from modules.logger import get_logger
+from modules.logger import get_logger, RequestLogSampler
+from modules.channel_pool import ChannelPool, P2CBalancer, BackendChannels
+from modules.response_cache import ResponseCache, rpcs_saved
+from modules.service_config import build_service_config, channel_options, hedging_policies
+from modules.hedging import HedgingChannel
+
+# The `value` field is always a decimal string, whatever the size of the number
+sys.set_int_max_str_digits(0)
 
 logger = get_logger(__name__, log_level="INFO")
+# Samples the per-request log lines of every route and logs periodic summaries
+request_logs = {route: RequestLogSampler(logger, route) for route in ('/increment', '/fibonacci', '/fibonacci/random', '/fibonacci/range')}
 headless_service_dns = os.environ.get('SERVER_NAME', 'localhost')
 grpc_server_port = os.environ.get('SERVER_PORT', '50051')
 grpc_server_svc_type = os.environ.get('GRPC_SERVER_SVC_TYPE', 'normal')
 workers = int(os.environ.get('WORKERS', '1'))
+batch_size = int(os.environ.get('BATCH_SIZE', '100'))
+grpc_timeout_ms = int(os.environ.get('GRPC_TIMEOUT_MS', '0'))
+# Fibonacci responses by position and encoding, reused across requests; CLIENT_CACHE_MAX_BYTES=0 disables the cache
+response_cache = ResponseCache(max_bytes=int(os.environ.get('CLIENT_CACHE_MAX_BYTES', '0')), ttl=float(os.environ.get('CLIENT_CACHE_TTL_S', '0')))
+# Retry, hedging, timeout and throttling settings of the FibonacciService calls, see modules.service_config
+service_config = build_service_config()
+# Compression of the request messages on every channel; responses are compressed as the server chooses
+grpc_compressions = {
+    'none': grpc.Compression.NoCompression,
+    'deflate': grpc.Compression.Deflate,
+    'gzip': grpc.Compression.Gzip,
+}
+grpc_compression_name = os.environ.get('GRPC_COMPRESSION', 'none')
+if grpc_compression_name not in grpc_compressions:
+    raise ValueError(f"Unknown GRPC_COMPRESSION {grpc_compression_name!r}, expected one of {', '.join(grpc_compressions)}")
+grpc_compression = grpc_compressions[grpc_compression_name]
+grpc_http_statuses = {
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 503,
+    grpc.StatusCode.OUT_OF_RANGE: 400,
+}
 
-async def create_grpc_channel():
+def create_grpc_channel(options=(), interceptors=None):
     """
-    Create and return a gRPC channel.
+    Create and return a gRPC channel to `SERVER_NAME:SERVER_PORT`.
 
     Args:
-        headless_service_dns (str): The DNS of the headless service to connect to.
-        grpc_server_port (str): The port on which the gRPC server is running.
+        options (list, optional): Additional channel options (default is none).
+        interceptors (list, optional): The client interceptors of the channel (default is none).
 
     Returns:
         grpc.aio.Channel: The created gRPC channel.
     """
     if grpc_server_svc_type == "normal":
         target_uri = f'{headless_service_dns}:{grpc_server_port}'
-        channel = grpc.aio.insecure_channel(target_uri)
-        logger.debug(f"Created gRPC channel with normal Kubernetes svc to target: {target_uri}")
+        channel = grpc.aio.insecure_channel(target_uri, options=[*channel_options(service_config), *options], compression=grpc_compression, interceptors=interceptors)
+        logger.debug("Created gRPC channel with normal Kubernetes svc to target: %s", target_uri)
         return channel
     elif grpc_server_svc_type == "headless":
         target_uri = f'dns:///{headless_service_dns}:{grpc_server_port}'
         channel = grpc.aio.insecure_channel(target_uri, options=[
-            ('grpc.lb_policy_name', 'round_robin')
-        ])
-        logger.debug(f"Created gRPC channel with round-robin load balancing to target: {target_uri}")
+            ('grpc.lb_policy_name', 'round_robin'),
+            *channel_options(service_config),
+            *options,
+        ], compression=grpc_compression, interceptors=interceptors)
+        logger.debug("Created gRPC channel with round-robin load balancing to target: %s", target_uri)
         return channel
 
+async def close_grpc_channel(app):
+    """
+    Close the shared channel pool or balancer and the stream backend channels when the application shuts down.
+
+    Args:
+        app (web.Application): The application being cleaned up.
+    """
+    await asyncio.gather(channel.close(), stream_backends.close())
+
+async def resolve_backends():
+    """
+    Resolve the addresses of the gRPC server pods behind the headless service.
+
+    Returns:
+        list: The sorted `host:port` addresses, or an empty list outside of headless mode or if resolution fails.
+    """
+    if grpc_server_svc_type != "headless":
+        return []
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(headless_service_dns, grpc_server_port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        logger.warning("Could not resolve gRPC backends of %s", headless_service_dns)
+        return []
+    return sorted({f'[{info[4][0]}]:{grpc_server_port}' if info[0] == socket.AF_INET6 else f'{info[4][0]}:{grpc_server_port}' for info in infos})
+
+def create_channel():
+    """
+    Create the channel-like object shared by all requests.
+
+    In headless mode with `GRPC_BALANCER=p2c`, a P2CBalancer keeps one channel per resolved
+    server pod and sends every call to the less loaded of two of them. Otherwise every call
+    picks one of `GRPC_CHANNEL_POOL_SIZE` connections, each replaced after about
+    `GRPC_CHANNEL_MAX_AGE_S` seconds, and headless mode balances with gRPC's `round_robin`.
+    With a hedging policy in the service config, both are wrapped in a HedgingChannel.
+
+    Returns:
+        ChannelPool, P2CBalancer or HedgingChannel: The object to create stubs on.
+    """
+    if grpc_server_svc_type == "headless" and os.environ.get('GRPC_BALANCER', 'round_robin') == 'p2c':
+        channel = P2CBalancer(
+            resolve_backends,
+            lambda address, interceptors: grpc.aio.insecure_channel(address, options=channel_options(service_config), compression=grpc_compression, interceptors=interceptors),
+            fallback_address=f'{headless_service_dns}:{grpc_server_port}',
+            resolve_interval=float(os.environ.get('GRPC_BALANCER_RESOLVE_INTERVAL_S', 30)),
+        )
+    else:
+        channel = ChannelPool(
+            create_grpc_channel,
+            size=int(os.environ.get('GRPC_CHANNEL_POOL_SIZE', 1)),
+            policy=os.environ.get('GRPC_CHANNEL_POOL_POLICY', 'round_robin'),
+            max_age=float(os.environ.get('GRPC_CHANNEL_MAX_AGE_S', 0)),
+        )
+    policies = hedging_policies(service_config)
+    if policies:
+        return HedgingChannel(channel, policies, budget_percent=float(os.environ.get('GRPC_HEDGING_BUDGET_PERCENT', 10)))
+    return channel
+
+# Shared by all requests, created before the event loop runs; channels are only opened on first use inside it
+channel = create_channel()
+
+# One long-lived channel per server pod for the streams, resolved again in the background
+stream_backends = BackendChannels(
+    resolve_backends,
+    lambda address, interceptors: grpc.aio.insecure_channel(address, options=channel_options(service_config), compression=grpc_compression, interceptors=interceptors),
+    fallback_address=f'{headless_service_dns}:{grpc_server_port}',
+    resolve_interval=float(os.environ.get('GRPC_BALANCER_RESOLVE_INTERVAL_S', 30)),
+)
+
+def ndjson_line(obj):
+    """
+    Encode one NDJSON line with orjson.
+
+    Args:
+        obj (dict): The object to encode.
+
+    Returns:
+        bytes: The JSON encoding of `obj` followed by a newline.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+def cached_fibonacci(n, encoding):
+    """
+    Return the cached response for F(n) in the given encoding.
+
+    Args:
+        n (int): The Fibonacci position.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+
+    Returns:
+        tuple: The server name and the message carrying the value, or None on a miss or if the cache is disabled.
+    """
+    if response_cache.max_bytes <= 0:
+        return None
+    return response_cache.get((n, encoding))
+
+def cache_fibonacci(n, encoding, server_name, message):
+    """
+    Cache a received response for F(n), sized by the serialized size of its message.
+
+    Args:
+        n (int): The Fibonacci position.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+        server_name (str): The server that calculated the value.
+        message: The FibonacciResponse or FibonacciValue carrying the value.
+    """
+    if response_cache.max_bytes > 0:
+        response_cache.put((n, encoding), (server_name, message), message.ByteSize() + len(server_name))
+
+async def collapse_duplicates(ns, encoding, fetch):
+    """
+    Yield the response for every position of `ns` while requesting each distinct, uncached position only once.
+
+    Cached positions are taken from the response cache and the remaining ones are passed to
+    `fetch` in order of their first occurrence. A response needed again later in the request
+    is kept until its last occurrence has been yielded, and every received response is cached.
+
+    Args:
+        ns (list): The positions, possibly with duplicates.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+        fetch (callable): Takes the positions to request and yields one list of `(n, server_name, message)`
+            tuples per completed call, in request order.
+
+    Yields:
+        tuple: The server name, the position `n` and the message carrying its value, in the order of `ns`.
+    """
+    remaining = Counter(ns)
+    known = {}
+    misses = []
+    for n in remaining:
+        cached = cached_fibonacci(n, encoding)
+        if cached is None:
+            misses.append(n)
+        else:
+            known[n] = cached
+    saved_by_cache = sum(remaining[n] for n in known)
+    if saved_by_cache:
+        rpcs_saved.labels(reason='cache').inc(saved_by_cache)
+    if len(ns) - saved_by_cache > len(misses):
+        rpcs_saved.labels(reason='duplicate').inc(len(ns) - saved_by_cache - len(misses))
+
+    results = fetch(misses)
+    try:
+        for n in ns:
+            while n not in known:
+                for received_n, server_name, message in await anext(results):
+                    cache_fibonacci(received_n, encoding, server_name, message)
+                    known[received_n] = (server_name, message)
+            server_name, message = known[n]
+            yield server_name, n, message
+            remaining[n] -= 1
+            if not remaining[n]:
+                del known[n]
+    finally:
+        await results.aclose()
+
+async def merge_streams(calls):
+    """
+    Read several response streams concurrently and yield their responses as they arrive.
+
+    One task per call puts the responses into a queue with room for one response per call,
+    so a consumer slower than the servers holds back the readers, and gRPC flow control the
+    servers, instead of buffering the streams in memory. All readers and calls are cancelled
+    when the merge ends, also when one call failed or the HTTP caller disconnected.
+
+    Args:
+        calls (list): The streaming calls, such as the calls returned by `stub.FibonacciStream(...)`.
+
+    Yields:
+        tuple: The index of the call in `calls` and its response. Raises the grpc.aio.AioRpcError of the first failed call.
+    """
+    buffered = asyncio.Queue(maxsize=max(len(calls), 1))
+
+    async def read(index, call):
+        try:
+            async for response in call:
+                await buffered.put((index, response, None))
+        except Exception as error:
+            await buffered.put((index, None, error))
+            return
+        await buffered.put((index, None, None))
+
+    readers = [asyncio.create_task(read(index, call)) for index, call in enumerate(calls)]
+    try:
+        running = len(calls)
+        while running:
+            index, response, error = await buffered.get()
+            if error is not None:
+                raise error
+            if response is None:
+                running -= 1
+                continue
+            yield index, response
+    finally:
+        for reader in readers:
+            reader.cancel()
+        for call in calls:
+            call.cancel()
+
+async def fibonacci_random_results(stub, transport, iterations, fibo_start, fibo_end, encoding, chunk_size, timeout):
+    """
+    Calculate the Fibonacci values of the `/fibonacci/random` route and yield them as they are received.
+
+    Unary calls and batch RPCs are awaited one after the other. Their positions are drawn up
+    front, so duplicates and positions in the response cache are answered without a call, see
+    `collapse_duplicates`. With `transport=stream` one stream per resolved backend generates its
+    requests as gRPC sends them, and the streams are read concurrently, see `merge_streams`.
+    Memory therefore does not grow with the number of values as long as the caller consumes
+    the results as they come.
+
+    Args:
+        stub (fibonacci_pb2_grpc.FibonacciServiceStub): The gRPC stub for unary and batch calls.
+        transport (str): `unary`, `batch` or `stream`.
+        iterations (int): The number of random positions.
+        fibo_start (int): The smallest random position.
+        fibo_end (int): The largest random position.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+        chunk_size (int): The number of positions per FibonacciBatch RPC.
+        timeout (float): The deadline of every gRPC call in seconds, or None.
+
+    Yields:
+        tuple: The server name, the position `n` and the message carrying its value.
+    """
+    if transport == 'stream':
+        # One stream per resolved backend, each generates its share of the requests as gRPC sends them
+        def start_stream(stream_channel, offset, count):
+            return fibonacci_pb2_grpc.FibonacciServiceStub(stream_channel).FibonacciStream((
+                fibonacci_pb2.FibonacciStreamRequest(id=i, n=random.randint(fibo_start, fibo_end), encoding=encoding)
+                for i in range(offset, iterations, count)
+            ), timeout=timeout)
+        if grpc_server_svc_type == "headless":
+            calls = await stream_backends.start_calls(start_stream)
+        else:
+            calls = [start_stream(channel, 0, 1)]
+        # The initial metadata of a call has arrived once its first response has
+        server_names = {}
+        counts = Counter()
+        # Closed explicitly, so the readers stop as soon as the HTTP caller disconnects
+        async with contextlib.aclosing(merge_streams(calls)) as responses:
+            async for index, response in responses:
+                if index not in server_names:
+                    server_names[index] = (await calls[index].initial_metadata()).get('server-name', '')
+                counts[index] += 1
+                yield server_names[index], response.n, response
+        for index, count in counts.items():
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Values for %s positions over a stream", server_names[index], count)
+        return
+
+    async def fetch_batches(misses):
+        for i in range(0, len(misses), chunk_size):
+            chunk = misses[i:i + chunk_size]
+            response = await stub.FibonacciBatch(fibonacci_pb2.FibonacciBatchRequest(n=chunk, encoding=encoding), timeout=timeout)
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Values for %s positions", response.server_name, len(chunk))
+            yield [(value.n, response.server_name, value) for value in response.values]
+
+    async def fetch_unary(misses):
+        for n in misses:
+            response = await stub.Fibonacci(fibonacci_pb2.FibonacciRequest(n=n, encoding=encoding), timeout=timeout)
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Value for n=%s", response.server_name, n)
+            yield [(n, response.server_name, response)]
+
+    ns = [random.randint(fibo_start, fibo_end) for _ in range(iterations)]
+    results = collapse_duplicates(ns, encoding, fetch_batches if transport == 'batch' else fetch_unary)
+    try:
+        async for result in results:
+            yield result
+    finally:
+        await results.aclose()
+
+def call_timeout(request):
+    """
+    Return the deadline of the gRPC calls made for an HTTP request.
+
+    The `timeout_ms` query parameter overrides the `GRPC_TIMEOUT_MS` environment variable; 0 means no deadline.
+    The server stops computing once the deadline expires.
+
+    Args:
+        request (web.Request): The request object.
+
+    Returns:
+        float: The timeout in seconds, or None.
+    """
+    timeout_ms = int(request.query.get('timeout_ms', grpc_timeout_ms))
+    return timeout_ms / 1000 if timeout_ms > 0 else None
+
+@web.middleware
+async def grpc_error_middleware(request, handler):
+    """
+    Turn a failed gRPC call into a JSON error response.
+
+    Expired deadlines become `504`, rejections by the server's admission control `503`, values too large
+    for the requested encoding `400` and anything else `502`.
+
+    Args:
+        request (web.Request): The request object.
+        handler: The request handler.
+
+    Returns:
+        web.StreamResponse: The handler's response, or a JSON response containing the gRPC status code and details.
+    """
+    try:
+        return await handler(request)
+    except grpc.aio.AioRpcError as error:
+        logger.warning("gRPC call failed with %s: %s", error.code().name, error.details())
+        return web.json_response({'error': error.code().name, 'details': error.details()}, status=grpc_http_statuses.get(error.code(), 502))
+
+value_encodings = {
+    'decimal': fibonacci_pb2.VALUE_ENCODING_DECIMAL,
+    'hex': fibonacci_pb2.VALUE_ENCODING_HEX,
+    'bytes': fibonacci_pb2.VALUE_ENCODING_BYTES_LE,
+}
+
+def value_encoding(request):
+    """
+    Return the wire encoding selected by the `encoding` query parameter (default is `bytes`).
+
+    Args:
+        request (web.Request): The request object.
+
+    Returns:
+        fibonacci_pb2.ValueEncoding: The encoding to request from the server.
+
+    Raises:
+        web.HTTPBadRequest: If the encoding is not one of `value_encodings`, with a JSON body.
+    """
+    name = request.query.get('encoding', 'bytes')
+    if name not in value_encodings:
+        details = f"Unknown encoding {name!r}, expected one of {', '.join(value_encodings)}"
+        raise web.HTTPBadRequest(text=orjson.dumps({'error': 'INVALID_ARGUMENT', 'details': details}).decode(), content_type='application/json')
+    return value_encodings[name]
+
+def decode_fibonacci_value(response, encoding):
+    """
+    Decode the Fibonacci value of a gRPC response into a decimal string.
+
+    Only called when the value is returned to the HTTP caller, so the int-to-decimal
+    conversion is skipped entirely when `output=false`.
+
+    Args:
+        response (fibonacci_pb2.FibonacciResponse): The gRPC response.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+
+    Returns:
+        str: The Fibonacci value as a decimal string.
+    """
+    if encoding == fibonacci_pb2.VALUE_ENCODING_DECIMAL:
+        return response.value
+    if encoding == fibonacci_pb2.VALUE_ENCODING_BYTES_LE:
+        value = int.from_bytes(response.raw_value, 'little')
+    else:
+        value = int(response.value, 16)
+    return str(value)
+
+async def handle_metrics(request):
+    """
+    Handle a Prometheus scrape.
+
+    Args:
+        request (web.Request): The request object.
+
+    Returns:
+        web.Response: The metrics of this process in the Prometheus text exposition format.
+    """
+    return web.Response(body=generate_latest(), headers={'Content-Type': CONTENT_TYPE_LATEST})
+
 async def handle_increment(request):
     """
-    Handle increment request by calling the Increment method of the gRPC service.
+    Handle increment request by calling the IncrementBy method of the gRPC service.
+
+    The `iterations` consecutive counter values are reserved in a single round trip
+    instead of one Increment call per value. With `format=ndjson` one NDJSON line is
+    streamed per value instead of building the whole JSON list. With `iterations` of 0 or
+    less nothing is reserved and the list is empty.
 
     Args:
         request (web.Request): The request object.
 
     Returns:
-        web.Response: The JSON response containing the server name and incremented number.
+        web.StreamResponse: The JSON response or NDJSON stream containing the server name and one entry per reserved number.
     """
+    start = time.perf_counter()
     pod_name = request.query.get('pod_name', 'client')
     iterations = int(request.query.get('iterations', '1'))
-    channel = await create_grpc_channel()
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
 
-    responses = []
-    for _ in range(iterations):
-        response = await stub.Increment(fibonacci_pb2.IncrementRequest(name=pod_name))
-        responses.append({'server': response.server_name, 'response': response.number})
-        logger.info(f"Server: {response.server_name} Response: {response.number}")
-
-    return web.json_response(responses)
+    if iterations <= 0:
+        # The server reserves one value for a delta of 0, so nothing is reserved without calling it
+        if request.query.get('format', 'json') == 'ndjson':
+            return web.Response(body=b'', content_type='application/x-ndjson')
+        return web.json_response([])
+    response = await stub.IncrementBy(fibonacci_pb2.IncrementByRequest(name=pod_name, delta=iterations), timeout=call_timeout(request))
+    if request_logs['/increment'].observe(start):
+        logger.info("Server: %s Response: %s..%s", response.server_name, response.first, response.last)
+    if request.query.get('format', 'json') == 'ndjson':
+        stream = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+        await stream.prepare(request)
+        for number in range(response.first, response.last + 1):
+            await stream.write(ndjson_line({'server': response.server_name, 'response': number}))
+        await stream.write_eof()
+        return stream
+    return web.json_response([{'server': response.server_name, 'response': number} for number in range(response.first, response.last + 1)])
 
 async def handle_fibonacci(request):
     """
     Handle Fibonacci request by calling the Fibonacci method of the gRPC service.
 
+    The `encoding` query parameter selects the wire encoding (`decimal`, `hex` or `bytes`, default `bytes`)
+    and `timeout_ms` the deadline of the call. A response found in the client's response cache is
+    returned without a gRPC call.
+
     Args:
         request (web.Request): The request object.
 
     Returns:
         web.Response: The JSON response containing the server name and Fibonacci value.
     """
+    start = time.perf_counter()
     n = int(request.query.get('n', '1'))
-    channel = await create_grpc_channel()
+    encoding = value_encoding(request)
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
 
-    response = await stub.Fibonacci(fibonacci_pb2.FibonacciRequest(n=n))
-    logger.info(f"Server: {response.server_name} Fibonacci Value: {response.value}")
-    return web.json_response({'server': response.server_name, 'value': response.value})
+    cached = cached_fibonacci(n, encoding)
+    if cached is None:
+        response = await stub.Fibonacci(fibonacci_pb2.FibonacciRequest(n=n, encoding=encoding), timeout=call_timeout(request))
+        cache_fibonacci(n, encoding, response.server_name, response)
+        server_name, message = response.server_name, response
+    else:
+        rpcs_saved.labels(reason='cache').inc()
+        server_name, message = cached
+
+    value = decode_fibonacci_value(message, encoding)
+    if request_logs['/fibonacci'].observe(start, n):
+        logger.info("Server: %s Fibonacci Value: %s", server_name, value)
+    return web.json_response({'server': server_name, 'value': value})
 
 async def handle_fibonacci_random(request):
     """
     Handle Fibonacci random request by calling the Fibonacci method of the gRPC service with random values.
 
+    The `output` query parameter controls whether the values are returned; they are only
+    decoded into decimal strings when it is true. The `encoding` query parameter selects the
+    wire encoding (`decimal`, `hex` or `bytes`, default `bytes`). With `transport=batch` the
+    positions are sent in FibonacciBatch RPCs of `batch_size` positions (default is the
+    `BATCH_SIZE` environment variable or 100) instead of one Fibonacci RPC per iteration. With
+    `transport=stream` all requests are pipelined over FibonacciStream, with one stream per
+    resolved backend in headless mode. With the unary and batch transports, every distinct position is
+    requested at most once per request, and not at all if it is in the client's response cache.
+    The `timeout_ms` query parameter sets the deadline of every call.
+    With `format=ndjson` every value is streamed as one NDJSON line as soon as it arrives.
+
     Args:
         request (web.Request): The request object.
 
     Returns:
-        web.Response: The JSON response containing the server name, random number, and Fibonacci value.
+        web.StreamResponse: The JSON response or NDJSON stream containing the server name, random number, and Fibonacci value.
     """
     iterations = int(request.query.get('iterations', '1'))
     fibo_start = int(request.query.get('fibo_start', '1'))
     fibo_end = int(request.query.get('fibo_end', '10'))
-    channel = await create_grpc_channel()
+    response_data = request.query.get('output', 'true').lower() == 'true'
+    encoding = value_encoding(request)
+    transport = request.query.get('transport', 'unary')
+    chunk_size = int(request.query.get('batch_size', batch_size))
+    output_format = request.query.get('format', 'json')
+    timeout = call_timeout(request)
+    stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
+
+    results = fibonacci_random_results(stub, transport, iterations, fibo_start, fibo_end, encoding, chunk_size, timeout)
+    try:
+        if output_format == 'ndjson' and response_data:
+            # Waiting for the first value before the headers are sent turns an early gRPC failure into a regular error response
+            first = await anext(results, None)
+            response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+            await response.prepare(request)
+
+            # Every value is written as soon as it arrives, so memory stays flat for any `iterations`
+            if first:
+                server_name, n, message = first
+                await response.write(ndjson_line({'server': server_name, 'n': n, 'value': decode_fibonacci_value(message, encoding)}))
+            async for server_name, n, message in results:
+                await response.write(ndjson_line({'server': server_name, 'n': n, 'value': decode_fibonacci_value(message, encoding)}))
+            await response.write_eof()
+            return response
+
+        if response_data:
+            return web.json_response([
+                {'server': server_name, 'n': n, 'value': decode_fibonacci_value(message, encoding)}
+                async for server_name, n, message in results
+            ])
+        async for _ in results:
+            pass
+        return web.json_response({"sergeant job done?": "Yes lieutenant!"})
+    finally:
+        await results.aclose()
+
+async def handle_fibonacci_range(request):
+    """
+    Handle Fibonacci range request by re-streaming the FibonacciRange server-streaming RPC.
+
+    The `fibo_start`, `fibo_end` (inclusive) and `step` query parameters select the range and
+    `encoding` the wire encoding, `timeout_ms` the deadline of the whole stream. Every value is written to the HTTP caller as one NDJSON line
+    as soon as it arrives; awaiting each write lets HTTP backpressure pace the gRPC stream.
+
+    Args:
+        request (web.Request): The request object.
+
+    Returns:
+        web.StreamResponse: An NDJSON stream with the server name, the input value `n`, and the Fibonacci value per line.
+    """
+    start = time.perf_counter()
+    fibo_start = int(request.query.get('fibo_start', '1'))
+    fibo_end = int(request.query.get('fibo_end', '10'))
+    step = int(request.query.get('step', '1'))
+    encoding = value_encoding(request)
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
 
-    responses = []
-    for _ in range(iterations):
-        n = random.randint(fibo_start, fibo_end)
-        response = await stub.Fibonacci(fibonacci_pb2.FibonacciRequest(n=n))
-        responses.append({'server': response.server_name, 'n': n, 'value': response.value})
-        logger.info(f"Server: {response.server_name} Fibonacci Value for n={n}")
+    call = stub.FibonacciRange(fibonacci_pb2.FibonacciRangeRequest(start=fibo_start, end=fibo_end, step=step, encoding=encoding), timeout=call_timeout(request))
+    server_name = (await call.initial_metadata()).get('server-name', '')
 
-    return web.json_response(responses)
+    response = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson'})
+    await response.prepare(request)
+    try:
+        async for value in call:
+            await response.write(ndjson_line({'server': server_name, 'n': value.n, 'value': decode_fibonacci_value(value, encoding)}))
+    finally:
+        call.cancel()
+    await response.write_eof()
+    if request_logs['/fibonacci/range'].observe(start):
+        logger.info("Server: %s Fibonacci Values streamed for n=%s..%s", server_name, fibo_start, fibo_end)
+    return response
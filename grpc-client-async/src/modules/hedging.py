@@ -0,0 +1,151 @@
+import asyncio
+import grpc
+from prometheus_client import Counter
+
+hedges_sent = Counter('client_hedges_total', 'Total number of hedged attempts sent after the first attempt of a gRPC call', ['method'])
+hedge_wins = Counter('client_hedge_wins_total', 'Total number of gRPC calls answered by a hedged attempt', ['method'])
+hedges_throttled = Counter('client_hedges_throttled_total', 'Total number of hedged attempts not sent because the hedging budget was spent', ['method'])
+
+
+class HedgeBudget:
+    """Limits hedged attempts to a share of the calls, so hedging cannot multiply the load when all servers are slow.
+
+    Every call adds `percent / 100` tokens, up to `burst`, and every hedged attempt takes one.
+
+    Attributes:
+        percent (float): The hedged attempts allowed per 100 calls.
+        burst (float): The most tokens saved up while calls are fast.
+    """
+
+    def __init__(self, percent, burst=10):
+        self.percent = percent
+        self.burst = burst
+        self._tokens = burst
+
+    def call(self):
+        """Add the tokens of a started call."""
+        self._tokens = min(self.burst, self._tokens + self.percent / 100)
+
+    def spend(self):
+        """Take the token of a hedged attempt.
+
+        Returns:
+            bool: True if the attempt may be sent.
+        """
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class _HedgedMultiCallable:
+    """A stub method whose calls are hedged according to a HedgingPolicy.
+
+    Calling it returns a coroutine with the response instead of a call object.
+    """
+
+    def __init__(self, multi_callable, policy, budget, method):
+        self._multi_callable = multi_callable
+        self._policy = policy
+        self._budget = budget
+        self._method = method
+
+    def __call__(self, request, timeout=None, metadata=None, **kwargs):
+        return self._call(request, timeout, tuple(metadata or ()), kwargs)
+
+    async def _call(self, request, timeout, metadata, kwargs):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout is not None else None
+        attempts = {}
+
+        def start(number):
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            attempt_metadata = metadata + (('hedge-attempt', str(number)),) if number else metadata
+            call = self._multi_callable(request, timeout=remaining, metadata=attempt_metadata or None, **kwargs)
+            attempts[asyncio.ensure_future(call)] = (number, call)
+
+        def hedge(number):
+            if number >= self._policy.max_attempts:
+                return False
+            if not self._budget.spend():
+                hedges_throttled.labels(method=self._method).inc()
+                return False
+            hedges_sent.labels(method=self._method).inc()
+            start(number)
+            return True
+
+        self._budget.call()
+        start(0)
+        started = 1
+        # Cleared once the budget refuses a hedge, so a slow call does not ask again after every delay
+        hedging = True
+        error = None
+        try:
+            while attempts:
+                delay = self._policy.delay if hedging and started < self._policy.max_attempts else None
+                done, _ = await asyncio.wait(attempts, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedging = hedge(started)
+                    started += hedging
+                    continue
+                for task in done:
+                    number, _ = attempts.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if number:
+                            hedge_wins.labels(method=self._method).inc()
+                        return task.result()
+                    if not isinstance(error, grpc.aio.AioRpcError) or error.code() not in self._policy.non_fatal_codes:
+                        raise error
+                    # A non-fatal status code sends the next attempt right away
+                    if hedge(started):
+                        started += 1
+            raise error
+        finally:
+            for task, (_, call) in attempts.items():
+                call.cancel()
+                task.cancel()
+
+
+class HedgingChannel:
+    """Wraps a channel pool or balancer and hedges the calls of the methods with a hedging policy.
+
+    gRPC's C core ignores the `hedgingPolicy` of the service config, so the client applies it
+    itself, following gRFC A6: after `hedgingDelay` without a response, or right after a
+    non-fatal status code, the same request is sent again, up to `maxAttempts` attempts. Hedged
+    attempts carry `hedge-attempt` metadata, and the server stops computing an attempt once it
+    is cancelled. A HedgeBudget caps the hedged attempts at `budget_percent` of the calls.
+    Other methods are passed through unchanged.
+    """
+
+    def __init__(self, channel, policies, budget_percent=10):
+        """Initialize the wrapper.
+
+        Args:
+            channel: The ChannelPool or P2CBalancer the attempts are sent on.
+            policies (dict): The HedgingPolicy keyed by full method name.
+            budget_percent (float, optional): The hedged attempts allowed per 100 calls (default is 10).
+        """
+        self._channel = channel
+        self._policies = policies
+        self._budget = HedgeBudget(budget_percent)
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        multi_callable = self._channel.unary_unary(method, request_serializer=request_serializer, response_deserializer=response_deserializer, **kwargs)
+        policy = self._policies.get(method)
+        if policy is None:
+            return multi_callable
+        return _HedgedMultiCallable(multi_callable, policy, self._budget, method.rsplit('/', 1)[-1])
+
+    def unary_stream(self, *args, **kwargs):
+        return self._channel.unary_stream(*args, **kwargs)
+
+    def stream_unary(self, *args, **kwargs):
+        return self._channel.stream_unary(*args, **kwargs)
+
+    def stream_stream(self, *args, **kwargs):
+        return self._channel.stream_stream(*args, **kwargs)
+
+    async def close(self):
+        """Close the wrapped channel."""
+        await self._channel.close()
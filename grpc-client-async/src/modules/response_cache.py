@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from prometheus_client import Counter, Gauge
+
+cache_hits = Counter('client_cache_hits_total', 'Total number of lookups answered by the client response cache')
+cache_misses = Counter('client_cache_misses_total', 'Total number of lookups not answered by the client response cache')
+cache_evictions = Counter('client_cache_evictions_total', 'Total number of entries evicted from the client response cache')
+cache_bytes = Gauge('client_cache_bytes', 'Size of the entries in the client response cache in bytes')
+rpcs_saved = Counter('client_rpcs_saved_total', 'Total number of gRPC calls not sent because the response was cached or already requested', ['reason'])
+
+
+class ResponseCache:
+    """A memory-bounded LRU cache of the responses received from the gRPC servers.
+
+    Entries are evicted in least recently used order once their total size exceeds `max_bytes`.
+    With a `ttl`, an entry is no longer served once it is older than `ttl` seconds, so values
+    cached from an outdated server are eventually fetched again. Lookups are counted as hits
+    or misses, and the size of the cache is exported as a gauge.
+
+    Attributes:
+        max_bytes (int): The byte budget for cached entries, 0 disables the cache.
+        ttl (float): The seconds an entry is served after it was stored, 0 to serve it until it is evicted.
+        size_bytes (int): The current size of the cached entries in bytes.
+    """
+
+    def __init__(self, max_bytes, ttl=0):
+        """Initialize an empty cache.
+
+        Args:
+            max_bytes (int): The byte budget for cached entries, 0 disables the cache.
+            ttl (float, optional): The seconds an entry is served after it was stored, 0 to never expire (default is 0).
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        """Return the cached value of `key` and mark it as recently used.
+
+        Args:
+            key: The cache key.
+
+        Returns:
+            The cached value, or None on a miss or if the entry has expired.
+        """
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] is not None and time.monotonic() >= entry[2]:
+            del self._entries[key]
+            self.size_bytes -= entry[1]
+            cache_bytes.set(self.size_bytes)
+            entry = None
+        if entry is None:
+            cache_misses.inc()
+            return None
+        self._entries.move_to_end(key)
+        cache_hits.inc()
+        return entry[0]
+
+    def put(self, key, value, size):
+        """Store a value and evict least recently used entries until the cache fits `max_bytes`.
+
+        Args:
+            key: The cache key.
+            value: The value to cache.
+            size (int): The size of the value in bytes.
+
+        Returns:
+            int: The number of evicted entries.
+        """
+        if size > self.max_bytes:
+            return 0
+        expires = time.monotonic() + self.ttl if self.ttl > 0 else None
+        evicted = 0
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self.size_bytes -= previous[1]
+        self._entries[key] = (value, size, expires)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            _, (_, old_size, _) = self._entries.popitem(last=False)
+            self.size_bytes -= old_size
+            evicted += 1
+        cache_bytes.set(self.size_bytes)
+        if evicted:
+            cache_evictions.inc(evicted)
+        return evicted
@@ -0,0 +1,41 @@
+import os
+import shutil
+import tempfile
+
+# Gunicorn settings of the Flask client, used with `gunicorn -c gunicorn.conf.py main:app`
+
+bind = '0.0.0.0:5000'
+# gthread workers serve one HTTP request per thread, while the gRPC calls of a request run as futures without threads of their own
+worker_class = 'gthread'
+workers = int(os.environ.get('WORKERS', 4))
+threads = int(os.environ.get('THREADS', 16))
+# A gthread worker's heartbeat does not depend on its requests, so long /fibonacci/random requests are not killed by it
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+# The app is imported by every worker after the fork. The gRPC channel pool opens its channels on the
+# first call in any case, so no gRPC state is ever shared between the master and the workers.
+preload_app = False
+
+
+def on_starting(server):
+    # Every worker has its own metrics; they are written to files in this directory and aggregated by /metrics.
+    # Set before any worker imports prometheus_client, which picks its storage at import time.
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or tempfile.mkdtemp(prefix='prometheus-multiproc-')
+    # Files left by a previous run would be aggregated as if their workers were still alive
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = metrics_dir
+
+
+def post_fork(server, worker):
+    server.log.info("Worker %s forked, it opens its own gRPC channels on its first call", worker.pid)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    # Drop the live gauges of the exited worker, its counters and histograms stay in the totals
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    shutil.rmtree(os.environ['PROMETHEUS_MULTIPROC_DIR'], ignore_errors=True)
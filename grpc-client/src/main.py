@@ -1,5 +1,6 @@
 from modules.grpc_client_round_robin import app
 
 if __name__ == '__main__':
+    # Flask development server for local runs, the container serves the app with `gunicorn -c gunicorn.conf.py main:app`
     # Enable threading in the Flask development server
     app.run(host='0.0.0.0', port=5000, threaded=True)
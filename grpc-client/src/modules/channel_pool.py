@@ -0,0 +1,412 @@
+import time
+import random
+import itertools
+import threading
+import grpc
+from prometheus_client import Counter, Gauge
+
+pool_in_flight = Gauge('client_channel_pool_in_flight', 'Number of gRPC calls in flight per pooled channel', ['slot'], multiprocess_mode='livesum')
+pool_recycles = Counter('client_channel_pool_recycles_total', 'Total number of pooled gRPC channels replaced by a new connection')
+backend_in_flight = Gauge('client_backend_in_flight', 'Number of gRPC calls in flight per backend', ['backend'], multiprocess_mode='livesum')
+backend_work = Gauge('client_backend_work', 'Estimated work of the gRPC calls in flight per backend', ['backend'], multiprocess_mode='livesum')
+
+# How a channel is picked for each call
+POLICIES = ('round_robin', 'least_busy')
+
+
+def estimate_work(request):
+    """
+    Estimates the work of a call from its request, the same way the server's admission control does.
+
+    Parameters:
+    request: The request message, or the request iterator of a client-streaming call.
+
+    Returns:
+    int: `n` for a single position, the largest `n` plus the number of positions for a batch,
+    the `end` of a range, and 1 for anything else.
+    """
+    n = getattr(request, 'n', None)
+    if n is None:
+        return max(getattr(request, 'end', 1), 1)
+    if isinstance(n, int):
+        return max(n, 1)
+    return max(n, default=0) + len(n)
+
+
+class _PooledChannel(grpc.UnaryUnaryClientInterceptor, grpc.UnaryStreamClientInterceptor,
+                     grpc.StreamUnaryClientInterceptor, grpc.StreamStreamClientInterceptor):
+    """
+    One channel of a pool or balancer, counting its calls and their estimated work in flight through a client interceptor.
+
+    A retired channel takes no new calls and is closed once its last call has finished,
+    so recycling a connection never cancels a call. A channel is reserved while it is picked,
+    before the interceptor counts the call, so it cannot be closed in between.
+
+    Attributes:
+    channel (grpc.Channel): The intercepted channel the calls are made on.
+    multi_callables (dict): The stub methods already created on `channel`.
+    in_flight (int): The number of calls started and not yet finished.
+    work (int): The estimated work of the calls in flight, see `estimate_work`.
+    expires (float): The `time.monotonic()` after which the channel is replaced, or None.
+    """
+
+    def __init__(self, raw_channel, in_flight_gauge, max_age=0, work_gauge=None):
+        self._raw_channel = raw_channel
+        self._gauge = in_flight_gauge
+        self._work_gauge = work_gauge
+        self._lock = threading.Lock()
+        self.channel = grpc.intercept_channel(raw_channel, self)
+        self.multi_callables = {}
+        self.in_flight = 0
+        self.work = 0
+        self.retired = False
+        self._reserved = 0
+        # Jittered, so the channels of the pool do not all reconnect at the same moment
+        self.expires = time.monotonic() + max_age * random.uniform(0.8, 1.2) if max_age > 0 else None
+
+    def _intercept(self, continuation, client_call_details, request):
+        work = estimate_work(request)
+        with self._lock:
+            self.in_flight += 1
+            self.work += work
+        self._gauge.inc()
+        if self._work_gauge is not None:
+            self._work_gauge.inc(work)
+        try:
+            call = continuation(client_call_details, request)
+        except BaseException:
+            self._finished(work)
+            raise
+        call.add_done_callback(lambda call: self._finished(work))
+        return call
+
+    intercept_unary_unary = intercept_unary_stream = intercept_stream_unary = intercept_stream_stream = _intercept
+
+    def _finished(self, work):
+        self._gauge.dec()
+        if self._work_gauge is not None:
+            self._work_gauge.dec(work)
+        with self._lock:
+            self.in_flight -= 1
+            self.work -= work
+            close = self._unused()
+        if close:
+            self._raw_channel.close()
+
+    def _unused(self):
+        # Called with the lock held
+        return self.retired and self.in_flight == 0 and self._reserved == 0
+
+    def reserve(self):
+        """
+        Reserves the channel for a call about to be started on it.
+
+        Returns:
+        bool: False if the channel is retired and must not be used.
+        """
+        with self._lock:
+            if self.retired:
+                return False
+            self._reserved += 1
+            return True
+
+    def release(self):
+        """
+        Ends a reservation once the call has been started and counted by the interceptor.
+        """
+        with self._lock:
+            self._reserved -= 1
+            close = self._unused()
+        if close:
+            self._raw_channel.close()
+
+    def close(self):
+        """
+        Closes the channel at once, cancelling its calls.
+        """
+        self._raw_channel.close()
+
+    def retire(self):
+        """
+        Stops handing out the channel and closes it once its calls have finished.
+        """
+        with self._lock:
+            self.retired = True
+            close = self._unused()
+        if close:
+            self._raw_channel.close()
+
+
+class _PooledMultiCallable:
+    """
+    A stub method of a pool or balancer that picks a channel for every call.
+    """
+
+    def __init__(self, pool, kind, method, request_serializer, response_deserializer):
+        self._pool = pool
+        self._key = (kind, method, request_serializer, response_deserializer)
+
+    def _invoke(self, name, args, kwargs):
+        pooled, multi_callable = self._pool._multi_callable(self._key)
+        try:
+            return getattr(multi_callable, name)(*args, **kwargs)
+        finally:
+            # The interceptor has counted the call by now, or it failed to start
+            pooled.release()
+
+    def __call__(self, *args, **kwargs):
+        return self._invoke('__call__', args, kwargs)
+
+    def with_call(self, *args, **kwargs):
+        return self._invoke('with_call', args, kwargs)
+
+    def future(self, *args, **kwargs):
+        return self._invoke('future', args, kwargs)
+
+
+class _MultiChannel:
+    """
+    Several `_PooledChannel`s used like one channel; subclasses pick and reserve the channel of every call in `_pick`.
+    """
+
+    def _pick(self):
+        raise NotImplementedError
+
+    def _multi_callable(self, key):
+        pooled = self._pick()
+        multi_callable = pooled.multi_callables.get(key)
+        if multi_callable is None:
+            kind, method, request_serializer, response_deserializer = key
+            multi_callable = pooled.multi_callables[key] = getattr(pooled.channel, kind)(
+                method, request_serializer=request_serializer, response_deserializer=response_deserializer
+            )
+        return pooled, multi_callable
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'unary_unary', method, request_serializer, response_deserializer)
+
+    def unary_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'unary_stream', method, request_serializer, response_deserializer)
+
+    def stream_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'stream_unary', method, request_serializer, response_deserializer)
+
+    def stream_stream(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        return _PooledMultiCallable(self, 'stream_stream', method, request_serializer, response_deserializer)
+
+
+class ChannelPool(_MultiChannel):
+    """
+    A pool of independent gRPC channels, each with its own HTTP/2 connection, used like one channel.
+
+    gRPC shares one connection between channels to the same target by default. Every channel
+    of the pool is created with `grpc.use_local_subchannel_pool`, so `size` channels open `size`
+    connections, and a ClusterIP service lets kube-proxy place each of them on a pod of its own
+    choice. A stub created on the pool picks a channel for every call, round-robin or the one
+    with the fewest calls in flight. A channel older than `max_age` seconds is replaced by a new
+    one when it is next picked, so the connections are periodically re-placed across the pods,
+    including pods that were added after the client started. Channels are created on first use,
+    so a gunicorn worker opens its own connections after the fork.
+
+    Attributes:
+    size (int): The number of channels.
+    policy (str): `round_robin` or `least_busy`.
+    max_age (float): The seconds after which a channel is recycled, 0 to never recycle.
+    """
+
+    def __init__(self, create_channel, size=1, policy='round_robin', max_age=0):
+        """
+        Initializes the pool without opening any channel yet.
+
+        Parameters:
+        create_channel (callable): Creates one channel, called with the channel options to add.
+        size (int): The number of channels (default is 1).
+        policy (str): `round_robin` or `least_busy` (default is `round_robin`).
+        max_age (float): The seconds after which a channel is recycled, 0 to never recycle (default is 0).
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown channel pool policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.size = max(size, 1)
+        self.policy = policy
+        self.max_age = max_age
+        self._create_channel = create_channel
+        self._slots = [None] * self.size
+        self._next = itertools.count()
+        self._lock = threading.Lock()
+
+    def _open(self, slot):
+        raw_channel = self._create_channel(options=[('grpc.use_local_subchannel_pool', 1)])
+        return _PooledChannel(raw_channel, pool_in_flight.labels(slot=str(slot)), self.max_age)
+
+    def _pick(self):
+        retired = None
+        with self._lock:
+            offset = next(self._next) % self.size
+            if self.policy == 'least_busy':
+                # Ties go round-robin, so an idle pool still uses all of its connections
+                slot = min(range(self.size), key=lambda i: (self._slots[i].in_flight if self._slots[i] else 0, (i - offset) % self.size))
+            else:
+                slot = offset
+            pooled = self._slots[slot]
+            if pooled is not None and pooled.expires is not None and time.monotonic() >= pooled.expires:
+                retired, pooled = pooled, None
+                pool_recycles.inc()
+            if pooled is None:
+                pooled = self._slots[slot] = self._open(slot)
+            # Only channels still in a slot are picked, and retiring happens under the pool lock, so this succeeds
+            pooled.reserve()
+        if retired is not None:
+            retired.retire()
+        return pooled
+
+    def close(self):
+        """
+        Closes every channel of the pool, cancelling their calls.
+        """
+        with self._lock:
+            slots, self._slots = self._slots, [None] * self.size
+        for pooled in slots:
+            if pooled is not None:
+                pooled.close()
+
+
+class _Backends:
+    """
+    One channel per backend address, shared by the calls to that backend.
+
+    The addresses are resolved again every `resolve_interval` seconds; channels of removed
+    backends are closed once their calls have finished. While nothing resolves, the known
+    backends are kept, or `fallback_address` is used if there are none yet.
+
+    Attributes:
+    resolve_interval (float): The seconds between two resolutions of the backend addresses.
+    """
+
+    def __init__(self, resolve, create_channel, fallback_address, resolve_interval=30):
+        """
+        Initializes the backends without resolving or connecting yet.
+
+        Parameters:
+        resolve (callable): Returns the current `host:port` backend addresses, or an empty list if resolution fails.
+        create_channel (callable): Creates the channel to one address.
+        fallback_address (str): The address used as the only backend while nothing resolves.
+        resolve_interval (float): The seconds between two resolutions (default is 30).
+        """
+        self.resolve_interval = resolve_interval
+        self._resolve = resolve
+        self._create_channel = create_channel
+        self._fallback_address = fallback_address
+        self._backends = {}
+        self._candidates = []
+        self._next_resolve = 0
+        self._lock = threading.Lock()
+        self._resolving = threading.Lock()
+
+    def _refresh(self):
+        addresses = self._resolve()
+        retired = []
+        with self._lock:
+            self._next_resolve = time.monotonic() + self.resolve_interval
+            if not addresses:
+                # Keep the known backends while DNS fails
+                if self._backends:
+                    return
+                addresses = [self._fallback_address]
+            for address in set(self._backends) - set(addresses):
+                retired.append(self._backends.pop(address))
+            for address in addresses:
+                if address not in self._backends:
+                    self._backends[address] = _PooledChannel(
+                        self._create_channel(address), backend_in_flight.labels(backend=address), work_gauge=backend_work.labels(backend=address),
+                    )
+            self._candidates = list(self._backends.values())
+        for pooled in retired:
+            pooled.retire()
+
+    def _refresh_if_due(self):
+        if time.monotonic() >= self._next_resolve and self._resolving.acquire(blocking=not self._candidates):
+            # One thread resolves, the others keep using the known backends meanwhile
+            try:
+                if time.monotonic() >= self._next_resolve:
+                    self._refresh()
+            finally:
+                self._resolving.release()
+
+    def close(self):
+        """
+        Closes every backend channel, cancelling their calls.
+        """
+        with self._lock:
+            backends, self._backends, self._candidates = self._backends, {}, []
+        for pooled in backends.values():
+            pooled.close()
+
+
+class P2CBalancer(_Backends, _MultiChannel):
+    """
+    A client-side balancer over one channel per backend address, used like one channel.
+
+    Every call goes to the less loaded of two randomly chosen backends (power of two choices),
+    where the load of a backend is the estimated work of its calls in flight, then their number.
+    Unlike gRPC's `round_robin`, a backend still busy with a few large `n` gets fewer new calls,
+    while sampling two instead of scanning all keeps herds of clients from piling on the same
+    least-loaded backend. The addresses are resolved again every `resolve_interval` seconds;
+    channels of removed backends are closed once their calls have finished.
+    """
+
+    def _pick(self):
+        self._refresh_if_due()
+        while True:
+            candidates = self._candidates
+            if len(candidates) == 1:
+                pooled = candidates[0]
+            else:
+                first, second = random.sample(candidates, 2)
+                pooled = first if (first.work, first.in_flight) <= (second.work, second.in_flight) else second
+            # A backend removed meanwhile is retired after the candidates were replaced, so picking again finds the new ones
+            if pooled.reserve():
+                return pooled
+
+
+class BackendChannels(_Backends):
+    """
+    One long-lived channel per backend address, for calls that must reach every backend.
+
+    A FibonacciStream is pinned to the backend its channel connects to, so the `stream`
+    transport starts one stream per backend through `start_calls` instead of balancing each
+    call. The channels are kept across requests and the addresses are resolved again every
+    `resolve_interval` seconds, so a request neither waits for DNS nor opens a connection.
+    """
+
+    def start_calls(self, start):
+        """
+        Starts one call per current backend.
+
+        Parameters:
+        start (callable): Starts the call on a channel, called with the channel, the index of the backend and the number of backends.
+
+        Returns:
+        list: The started calls, in backend order.
+        """
+        self._refresh_if_due()
+        while True:
+            candidates = self._candidates
+            reserved = [pooled for pooled in candidates if pooled.reserve()]
+            if len(reserved) == len(candidates):
+                break
+            # A backend was removed meanwhile, try again with the new candidates
+            for pooled in reserved:
+                pooled.release()
+        calls = []
+        try:
+            for index, pooled in enumerate(reserved):
+                calls.append(start(pooled.channel, index, len(reserved)))
+        except BaseException:
+            for call in calls:
+                call.cancel()
+            raise
+        finally:
+            # The interceptor has counted the calls by now
+            for pooled in reserved:
+                pooled.release()
+        return calls
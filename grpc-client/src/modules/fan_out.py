@@ -0,0 +1,153 @@
+import queue
+import threading
+from collections import OrderedDict
+from prometheus_client import Gauge
+
+fan_out_in_flight = Gauge('client_fan_out_in_flight', 'Number of gRPC calls started by the fan-out engine and not yet completed', multiprocess_mode='livesum')
+fan_out_waiting = Gauge('client_fan_out_waiting', 'Number of HTTP request threads waiting for a free slot of the fan-out engine', multiprocess_mode='livesum')
+
+
+class FanOut:
+    """
+    Drives many concurrent gRPC calls from one thread with grpc's non-blocking `future()` calls.
+
+    A call is started with `method.future(...)`, and gRPC's own completion thread runs its done
+    callback, so no thread is created or blocked per outstanding call. Every HTTP request keeps
+    at most `window` of its calls outstanding, and at most `max_in_flight` calls are in flight
+    across all requests of the process; starting a call waits for a free slot beyond that, so one
+    large request cannot crowd out the others.
+
+    Attributes:
+    max_in_flight (int): The maximum number of calls in flight across all requests of the process.
+    """
+
+    def __init__(self, max_in_flight):
+        """
+        Initializes the engine.
+
+        Parameters:
+        max_in_flight (int): The maximum number of calls in flight across all requests of the process.
+        """
+        self.max_in_flight = max(max_in_flight, 1)
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+
+    def _start(self, method, grpc_request, timeout, done):
+        if not self._slots.acquire(blocking=False):
+            fan_out_waiting.inc()
+            try:
+                self._slots.acquire()
+            finally:
+                fan_out_waiting.dec()
+        fan_out_in_flight.inc()
+        try:
+            future = method.future(grpc_request, timeout=timeout)
+        except BaseException:
+            fan_out_in_flight.dec()
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda future: self._finish(future, done))
+        return future
+
+    def _finish(self, future, done):
+        # Runs on gRPC's completion thread, also for cancelled calls
+        fan_out_in_flight.dec()
+        self._slots.release()
+        if done is not None:
+            done.put(future)
+
+    def calls(self, method, requests, window, ordered=True, timeout=None):
+        """
+        Sends one call per request, keeping at most `window` of them outstanding, and yields their responses.
+
+        In order, a call counts as outstanding until its response has been yielded, so a slow
+        call holds back the ones after it. Unordered, responses are yielded as their calls
+        complete and a new call is started for each of them. Requests are taken lazily, and
+        the outstanding calls are cancelled when the caller stops early, e.g. because one call
+        failed or the HTTP caller disconnected.
+
+        Parameters:
+        method (grpc.UnaryUnaryMultiCallable): The stub method, such as `stub.Fibonacci`.
+        requests (iterable): Yields `(key, grpc_request)` pairs.
+        window (int): The maximum number of outstanding calls of this caller.
+        ordered (bool): Whether to yield the responses in request order (default is True).
+        timeout (float): The deadline of every call in seconds, or None.
+
+        Yields:
+        tuple: The `(key, response)` pairs. Raises the grpc.RpcError of the first failed call taken.
+        """
+        window = max(window, 1)
+        done = None if ordered else queue.SimpleQueue()
+        outstanding = OrderedDict()
+        requests = iter(requests)
+        try:
+            while True:
+                for key, grpc_request in requests:
+                    outstanding[self._start(method, grpc_request, timeout, done)] = key
+                    if len(outstanding) >= window:
+                        break
+                if not outstanding:
+                    return
+                future = next(iter(outstanding)) if ordered else done.get()
+                key = outstanding.pop(future)
+                yield key, future.result()
+        finally:
+            for future in outstanding:
+                future.cancel()
+
+
+def merge_streams(calls, max_buffered, check_interval=0.1):
+    """
+    Reads several response streams concurrently and yields their responses as they arrive.
+
+    One reader thread per call puts the responses into a queue of at most `max_buffered`
+    entries. A consumer slower than the servers therefore holds back the readers, and gRPC
+    flow control the servers, instead of buffering the streams in memory. All calls are
+    cancelled when the merge ends, also when one call failed or the caller stopped early,
+    and the readers then stop within `check_interval` seconds.
+
+    Parameters:
+    calls (list): The streaming calls, such as the calls returned by `stub.FibonacciStream(...)`.
+    max_buffered (int): The maximum number of responses read but not yet yielded.
+    check_interval (float): How often in seconds a reader waiting for room in the queue checks whether the merge ended.
+
+    Yields:
+    tuple: The index of the call in `calls` and its response. Raises the grpc.RpcError of the first failed call.
+    """
+    buffered = queue.Queue(maxsize=max(max_buffered, 1))
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                buffered.put(item, timeout=check_interval)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def read(index, call):
+        try:
+            for response in call:
+                if not put((index, response, None)):
+                    return
+        except Exception as error:
+            put((index, None, error))
+            return
+        put((index, None, None))
+
+    for index, call in enumerate(calls):
+        threading.Thread(target=read, args=(index, call), name=f'stream-reader-{index}', daemon=True).start()
+    try:
+        running = len(calls)
+        while running:
+            index, response, error = buffered.get()
+            if error is not None:
+                raise error
+            if response is None:
+                running -= 1
+                continue
+            yield index, response
+    finally:
+        stopped.set()
+        for call in calls:
+            call.cancel()
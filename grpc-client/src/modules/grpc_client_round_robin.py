@@ -1,87 +1,472 @@
 import os
+import sys
+import time
 import random
-import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor
-from flask import Flask, request, jsonify
+import socket
+import itertools
+from collections import Counter
+import orjson
+from flask import Flask, Response, request, jsonify, stream_with_context, abort
+from werkzeug.exceptions import BadRequest
 import grpc
+from prometheus_client import CollectorRegistry, REGISTRY, generate_latest, multiprocess, CONTENT_TYPE_LATEST
 from modules.proto import fibonacci_pb2, fibonacci_pb2_grpc
-from modules.logger import get_logger
+from modules.logger import get_logger, RequestLogSampler
+from modules.fan_out import FanOut, merge_streams
+from modules.channel_pool import ChannelPool, P2CBalancer, BackendChannels
+from modules.response_cache import ResponseCache, rpcs_saved
+from modules.service_config import build_service_config, channel_options, hedging_policies
+from modules.hedging import HedgingChannel
+
+# The `value` field is always a decimal string, whatever the size of the number
+sys.set_int_max_str_digits(0)
 
 app = Flask(__name__)
 logger = get_logger(__name__, log_level="INFO")
+# Samples the per-request log lines of every route and logs periodic summaries
+request_logs = {route: RequestLogSampler(logger, route) for route in ('/increment', '/fibonacci', '/fibonacci/random', '/fibonacci/range')}
 headless_service_dns = os.environ.get('SERVER_NAME', 'localhost')
 grpc_server_port = os.environ.get('SERVER_PORT', '50051')
 grpc_server_svc_type = os.environ.get('GRPC_SERVER_SVC_TYPE', 'normal')
-workers = int(os.environ.get('WORKERS', '1'))
+batch_size = int(os.environ.get('BATCH_SIZE', '100'))
+grpc_timeout_ms = int(os.environ.get('GRPC_TIMEOUT_MS', '0'))
+# Concurrent gRPC calls of all routes are non-blocking futures, bounded per HTTP request and per process
+fan_out = FanOut(max_in_flight=int(os.environ.get('FAN_OUT_MAX_IN_FLIGHT', 1024)))
+fan_out_window = int(os.environ.get('FAN_OUT_WINDOW', 100))
+# Fibonacci responses by position and encoding, reused across requests; CLIENT_CACHE_MAX_BYTES=0 disables the cache
+response_cache = ResponseCache(max_bytes=int(os.environ.get('CLIENT_CACHE_MAX_BYTES', 0)), ttl=float(os.environ.get('CLIENT_CACHE_TTL_S', 0)))
+# Retry, hedging, timeout and throttling settings of the FibonacciService calls, see modules.service_config
+service_config = build_service_config()
+# Compression of the request messages on every channel; responses are compressed as the server chooses
+grpc_compressions = {
+    'none': grpc.Compression.NoCompression,
+    'deflate': grpc.Compression.Deflate,
+    'gzip': grpc.Compression.Gzip,
+}
+grpc_compression_name = os.environ.get('GRPC_COMPRESSION', 'none')
+if grpc_compression_name not in grpc_compressions:
+    raise ValueError(f"Unknown GRPC_COMPRESSION {grpc_compression_name!r}, expected one of {', '.join(grpc_compressions)}")
+grpc_compression = grpc_compressions[grpc_compression_name]
+grpc_http_statuses = {
+    grpc.StatusCode.DEADLINE_EXCEEDED: 504,
+    grpc.StatusCode.RESOURCE_EXHAUSTED: 503,
+    grpc.StatusCode.OUT_OF_RANGE: 400,
+}
 
-def create_grpc_channel(headless_service_dns, grpc_server_port):
+def create_grpc_channel(headless_service_dns, grpc_server_port, options=()):
     """
     Creates a gRPC channel with round-robin load balancing.
 
     Parameters:
     headless_service_dns (str): The DNS address of the gRPC server.
     grpc_server_port (str): The port number on which the gRPC server is running.
+    options (list): Additional channel options (default is none).
 
     Returns:
     grpc.Channel: The created gRPC channel.
     """
     if grpc_server_svc_type == "normal":
         target_uri = f'{headless_service_dns}:{grpc_server_port}'
-        channel = grpc.insecure_channel(target_uri)
-        logger.debug(f"Created gRPC channel with normal Kubernetes svc to target: {target_uri}")
+        channel = grpc.insecure_channel(target_uri, options=[*channel_options(service_config), *options], compression=grpc_compression)
+        logger.debug("Created gRPC channel with normal Kubernetes svc to target: %s", target_uri)
         return channel
     elif grpc_server_svc_type == "headless":
         target_uri = f'dns:///{headless_service_dns}:{grpc_server_port}'
         channel = grpc.insecure_channel(target_uri, options=[
-            ('grpc.lb_policy_name', 'round_robin')
-        ])
-        logger.debug(f"Created gRPC channel with round-robin load balancing to target: {target_uri}")
+            ('grpc.lb_policy_name', 'round_robin'),
+            *channel_options(service_config),
+            *options,
+        ], compression=grpc_compression)
+        logger.debug("Created gRPC channel with round-robin load balancing to target: %s", target_uri)
         return channel
 
-channel = create_grpc_channel(headless_service_dns, grpc_server_port)
+def create_channel():
+    """
+    Creates the channel-like object all routes send their calls through.
+
+    In headless mode with `GRPC_BALANCER=p2c`, a P2CBalancer keeps one channel per resolved
+    server pod and sends every call to the less loaded of two of them. Otherwise every call
+    picks one of `GRPC_CHANNEL_POOL_SIZE` connections, each replaced after about
+    `GRPC_CHANNEL_MAX_AGE_S` seconds, and headless mode balances with gRPC's `round_robin`.
+    With a hedging policy in the service config, both are wrapped in a HedgingChannel.
+
+    Returns:
+    ChannelPool, P2CBalancer or HedgingChannel: The object to create stubs on.
+    """
+    if grpc_server_svc_type == "headless" and os.environ.get('GRPC_BALANCER', 'round_robin') == 'p2c':
+        channel = P2CBalancer(
+            resolve_backends,
+            lambda address: grpc.insecure_channel(address, options=channel_options(service_config), compression=grpc_compression),
+            fallback_address=f'{headless_service_dns}:{grpc_server_port}',
+            resolve_interval=float(os.environ.get('GRPC_BALANCER_RESOLVE_INTERVAL_S', 30)),
+        )
+    else:
+        channel = ChannelPool(
+            lambda options: create_grpc_channel(headless_service_dns, grpc_server_port, options),
+            size=int(os.environ.get('GRPC_CHANNEL_POOL_SIZE', 1)),
+            policy=os.environ.get('GRPC_CHANNEL_POOL_POLICY', 'round_robin'),
+            max_age=float(os.environ.get('GRPC_CHANNEL_MAX_AGE_S', 0)),
+        )
+    policies = hedging_policies(service_config)
+    if policies:
+        return HedgingChannel(channel, policies, budget_percent=float(os.environ.get('GRPC_HEDGING_BUDGET_PERCENT', 10)))
+    return channel
+
+def resolve_backends():
+    """
+    Resolves the addresses of the gRPC server pods behind the headless service.
+
+    Returns:
+    list: The sorted `host:port` addresses, or an empty list outside of headless mode or if resolution fails.
+    """
+    if grpc_server_svc_type != "headless":
+        return []
+    try:
+        infos = socket.getaddrinfo(headless_service_dns, grpc_server_port, type=socket.SOCK_STREAM)
+    except socket.gaierror:
+        logger.warning("Could not resolve gRPC backends of %s", headless_service_dns)
+        return []
+    return sorted({f'[{info[4][0]}]:{grpc_server_port}' if info[0] == socket.AF_INET6 else f'{info[4][0]}:{grpc_server_port}' for info in infos})
+
+channel = create_channel()
+
+stream_backends = BackendChannels(
+    resolve_backends,
+    lambda address: grpc.insecure_channel(address, options=channel_options(service_config), compression=grpc_compression),
+    fallback_address=f'{headless_service_dns}:{grpc_server_port}',
+    resolve_interval=float(os.environ.get('GRPC_BALANCER_RESOLVE_INTERVAL_S', 30)),
+)
+
+def call_timeout():
+    """
+    Returns the deadline of the gRPC calls made for the current HTTP request.
+
+    The `timeout_ms` query parameter overrides the `GRPC_TIMEOUT_MS` environment variable; 0 means no deadline.
+    The server stops computing once the deadline expires.
+
+    Returns:
+    float: The timeout in seconds, or None.
+    """
+    timeout_ms = int(request.args.get('timeout_ms', grpc_timeout_ms))
+    return timeout_ms / 1000 if timeout_ms > 0 else None
+
+@app.errorhandler(grpc.RpcError)
+def handle_grpc_error(error):
+    """
+    Turns a failed gRPC call into a JSON error response.
+
+    Expired deadlines become `504`, rejections by the server's admission control `503`, values too large
+    for the requested encoding `400` and anything else `502`.
+
+    Parameters:
+    error (grpc.RpcError): The error of the failed gRPC call.
+
+    Returns:
+    Response: A JSON response containing the gRPC status code and details.
+    """
+    logger.warning("gRPC call failed with %s: %s", error.code().name, error.details())
+    return jsonify({'error': error.code().name, 'details': error.details()}), grpc_http_statuses.get(error.code(), 502)
+
+@app.errorhandler(BadRequest)
+def handle_bad_request(error):
+    """
+    Turns an invalid query parameter into a JSON error response.
+
+    Parameters:
+    error (BadRequest): The error raised while reading the query parameters.
+
+    Returns:
+    Response: A JSON response containing the error details with status `400`.
+    """
+    return jsonify({'error': 'INVALID_ARGUMENT', 'details': error.description}), 400
+
+value_encodings = {
+    'decimal': fibonacci_pb2.VALUE_ENCODING_DECIMAL,
+    'hex': fibonacci_pb2.VALUE_ENCODING_HEX,
+    'bytes': fibonacci_pb2.VALUE_ENCODING_BYTES_LE,
+}
+
+def value_encoding():
+    """
+    Returns the wire encoding selected by the `encoding` query parameter of the current HTTP request (default is `bytes`).
+
+    Returns:
+    fibonacci_pb2.ValueEncoding: The encoding to request from the server.
+
+    Raises:
+    BadRequest: If the encoding is not one of `value_encodings`.
+    """
+    name = request.args.get('encoding', 'bytes')
+    if name not in value_encodings:
+        abort(400, f"Unknown encoding {name!r}, expected one of {', '.join(value_encodings)}")
+    return value_encodings[name]
 
-def handle_grpc_request(stub, grpc_request):
+def decode_fibonacci_value(response, encoding):
+    """
+    Decodes the Fibonacci value of a gRPC response into a decimal string.
+
+    Only called when the value is returned to the HTTP caller, so the int-to-decimal
+    conversion is skipped entirely when `output=false`.
+
+    Parameters:
+    response (fibonacci_pb2.FibonacciResponse): The gRPC response.
+    encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+
+    Returns:
+    str: The Fibonacci value as a decimal string.
+    """
+    if encoding == fibonacci_pb2.VALUE_ENCODING_DECIMAL:
+        return response.value
+    if encoding == fibonacci_pb2.VALUE_ENCODING_BYTES_LE:
+        value = int.from_bytes(response.raw_value, 'little')
+    else:
+        value = int(response.value, 16)
+    return str(value)
+
+def handle_grpc_request(stub, grpc_request, timeout=None):
     """
     Handles a single gRPC request.
 
     Parameters:
     stub (grpc.Stub): The gRPC stub to use for the request.
     grpc_request: The gRPC request to send.
+    timeout (float): The deadline of the call in seconds, or None.
 
     Returns:
     The gRPC response.
     """
-    return stub.Fibonacci(grpc_request)
+    return stub.Fibonacci(grpc_request, timeout=timeout)
+
+def ndjson_line(obj):
+    """
+    Encodes one NDJSON line with orjson.
+
+    Parameters:
+    obj (dict): The object to encode.
+
+    Returns:
+    bytes: The JSON encoding of `obj` followed by a newline.
+    """
+    return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+
+def chunked(iterable, size):
+    """
+    Yields lists of up to `size` consecutive items of `iterable`.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def cached_fibonacci(n, encoding):
+    """
+    Returns the cached response for F(n) in the given encoding.
+
+    Parameters:
+    n (int): The Fibonacci position.
+    encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+
+    Returns:
+    tuple: The server name and the message carrying the value, or None on a miss or if the cache is disabled.
+    """
+    if response_cache.max_bytes <= 0:
+        return None
+    return response_cache.get((n, encoding))
+
+def cache_fibonacci(n, encoding, server_name, message):
+    """
+    Caches a received response for F(n), sized by the serialized size of its message.
+
+    Parameters:
+    n (int): The Fibonacci position.
+    encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+    server_name (str): The server that calculated the value.
+    message: The FibonacciResponse or FibonacciValue carrying the value.
+    """
+    if response_cache.max_bytes > 0:
+        response_cache.put((n, encoding), (server_name, message), message.ByteSize() + len(server_name))
+
+def collapse_duplicates(ns, encoding, fetch, ordered):
+    """
+    Yields the response for every position of `ns` while requesting each distinct, uncached position only once.
+
+    Cached positions are taken from the response cache and the remaining ones are passed to
+    `fetch` in order of their first occurrence. A response needed again later in the request
+    is kept until its last occurrence has been yielded, and every received response is cached.
+
+    Parameters:
+    ns (list): The positions, possibly with duplicates.
+    encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+    fetch (callable): Takes the positions to request and yields one list of `(n, server_name, message)`
+        tuples per completed call, in request order if `ordered`.
+    ordered (bool): Whether the responses are yielded in the order of `ns` or as they are received.
+
+    Yields:
+    tuple: The server name, the position `n` and the message carrying its value.
+    """
+    remaining = Counter(ns)
+    known = {}
+    misses = []
+    for n in remaining:
+        cached = cached_fibonacci(n, encoding)
+        if cached is None:
+            misses.append(n)
+        else:
+            known[n] = cached
+    saved_by_cache = sum(remaining[n] for n in known)
+    if saved_by_cache:
+        rpcs_saved.labels(reason='cache').inc(saved_by_cache)
+    if len(ns) - saved_by_cache > len(misses):
+        rpcs_saved.labels(reason='duplicate').inc(len(ns) - saved_by_cache - len(misses))
+
+    results = fetch(misses)
+    try:
+        if not ordered:
+            for n, (server_name, message) in known.items():
+                for _ in range(remaining[n]):
+                    yield server_name, n, message
+            for received in results:
+                for n, server_name, message in received:
+                    cache_fibonacci(n, encoding, server_name, message)
+                    for _ in range(remaining[n]):
+                        yield server_name, n, message
+            return
+
+        for n in ns:
+            while n not in known:
+                for received_n, server_name, message in next(results):
+                    cache_fibonacci(received_n, encoding, server_name, message)
+                    known[received_n] = (server_name, message)
+            server_name, message = known[n]
+            yield server_name, n, message
+            remaining[n] -= 1
+            if not remaining[n]:
+                del known[n]
+    finally:
+        results.close()
+
+def fibonacci_random_results(stub, transport, iterations, fibo_start, fibo_end, encoding, chunk_size, timeout, window, ordered):
+    """
+    Calculates the Fibonacci values of the `/fibonacci/random` route and yields them as they are collected.
+
+    Unary calls and batch RPCs are sent through the fan-out engine, at most `window` of them
+    outstanding, without a thread per call. Their positions are drawn up front, so duplicates
+    and positions in the response cache are answered without a call, see `collapse_duplicates`.
+    Stream requests are generated as gRPC sends them, and the streams of all backends are read
+    concurrently into a queue of at most `window` responses, see `merge_streams`. Memory therefore
+    does not grow with the number of values as long as the caller consumes the results as they come.
+
+    Parameters:
+    stub (grpc.Stub): The gRPC stub for unary and batch calls.
+    transport (str): `unary`, `batch` or `stream`.
+    iterations (int): The number of random positions.
+    fibo_start (int): The smallest random position.
+    fibo_end (int): The largest random position.
+    encoding (fibonacci_pb2.ValueEncoding): The encoding requested from the server.
+    chunk_size (int): The number of positions per FibonacciBatch RPC.
+    timeout (float): The deadline of every gRPC call in seconds, or None.
+    window (int): The maximum number of outstanding unary calls or batch RPCs, and of stream responses read ahead.
+    ordered (bool): Whether unary and batch results are yielded in request order or as they complete.
+
+    Yields:
+    tuple: The server name, the position `n` and the message carrying its value.
+    """
+    if transport == 'stream':
+        # One stream per resolved backend, each generates its share of the requests as gRPC sends them
+        def start_stream(stream_channel, offset, count):
+            return fibonacci_pb2_grpc.FibonacciServiceStub(stream_channel).FibonacciStream((
+                fibonacci_pb2.FibonacciStreamRequest(id=i, n=random.randint(fibo_start, fibo_end), encoding=encoding)
+                for i in range(offset, iterations, count)
+            ), timeout=timeout)
+        if grpc_server_svc_type == "headless":
+            calls = stream_backends.start_calls(start_stream)
+        else:
+            calls = [start_stream(channel, 0, 1)]
+        # The initial metadata of a call has arrived once its first response has
+        server_names = {}
+        counts = Counter()
+        for index, response in merge_streams(calls, window):
+            if index not in server_names:
+                server_names[index] = dict(calls[index].initial_metadata()).get('server-name', '')
+            counts[index] += 1
+            yield server_names[index], response.n, response
+        for index, count in counts.items():
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Values for %s positions over a stream", server_names[index], count)
+        return
+
+    def fetch_batches(misses):
+        batch_requests = ((chunk, fibonacci_pb2.FibonacciBatchRequest(n=chunk, encoding=encoding)) for chunk in chunked(misses, chunk_size))
+        for chunk, response in fan_out.calls(stub.FibonacciBatch, batch_requests, window, ordered, timeout):
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Values for %s positions", response.server_name, len(chunk))
+            yield [(value.n, response.server_name, value) for value in response.values]
+
+    def fetch_unary(misses):
+        unary_requests = ((n, fibonacci_pb2.FibonacciRequest(n=n, encoding=encoding)) for n in misses)
+        for n, response in fan_out.calls(stub.Fibonacci, unary_requests, window, ordered, timeout):
+            if request_logs['/fibonacci/random'].sample():
+                logger.info("Server: %s Fibonacci Value for n=%s", response.server_name, n)
+            yield [(n, response.server_name, response)]
+
+    ns = [random.randint(fibo_start, fibo_end) for _ in range(iterations)]
+    yield from collapse_duplicates(ns, encoding, fetch_batches if transport == 'batch' else fetch_unary, ordered)
+
+@app.route('/metrics', methods=['GET'])
+def handle_metrics():
+    """
+    Handles the `/metrics` route.
+
+    Under gunicorn (`PROMETHEUS_MULTIPROC_DIR` is set) the metrics of all workers are aggregated,
+    so a scrape does not depend on which worker answers it.
+
+    Returns:
+    Response: The Prometheus metrics in the text exposition format.
+    """
+    registry = REGISTRY
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
 
 @app.route('/increment', methods=['GET'])
 def handle_request():
     """
     Handles the `/increment` route.
 
-    This route makes `iteration` number of gRPC requests to increment a number.
-    The `iteration` parameter specifies how many requests to make (default is 1).
-    Returns a JSON list of responses from the gRPC server.
+    This route reserves `iteration` consecutive values of the server's counter in a single
+    IncrementBy gRPC request instead of sending one Increment request per value.
+    Returns a JSON list, or an NDJSON stream, with one entry per reserved value.
 
     Parameters:
-    iteration (int): Number of iterations for the gRPC request, specified via query parameter (default is 1).
+    iteration (int): Number of values to reserve, specified via query parameter (default is 1). 0 or less reserves nothing.
+    timeout_ms (int): The deadline of the gRPC call (default is the `GRPC_TIMEOUT_MS` environment variable or no deadline).
+    format (str): `json` returns one JSON list, `ndjson` streams one line per value (default is `json`).
 
     Returns:
-    Response: A JSON response containing a list of server names and the responses from each server.
+    Response: A JSON response or NDJSON stream containing the server names and the reserved values.
     """
+    start = time.perf_counter()
     iteration = int(request.args.get('iteration', 1))
     pod_name = os.environ.get('POD_NAME', 'client')
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
-    responses = []
-
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = [executor.submit(handle_grpc_request, stub, fibonacci_pb2.IncrementRequest(name=pod_name)) for _ in range(iteration)]
-
-        for future in concurrent.futures.as_completed(futures):
-            response = future.result()
-            responses.append({'server': response.server_name, 'response': response.number})
-            logger.info(f"Server: {response.server_name} Response: {response.number}")
 
-    return jsonify(responses)
+    if iteration <= 0:
+        # The server reserves one value for a delta of 0, so nothing is reserved without calling it
+        if request.args.get('format', 'json') == 'ndjson':
+            return Response(b'', mimetype='application/x-ndjson')
+        return jsonify([])
+    response = stub.IncrementBy(fibonacci_pb2.IncrementByRequest(name=pod_name, delta=iteration), timeout=call_timeout())
+    if request_logs['/increment'].observe(start):
+        logger.info("Server: %s Response: %s..%s", response.server_name, response.first, response.last)
+    if request.args.get('format', 'json') == 'ndjson':
+        lines = (ndjson_line({'server': response.server_name, 'response': number}) for number in range(response.first, response.last + 1))
+        return Response(lines, mimetype='application/x-ndjson')
+    return jsonify([{'server': response.server_name, 'response': number} for number in range(response.first, response.last + 1)])
 
 @app.route('/fibonacci', methods=['GET'])
 def handle_fibonacci_request():
@@ -89,24 +474,36 @@ def handle_fibonacci_request():
     Handles the `/fibonacci` route.
 
     This route calculates the Fibonacci number for a given input `n` using gRPC requests.
+    A response found in the client's response cache is returned without a gRPC call.
     Returns a JSON response with the server name and the calculated Fibonacci value.
 
     Parameters:
     n (int): The position of the Fibonacci sequence to calculate, specified via query parameter (default is 1).
+    encoding (str): The wire encoding of the value, one of `decimal`, `hex` or `bytes` (default is `bytes`).
+    timeout_ms (int): The deadline of the gRPC call (default is the `GRPC_TIMEOUT_MS` environment variable or no deadline).
 
     Returns:
     Response: A JSON response containing the server name and the calculated Fibonacci value.
     """
+    start = time.perf_counter()
     n = int(request.args.get('n', 1))
+    encoding = value_encoding()
+    timeout = call_timeout()
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        grpc_request = fibonacci_pb2.FibonacciRequest(n=n)
-        future = executor.submit(handle_grpc_request, stub, grpc_request)
-        response = future.result()
+    cached = cached_fibonacci(n, encoding)
+    if cached is None:
+        response = handle_grpc_request(stub, fibonacci_pb2.FibonacciRequest(n=n, encoding=encoding), timeout)
+        cache_fibonacci(n, encoding, response.server_name, response)
+        server_name, message = response.server_name, response
+    else:
+        rpcs_saved.labels(reason='cache').inc()
+        server_name, message = cached
 
-    logger.info(f"Server: {response.server_name} Fibonacci Value: {response.value}")
-    return jsonify({'server': response.server_name, 'value': response.value})
+    value = decode_fibonacci_value(message, encoding)
+    if request_logs['/fibonacci'].observe(start, n):
+        logger.info("Server: %s Fibonacci Value: %s", server_name, value)
+    return jsonify({'server': server_name, 'value': value})
 
 @app.route('/fibonacci/random', methods=['GET'])
 def handle_fibonacci_random():
@@ -114,47 +511,101 @@ def handle_fibonacci_random():
     Handles the `/fibonacci/random` route.
 
     This route calculates random Fibonacci numbers within a specified range.
-    The number of iterations is specified via query parameter.
+    The number of iterations is specified via query parameter. With the unary and batch
+    transports, every distinct position is requested at most once per request, and not at all
+    if it is in the client's response cache.
 
     Parameters:
     iterations (int): The number of random Fibonacci numbers to calculate, specified via query parameter (default is 1).
     fibo_start (int): The start of the range for random Fibonacci numbers (default is 1).
     fibo_end (int): The end of the range for random Fibonacci numbers (default is 10).
+    output (bool): Whether to return the calculated values; they are only decoded when true (default is true).
+    encoding (str): The wire encoding of the values, one of `decimal`, `hex` or `bytes` (default is `bytes`).
+    transport (str): `unary` sends one Fibonacci RPC per iteration, `batch` sends FibonacciBatch RPCs and
+        `stream` pipelines all requests over FibonacciStream, one stream per resolved backend in headless mode (default is `unary`).
+    batch_size (int): The number of positions per FibonacciBatch RPC (default is the `BATCH_SIZE` environment variable or 100).
+    timeout_ms (int): The deadline of every gRPC call (default is the `GRPC_TIMEOUT_MS` environment variable or no deadline).
+    format (str): `json` returns one JSON list, `ndjson` streams one line per value as soon as it is collected (default is `json`).
+    window (int): The maximum number of outstanding unary calls or batch RPCs, and of stream responses read ahead (default is the `FAN_OUT_WINDOW` environment variable or 100).
+    ordered (bool): Whether unary and batch values are returned in request order or as they complete (default is true).
 
     Returns:
-    Response: A JSON response containing the server name, the input value `n`, and the calculated Fibonacci value.
+    Response: A JSON response or NDJSON stream containing the server name, the input value `n`, and the calculated Fibonacci value.
     """
     iterations = int(request.args.get('iterations', 1))
     fibo_start = int(request.args.get('fibo_start', 1))
     fibo_end = int(request.args.get('fibo_end', 10))
     response_data = request.args.get('output', 'true').lower() == 'true'
-
-    iterations = int(request.args.get('iterations', 1))
-    fibo_start = int(request.args.get('fibo_start', 1))
-    fibo_end = int(request.args.get('fibo_end', 10))
-    response_data = request.args.get('output', 'true').lower() == 'true'
+    encoding = value_encoding()
+    transport = request.args.get('transport', 'unary')
+    chunk_size = int(request.args.get('batch_size', batch_size))
+    output_format = request.args.get('format', 'json')
+    window = int(request.args.get('window', fan_out_window))
+    ordered = request.args.get('ordered', 'true').lower() == 'true'
+    timeout = call_timeout()
     stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
 
-    responses = []
+    results = fibonacci_random_results(stub, transport, iterations, fibo_start, fibo_end, encoding, chunk_size, timeout, window, ordered)
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        future_n_pairs = [
-            (n := random.randint(fibo_start, fibo_end), executor.submit(handle_grpc_request, stub, fibonacci_pb2.FibonacciRequest(n=n)))
-            for _ in range(iterations)
-        ]
+    if output_format == 'ndjson' and response_data:
+        # Waiting for the first value here turns an early gRPC failure into a regular error response
+        first = next(results, None)
 
-        responses = []
+        # Every value is written as soon as it is collected, so memory stays flat for any `iterations`
+        def generate():
+            try:
+                for server_name, n, message in itertools.chain([first] if first else [], results):
+                    yield ndjson_line({'server': server_name, 'n': n, 'value': decode_fibonacci_value(message, encoding)})
+            finally:
+                results.close()
 
-        for n, future in future_n_pairs:
-            response = future.result()
-            responses.append({
-                'server': response.server_name,
-                'n': n,
-                'value': response.value
-            })
-            logger.info(f"Server: {response.server_name} Fibonacci Value for n={n}")
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
 
     if response_data:
-        return jsonify(responses)
-    else:
-        return jsonify({"sergeant job done?": "Yes lieutenant!"})
+        return jsonify([
+            {'server': server_name, 'n': n, 'value': decode_fibonacci_value(message, encoding)}
+            for server_name, n, message in results
+        ])
+    for _ in results:
+        pass
+    return jsonify({"sergeant job done?": "Yes lieutenant!"})
+
+@app.route('/fibonacci/range', methods=['GET'])
+def handle_fibonacci_range():
+    """
+    Handles the `/fibonacci/range` route.
+
+    This route streams the Fibonacci numbers for a contiguous range using the server-streaming
+    FibonacciRange RPC. Every value is written to the HTTP caller as one NDJSON line as soon as
+    it arrives, so neither the client nor the server holds the whole range in memory.
+
+    Parameters:
+    fibo_start (int): The first position of the range (default is 1).
+    fibo_end (int): The last position of the range, inclusive (default is 10).
+    step (int): The distance between two positions (default is 1).
+    encoding (str): The wire encoding of the values, one of `decimal`, `hex` or `bytes` (default is `bytes`).
+    timeout_ms (int): The deadline of the whole stream (default is the `GRPC_TIMEOUT_MS` environment variable or no deadline).
+
+    Returns:
+    Response: An NDJSON stream with the server name, the input value `n`, and the calculated Fibonacci value per line.
+    """
+    start = time.perf_counter()
+    fibo_start = int(request.args.get('fibo_start', 1))
+    fibo_end = int(request.args.get('fibo_end', 10))
+    step = int(request.args.get('step', 1))
+    encoding = value_encoding()
+    stub = fibonacci_pb2_grpc.FibonacciServiceStub(channel)
+
+    call = stub.FibonacciRange(fibonacci_pb2.FibonacciRangeRequest(start=fibo_start, end=fibo_end, step=step, encoding=encoding), timeout=call_timeout())
+    server_name = dict(call.initial_metadata()).get('server-name', '')
+
+    def generate():
+        try:
+            for value in call:
+                yield ndjson_line({'server': server_name, 'n': value.n, 'value': decode_fibonacci_value(value, encoding)})
+            if request_logs['/fibonacci/range'].observe(start):
+                logger.info("Server: %s Fibonacci Values streamed for n=%s..%s", server_name, fibo_start, fibo_end)
+        finally:
+            call.cancel()
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
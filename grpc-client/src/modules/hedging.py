@@ -0,0 +1,294 @@
+import time
+import heapq
+import itertools
+import threading
+import grpc
+from prometheus_client import Counter
+from modules.logger import get_logger
+
+logger = get_logger(__name__, log_level="INFO")
+
+hedges_sent = Counter('client_hedges_total', 'Total number of hedged attempts sent after the first attempt of a gRPC call', ['method'])
+hedge_wins = Counter('client_hedge_wins_total', 'Total number of gRPC calls answered by a hedged attempt', ['method'])
+hedges_throttled = Counter('client_hedges_throttled_total', 'Total number of hedged attempts not sent because the hedging budget was spent', ['method'])
+
+
+class HedgeBudget:
+    """
+    Limits hedged attempts to a share of the calls, so hedging cannot multiply the load when all servers are slow.
+
+    Every call adds `percent / 100` tokens, up to `burst`, and every hedged attempt takes one.
+
+    Attributes:
+    percent (float): The hedged attempts allowed per 100 calls.
+    burst (float): The most tokens saved up while calls are fast.
+    """
+
+    def __init__(self, percent, burst=10):
+        self.percent = percent
+        self.burst = burst
+        self._tokens = burst
+        self._lock = threading.Lock()
+
+    def call(self):
+        """
+        Adds the tokens of a started call.
+        """
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.percent / 100)
+
+    def spend(self):
+        """
+        Takes the token of a hedged attempt.
+
+        Returns:
+        bool: True if the attempt may be sent.
+        """
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Timer:
+    """
+    Runs callbacks after a delay on one thread, instead of a threading.Timer thread per call.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def schedule(self, delay, callback):
+        with self._condition:
+            heapq.heappush(self._heap, (time.monotonic() + delay, next(self._sequence), callback))
+            if self._thread is None:
+                # Started on first use, so a gunicorn worker starts its own thread after the fork
+                self._thread = threading.Thread(target=self._run, name='hedging-timer', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._heap or self._heap[0][0] > time.monotonic():
+                    self._condition.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                _, _, callback = heapq.heappop(self._heap)
+            try:
+                callback()
+            except Exception:
+                logger.exception("Hedged attempt could not be started")
+
+
+_timer = _Timer()
+
+
+class _HedgedCall(grpc.Future):
+    """
+    One hedged call: a future over up to `max_attempts` attempts of the same request.
+
+    The first attempt is sent at once, and another one whenever `delay` passes without a
+    response or an attempt fails with a non-fatal status code, as long as the budget allows.
+    The first response or fatal error completes the call and cancels the other attempts.
+    Every attempt picks its own channel, so it can reach another server.
+    """
+
+    def __init__(self, multi_callable, policy, budget, method, request, timeout, metadata, kwargs):
+        self._multi_callable = multi_callable
+        self._policy = policy
+        self._budget = budget
+        self._method = method
+        self._request = request
+        self._deadline = time.monotonic() + timeout if timeout is not None else None
+        self._metadata = tuple(metadata or ())
+        self._kwargs = kwargs
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._attempts = []
+        self._pending = 0
+        self._outcome = None
+        self._cancelled = False
+        self._callbacks = []
+        budget.call()
+        self._attempt()
+
+    def _attempt(self):
+        # Returns whether an attempt was started
+        with self._lock:
+            if self._done.is_set() or len(self._attempts) >= self._policy.max_attempts:
+                return False
+            number = len(self._attempts)
+            throttled = number and not self._budget.spend()
+            if not throttled:
+                self._attempts.append(None)
+                self._pending += 1
+        if throttled:
+            hedges_throttled.labels(method=self._method).inc()
+            return False
+        timeout = None if self._deadline is None else max(self._deadline - time.monotonic(), 0)
+        metadata = self._metadata + (('hedge-attempt', str(number)),) if number else self._metadata
+        if number:
+            hedges_sent.labels(method=self._method).inc()
+        attempt = self._multi_callable.future(self._request, timeout=timeout, metadata=metadata or None, **self._kwargs)
+        with self._lock:
+            self._attempts[number] = attempt
+            cancel = self._done.is_set()
+        if cancel:
+            attempt.cancel()
+        attempt.add_done_callback(lambda attempt: self._attempt_done(number, attempt))
+        if number + 1 < self._policy.max_attempts:
+            _timer.schedule(self._policy.delay, lambda: self._delay_passed(number + 1))
+        return True
+
+    def _delay_passed(self, attempts):
+        # Only hedge if no other attempt was started since this timer was set
+        if len(self._attempts) == attempts:
+            self._attempt()
+
+    def _attempt_done(self, number, attempt):
+        with self._lock:
+            self._pending -= 1
+        if self._done.is_set():
+            return
+        code = attempt.code()
+        if code == grpc.StatusCode.OK:
+            if number:
+                hedge_wins.labels(method=self._method).inc()
+        elif code in self._policy.non_fatal_codes and (self._attempt() or self._pending):
+            return
+        self._finish(attempt)
+
+    def _finish(self, outcome, cancelled=False):
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._outcome = outcome
+            self._cancelled = cancelled
+            self._done.set()
+            attempts, callbacks, self._callbacks = self._attempts, self._callbacks, []
+        for attempt in attempts:
+            if attempt is not None and attempt is not outcome:
+                attempt.cancel()
+        for callback in callbacks:
+            callback(self)
+        return True
+
+    @property
+    def winner(self):
+        """
+        The attempt that completed the call, or None.
+        """
+        return self._outcome
+
+    def cancel(self):
+        return self._finish(None, cancelled=True)
+
+    def cancelled(self):
+        return self._cancelled
+
+    def running(self):
+        return not self._done.is_set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise grpc.FutureTimeoutError()
+        if self._cancelled:
+            raise grpc.FutureCancelledError()
+        return self._outcome.result()
+
+    def exception(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise grpc.FutureTimeoutError()
+        if self._cancelled:
+            raise grpc.FutureCancelledError()
+        return self._outcome.exception()
+
+    def traceback(self, timeout=None):
+        if not self._done.wait(timeout):
+            raise grpc.FutureTimeoutError()
+        if self._cancelled:
+            raise grpc.FutureCancelledError()
+        return self._outcome.traceback()
+
+    def add_done_callback(self, fn):
+        with self._lock:
+            if not self._done.is_set():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+
+class _HedgedMultiCallable:
+    """
+    A stub method whose calls are hedged according to a HedgingPolicy.
+    """
+
+    def __init__(self, multi_callable, policy, budget, method):
+        self._multi_callable = multi_callable
+        self._policy = policy
+        self._budget = budget
+        self._method = method
+
+    def future(self, request, timeout=None, metadata=None, **kwargs):
+        return _HedgedCall(self._multi_callable, self._policy, self._budget, self._method, request, timeout, metadata, kwargs)
+
+    def with_call(self, request, timeout=None, metadata=None, **kwargs):
+        call = self.future(request, timeout, metadata, **kwargs)
+        return call.result(), call.winner
+
+    def __call__(self, request, timeout=None, metadata=None, **kwargs):
+        return self.future(request, timeout, metadata, **kwargs).result()
+
+
+class HedgingChannel:
+    """
+    Wraps a channel, pool or balancer and hedges the calls of the methods with a hedging policy.
+
+    gRPC's C core ignores the `hedgingPolicy` of the service config, so the client applies it
+    itself, following gRFC A6: after `hedgingDelay` without a response, or right after a
+    non-fatal status code, the same request is sent again, up to `maxAttempts` attempts. Hedged
+    attempts carry `hedge-attempt` metadata, and the server stops computing an attempt once it
+    is cancelled. A HedgeBudget caps the hedged attempts at `budget_percent` of the calls.
+    Other methods are passed through unchanged.
+    """
+
+    def __init__(self, channel, policies, budget_percent=10):
+        """
+        Initializes the wrapper.
+
+        Parameters:
+        channel: The channel, ChannelPool or P2CBalancer the attempts are sent on.
+        policies (dict): The HedgingPolicy keyed by full method name.
+        budget_percent (float): The hedged attempts allowed per 100 calls (default is 10).
+        """
+        self._channel = channel
+        self._policies = policies
+        self._budget = HedgeBudget(budget_percent)
+
+    def unary_unary(self, method, request_serializer=None, response_deserializer=None, **kwargs):
+        multi_callable = self._channel.unary_unary(method, request_serializer=request_serializer, response_deserializer=response_deserializer, **kwargs)
+        policy = self._policies.get(method)
+        if policy is None:
+            return multi_callable
+        return _HedgedMultiCallable(multi_callable, policy, self._budget, method.rsplit('/', 1)[-1])
+
+    def unary_stream(self, *args, **kwargs):
+        return self._channel.unary_stream(*args, **kwargs)
+
+    def stream_unary(self, *args, **kwargs):
+        return self._channel.stream_unary(*args, **kwargs)
+
+    def stream_stream(self, *args, **kwargs):
+        return self._channel.stream_stream(*args, **kwargs)
+
+    def close(self):
+        """
+        Closes the wrapped channel.
+        """
+        self._channel.close()
@@ -0,0 +1,129 @@
+import os
+import json
+import grpc
+from collections import namedtuple
+from modules.proto import fibonacci_pb2
+
+SERVICE = fibonacci_pb2.DESCRIPTOR.services_by_name['FibonacciService']
+# Only read the server's state, so sending them more than once is safe; Increment and IncrementBy are never retried
+IDEMPOTENT_METHODS = ('Fibonacci', 'FibonacciBatch', 'FibonacciRange')
+# The unary-unary methods among them, which the client can hedge itself
+HEDGED_METHODS = ('Fibonacci', 'FibonacciBatch')
+
+HedgingPolicy = namedtuple('HedgingPolicy', ['max_attempts', 'delay', 'non_fatal_codes'])
+
+
+def _duration(ms):
+    return f'{ms / 1000:.3f}s'
+
+
+def _codes(name, default):
+    return [code.strip().upper() for code in os.environ.get(name, default).split(',') if code.strip()]
+
+
+def build_service_config():
+    """
+    Builds the service config of the FibonacciService channels from the environment.
+
+    `GRPC_SERVICE_CONFIG` takes a complete service config as JSON. Otherwise the idempotent
+    methods get a `hedgingPolicy` if `GRPC_HEDGING_MAX_ATTEMPTS` is above 1, or else a
+    `retryPolicy` if `GRPC_RETRY_MAX_ATTEMPTS` is above 1. `GRPC_METHOD_TIMEOUTS_MS` sets
+    per-method timeouts such as `Fibonacci=500,FibonacciBatch=5000`, and
+    `GRPC_RETRY_THROTTLING_MAX_TOKENS` enables retry throttling.
+
+    Returns:
+    dict: The service config, empty if nothing is configured.
+    """
+    override = os.environ.get('GRPC_SERVICE_CONFIG')
+    if override:
+        return json.loads(override)
+
+    timeouts = dict(item.split('=', 1) for item in os.environ.get('GRPC_METHOD_TIMEOUTS_MS', '').split(',') if item)
+    retry_attempts = int(os.environ.get('GRPC_RETRY_MAX_ATTEMPTS', 0))
+    hedging_attempts = int(os.environ.get('GRPC_HEDGING_MAX_ATTEMPTS', 0))
+    method_configs = []
+    for method in SERVICE.methods:
+        method_config = {}
+        if method.name in timeouts:
+            method_config['timeout'] = _duration(int(timeouts[method.name]))
+        if hedging_attempts > 1 and method.name in HEDGED_METHODS:
+            method_config['hedgingPolicy'] = {
+                'maxAttempts': hedging_attempts,
+                'hedgingDelay': _duration(int(os.environ.get('GRPC_HEDGING_DELAY_MS', 50))),
+                'nonFatalStatusCodes': _codes('GRPC_HEDGING_NON_FATAL_CODES', 'UNAVAILABLE'),
+            }
+        elif retry_attempts > 1 and method.name in IDEMPOTENT_METHODS:
+            method_config['retryPolicy'] = {
+                'maxAttempts': retry_attempts,
+                'initialBackoff': _duration(int(os.environ.get('GRPC_RETRY_INITIAL_BACKOFF_MS', 100))),
+                'maxBackoff': _duration(int(os.environ.get('GRPC_RETRY_MAX_BACKOFF_MS', 1000))),
+                'backoffMultiplier': float(os.environ.get('GRPC_RETRY_BACKOFF_MULTIPLIER', 2)),
+                'retryableStatusCodes': _codes('GRPC_RETRYABLE_CODES', 'UNAVAILABLE'),
+            }
+        if method_config:
+            method_configs.append({'name': [{'service': SERVICE.full_name, 'method': method.name}], **method_config})
+
+    service_config = {}
+    if method_configs:
+        service_config['methodConfig'] = method_configs
+    max_tokens = int(os.environ.get('GRPC_RETRY_THROTTLING_MAX_TOKENS', 0))
+    if max_tokens > 0:
+        service_config['retryThrottling'] = {
+            'maxTokens': max_tokens,
+            'tokenRatio': float(os.environ.get('GRPC_RETRY_THROTTLING_TOKEN_RATIO', 0.1)),
+        }
+    return service_config
+
+
+def channel_options(service_config):
+    """
+    Returns the channel options that apply a service config.
+
+    gRPC's C core applies `timeout`, `retryPolicy` and `retryThrottling`, but silently ignores
+    `hedgingPolicy`. It is therefore left out here and applied by `modules.hedging` instead.
+
+    Parameters:
+    service_config (dict): The service config.
+
+    Returns:
+    list: The `grpc.service_config` option, or no option for an empty service config.
+    """
+    service_config = dict(service_config)
+    if 'methodConfig' in service_config:
+        service_config['methodConfig'] = [
+            {key: value for key, value in method_config.items() if key != 'hedgingPolicy'}
+            for method_config in service_config['methodConfig']
+        ]
+    if not service_config:
+        return []
+    return [('grpc.service_config', json.dumps(service_config))]
+
+
+def hedging_policies(service_config):
+    """
+    Returns the hedging policies of the unary-unary methods of a service config.
+
+    Parameters:
+    service_config (dict): The service config.
+
+    Returns:
+    dict: The HedgingPolicy keyed by full method name, such as `/fibonacci.FibonacciService/Fibonacci`.
+    """
+    unary_methods = [method.name for method in SERVICE.methods if not method.client_streaming and not method.server_streaming]
+    policies = {}
+    for method_config in service_config.get('methodConfig', ()):
+        policy = method_config.get('hedgingPolicy')
+        if not policy or int(policy.get('maxAttempts', 1)) < 2:
+            continue
+        hedging_policy = HedgingPolicy(
+            max_attempts=int(policy['maxAttempts']),
+            delay=float(policy.get('hedgingDelay', '0s').rstrip('s')),
+            non_fatal_codes=frozenset(grpc.StatusCode[code] for code in policy.get('nonFatalStatusCodes', ())),
+        )
+        for name in method_config.get('name', ()):
+            if name.get('service') != SERVICE.full_name:
+                continue
+            for method in [name['method']] if name.get('method') else unary_methods:
+                if method in unary_methods:
+                    policies[f'/{SERVICE.full_name}/{method}'] = hedging_policy
+    return policies
@@ -1,39 +1,41 @@
-import sys
+import os
 import asyncio
 import signal
-from modules.grpc_server import FibonacciService
+from modules.multiprocess import serve_processes
+from modules.logger import step_log_level
 
-def main():
-    server = FibonacciService()
+def main(process_index=None, start_metrics=True):
+    # Imported here, so the parent process of PROCESSES mode never imports grpc
+    from modules.grpc_server import FibonacciService
+    server = FibonacciService(process_index)
     loop = asyncio.get_event_loop()
 
-    # Define the signal handler function within the main function to capture the server instance
-    def signal_handler(signum, frame):
-        print(f"Received signal: {signum}")
-        # Use loop in the context of this closure
-        loop.run_until_complete(shutdown_server(server))
-        loop.stop()
-        sys.exit(0)
+    # Register signal handlers for SIGINT and SIGTERM that shut the server down on the event loop
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, lambda signum=signum: loop.create_task(shutdown_server(server, signum)))
 
-    # Register signal handlers for SIGINT and SIGTERM
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+    # SIGUSR1 and SIGUSR2 make the logging more or less verbose at runtime
+    loop.add_signal_handler(signal.SIGUSR1, step_log_level, -1)
+    loop.add_signal_handler(signal.SIGUSR2, step_log_level, 1)
 
-    # Start the server
-    loop.run_until_complete(server.serve())
-
-    # Run the event loop
-    loop.run_forever()
+    # Start the server and run until it has been shut down, then let the shutdown finish
+    loop.run_until_complete(server.serve(start_metrics))
+    loop.run_until_complete(asyncio.gather(*asyncio.all_tasks(loop)))
 
     # Close the event loop
     loop.close()
 
 # Function to gracefully shut down the server
-async def shutdown_server(server):
+async def shutdown_server(server, signum):
+    print(f"Received signal: {signum}")
     # Await graceful shutdown of the gRPC server
     await server.stop(grace=None)
     print("gRPC server has been shut down.")
 
 # Entry point
 if __name__ == '__main__':
-    main()
+    processes = int(os.environ.get('PROCESSES', 1))
+    if processes > 1:
+        serve_processes(processes, main)
+    else:
+        main()
@@ -0,0 +1,115 @@
+import time
+import threading
+
+
+class ComputationAbandoned(Exception):
+    """
+    Raised inside a Fibonacci computation once nobody waits for its result anymore.
+
+    Attributes:
+    reason (str): Why the computation was abandoned, `cancelled` or `deadline_exceeded`.
+    """
+
+    def __init__(self, reason):
+        # Only the reason is passed on, so the exception survives pickling back from the process pool
+        super().__init__(reason)
+        self.reason = reason
+
+    def __str__(self):
+        return f"Computation abandoned: {self.reason}"
+
+
+class Deadline:
+    """
+    A picklable cancellation check that only knows an absolute wall-clock deadline.
+
+    Computations on the process pool cannot reach the RPCs waiting for them, so they get
+    this check instead of the `CancellationToken` itself.
+
+    Attributes:
+    deadline (float): The `time.time()` after which the computation is abandoned, or None.
+    """
+
+    def __init__(self, deadline):
+        self.deadline = deadline
+
+    def __call__(self):
+        """
+        Raises ComputationAbandoned once the deadline has passed.
+        """
+        if self.deadline is not None and time.time() >= self.deadline:
+            raise ComputationAbandoned('deadline_exceeded')
+
+
+class CancellationToken:
+    """
+    Tracks the RPCs waiting for one computation and tells the computation when to stop.
+
+    The token is called as a check at bounded intervals by the computation, and raises
+    ComputationAbandoned once every waiter is gone: its RPC is no longer active, it left
+    explicitly (asyncio cancellation), or the latest deadline of all waiters has passed.
+    """
+
+    def __init__(self):
+        """
+        Initializes the token without waiters.
+        """
+        self._lock = threading.Lock()
+        self._waiters = 0
+        self._is_active = []
+        self._deadline = None
+        self._unbounded = False
+        self._left = threading.Event()
+
+    def join(self, time_remaining=None, is_active=None):
+        """
+        Registers an RPC waiting for the computation.
+
+        Parameters:
+        time_remaining (float): The time left until the RPC's deadline, or None if it has none.
+        is_active (callable): Returns whether the RPC is still active, or None if the RPC leaves explicitly.
+        """
+        with self._lock:
+            self._waiters += 1
+            if time_remaining is None:
+                self._unbounded = True
+            else:
+                self._deadline = max(self._deadline or 0, time.time() + time_remaining)
+            if is_active is not None:
+                self._is_active.append(is_active)
+
+    def leave(self):
+        """
+        Unregisters a waiting RPC that was cancelled.
+
+        Returns:
+        bool: True if no waiter is left and the computation is abandoned.
+        """
+        with self._lock:
+            self._waiters -= 1
+            if self._waiters <= 0:
+                self._left.set()
+            return self._left.is_set()
+
+    def deadline(self):
+        """
+        Returns the picklable deadline check for computations on the process pool.
+
+        Returns:
+        Deadline: The latest deadline of all waiters, unbounded if one of them has none.
+        """
+        with self._lock:
+            return Deadline(None if self._unbounded else self._deadline)
+
+    def __call__(self):
+        """
+        Raises ComputationAbandoned if every waiter is gone.
+        """
+        if self._left.is_set():
+            raise ComputationAbandoned('cancelled')
+        with self._lock:
+            is_active = list(self._is_active)
+            deadline = None if self._unbounded else self._deadline
+        if is_active and not any(check() for check in is_active):
+            raise ComputationAbandoned('cancelled')
+        Deadline(deadline)()
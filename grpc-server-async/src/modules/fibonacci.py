@@ -0,0 +1,177 @@
+FAST_DOUBLING_THRESHOLD = 24
+
+
+def fibonacci_iterative(n):
+    """
+    Calculates the Fibonacci number for a given input `n` with a simple addition loop.
+
+    This is O(n) additions and is only used below `FAST_DOUBLING_THRESHOLD`,
+    where it beats fast doubling because no multiplications are involved.
+
+    Parameters:
+    n (int): The Fibonacci position.
+
+    Returns:
+    int: The calculated Fibonacci value.
+    """
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def fibonacci_pair(n, check=None):
+    """
+    Calculates the pair (F(n), F(n + 1)) using fast doubling.
+
+    Walks the bits of `n` from the most significant one using
+    F(2k) = F(k) * (2 * F(k + 1) - F(k)) and F(2k + 1) = F(k)^2 + F(k + 1)^2,
+    so only O(log n) big-int multiplications are needed. The optional `check` is called
+    before every doubling step and aborts the computation by raising.
+
+    Parameters:
+    n (int): The Fibonacci position.
+    check (callable): The cancellation check, or None.
+
+    Returns:
+    tuple: The Fibonacci values F(n) and F(n + 1).
+    """
+    a, b = 0, 1
+    for bit in bin(n)[2:]:
+        if check is not None:
+            check()
+        c = a * ((b << 1) - a)
+        d = a * a + b * b
+        if bit == '1':
+            a, b = d, c + d
+        else:
+            a, b = c, d
+    return a, b
+
+
+def fibonacci(n):
+    """
+    Calculates the Fibonacci number for a given input `n`.
+
+    Uses the addition loop for small `n` and fast doubling above `FAST_DOUBLING_THRESHOLD`.
+
+    Parameters:
+    n (int): The Fibonacci position.
+
+    Returns:
+    int: The calculated Fibonacci value.
+    """
+    if n < FAST_DOUBLING_THRESHOLD:
+        return fibonacci_iterative(n)
+    return fibonacci_pair(n)[0]
+
+
+def fibonacci_pair_from(k, pair, n, check=None):
+    """
+    Advances a known pair (F(k), F(k + 1)) forward to (F(n), F(n + 1)).
+
+    Short gaps are walked with the addition loop; longer gaps use
+    F(k + m) = F(k) * F(m - 1) + F(k + 1) * F(m), where F(m) comes from fast doubling.
+
+    Parameters:
+    k (int): The position of the known pair.
+    pair (tuple): The known Fibonacci values F(k) and F(k + 1).
+    n (int): The target Fibonacci position, not smaller than `k`.
+    check (callable): The cancellation check passed on to fast doubling, or None.
+
+    Returns:
+    tuple: The Fibonacci values F(n) and F(n + 1).
+    """
+    a, b = pair
+    m = n - k
+    if m < FAST_DOUBLING_THRESHOLD:
+        for _ in range(m):
+            a, b = b, a + b
+        return a, b
+    fm, fm1 = fibonacci_pair(m, check)
+    return a * (fm1 - fm) + b * fm, a * fm + b * fm1
+
+
+def fibonacci_sweep(k, pair, ns, check=None):
+    """
+    Calculates the pairs (F(n), F(n + 1)) for sorted positions in one forward sweep.
+
+    Every pair is advanced from the previous one, so the whole sweep costs roughly as much
+    as computing the largest position from the starting pair. The optional `check` is called
+    before every position and inside every fast doubling jump.
+
+    Parameters:
+    k (int): The position of the starting pair, not larger than the first position.
+    pair (tuple): The Fibonacci values F(k) and F(k + 1).
+    ns (list): The Fibonacci positions in ascending order.
+    check (callable): The cancellation check, or None.
+
+    Returns:
+    list: The pairs (F(n), F(n + 1)) in the order of `ns`.
+    """
+    pairs = []
+    for n in ns:
+        if check is not None:
+            check()
+        pair = fibonacci_pair_from(k, pair, n, check)
+        k = n
+        pairs.append(pair)
+    return pairs
+
+
+def fibonacci_advance(pair, step, step_pair=None, check=None):
+    """
+    Advances a pair (F(n), F(n + 1)) by `step` positions.
+
+    Without `step_pair` the pair is walked with `step` additions. With the pair
+    (F(step), F(step + 1)) it is a jump of four multiplications, which is cheaper
+    for steps of at least `FAST_DOUBLING_THRESHOLD`.
+
+    Parameters:
+    pair (tuple): The Fibonacci values F(n) and F(n + 1).
+    step (int): The number of positions to advance, at least 1.
+    step_pair (tuple): The Fibonacci values F(step) and F(step + 1), or None.
+    check (callable): The cancellation check, called once before advancing, or None.
+
+    Returns:
+    tuple: The Fibonacci values F(n + step) and F(n + step + 1).
+    """
+    if check is not None:
+        check()
+    a, b = pair
+    if step_pair is None:
+        for _ in range(step):
+            a, b = b, a + b
+        return a, b
+    fm, fm1 = step_pair
+    return a * (fm1 - fm) + b * fm, a * fm + b * fm1
+
+
+def fibonacci_range(k, pair, start, end, step, check=None):
+    """
+    Generates (n, F(n)) for every n in `start..end` (inclusive) with the given step.
+
+    Only the current pair is kept, so memory stays flat however large the range is.
+    For steps of at least `FAST_DOUBLING_THRESHOLD`, F(step) and F(step + 1) are calculated
+    once and every step is a jump of four multiplications.
+
+    Parameters:
+    k (int): The position of the starting pair, not larger than `start`.
+    pair (tuple): The Fibonacci values F(k) and F(k + 1).
+    start (int): The first Fibonacci position.
+    end (int): The last Fibonacci position.
+    step (int): The distance between two positions, at least 1.
+    check (callable): The cancellation check for the initial jumps, or None.
+
+    Yields:
+    tuple: The Fibonacci position and its value.
+    """
+    if start > end:
+        return
+    pair = fibonacci_pair_from(k, pair, start, check)
+    step_pair = fibonacci_pair(step, check) if step >= FAST_DOUBLING_THRESHOLD else None
+    for n in range(start, end + 1, step):
+        yield n, pair[0]
+        if n + step > end:
+            break
+        pair = fibonacci_advance(pair, step, step_pair)
@@ -1,39 +1,288 @@
 import os
+import time
 import asyncio
 import grpc
 from prometheus_client import start_http_server, Counter
 from modules.proto import fibonacci_pb2, fibonacci_pb2_grpc
-from modules.logger import get_logger
+from modules.logger import get_logger, RequestLogSampler
+from modules.fibonacci import FAST_DOUBLING_THRESHOLD, fibonacci_pair, fibonacci_pair_from, fibonacci_advance, fibonacci_sweep
+from modules.fibonacci_cache import FibonacciCache
+from modules.dispatcher import FibonacciDispatcher
+from modules.admission import AsyncAdmissionController, AdmissionRejected
+from modules.single_flight import AsyncSingleFlight
+from modules.cancellation import CancellationToken, ComputationAbandoned
+from modules.sharded_counter import ShardedCounter
+from modules.metrics_interceptor import AsyncMetricsInterceptor
+from modules.compression import AsyncCompressionInterceptor
+from modules.connections import connection_options
 
-# Create a counter for tracking the number of gRPC requests
-request_counter = Counter('grpc_requests_total', 'Total number of gRPC requests', ['method', 'server_name', 'mode'])
+cache_hits_counter = Counter('fibonacci_cache_hits_total', 'Total number of Fibonacci cache hits', ['server_name', 'mode'])
+cache_misses_counter = Counter('fibonacci_cache_misses_total', 'Total number of Fibonacci cache misses', ['server_name', 'mode'])
+cache_evictions_counter = Counter('fibonacci_cache_evictions_total', 'Total number of values evicted from the Fibonacci cache', ['server_name', 'mode'])
+admission_rejected_counter = Counter('grpc_admission_rejected_total', 'Total number of gRPC requests rejected by admission control', ['method', 'reason', 'server_name', 'mode'])
+coalesced_counter = Counter('fibonacci_coalesced_requests_total', 'Total number of Fibonacci requests that waited for an identical in-flight computation', ['server_name', 'mode'])
+abandoned_counter = Counter('fibonacci_abandoned_total', 'Total number of Fibonacci computations or responses abandoned because the caller was gone', ['method', 'stage', 'server_name', 'mode'])
 
 class FibonacciService(fibonacci_pb2_grpc.FibonacciServiceServicer):
     """
     A gRPC service class that implements the Fibonacci service using asynchronous programming.
 
-    This class handles two types of requests:
+    This class handles six types of requests:
     - `Increment`: Increments a counter and returns the current value.
+    - `IncrementBy`: Reserves several consecutive counter values at once.
     - `Fibonacci`: Calculates the Fibonacci number for a given input `n`.
+    - `FibonacciBatch`: Calculates the Fibonacci numbers for several inputs `n` in one sweep.
+    - `FibonacciRange`: Streams the Fibonacci numbers for a contiguous range of inputs `n`.
+    - `FibonacciStream`: Answers a bidirectional stream of Fibonacci requests, matched by correlation ID.
 
     Attributes:
-    counter (int): A counter used in the `Increment` method to track the number of requests.
+    counter (ShardedCounter): The counter used by the `Increment` and `IncrementBy` methods.
     logger: A logger for logging information about requests and server status.
     server_name (str): The name of the server, used in responses and logging.
     mode (str): The mode of the server, used in responses and logging.
+    cache (FibonacciCache): The memory-bounded cache of Fibonacci results and checkpoint pairs.
+    dispatcher (FibonacciDispatcher): Runs cache misses inline, on a thread pool or on a process pool depending on `n`.
+    admission (AsyncAdmissionController): Bounds concurrent RPCs, queued RPCs and the estimated work in flight.
+    retry_after_ms (int): The retry-after hint sent with rejected RPCs.
+    single_flight (AsyncSingleFlight): Coalesces concurrent cache misses for the same `n` into one computation.
+    request_logs (dict): The RequestLogSampler of every method, which samples its per-request log lines and logs periodic summaries.
+    stream_max_in_flight (int): The number of requests of one FibonacciStream that are computed concurrently.
     """
 
-    def __init__(self):
+    def __init__(self, process_index=None):
         """
         Initializes the Fibonacci service.
 
-        Initializes the logger, counter, server name, and mode based on environment variables.
+        Initializes the logger, counter, server name, mode, result cache, dispatcher, admission control, and single-flight group based on environment variables.
+
+        Parameters:
+        process_index (int): The index of this process in `PROCESSES` mode, appended to the server name, or None.
         """
-        self.counter = 0
         self.logger = get_logger(__name__, log_level="INFO")
         self.server_name = os.environ.get('POD_NAME', "server")
+        if process_index is not None:
+            self.server_name = f"{self.server_name}-{process_index}"
         self.mode = os.environ.get('MODE', "Normal")
+        self.grpc_port = int(os.environ.get('GRPC_PORT', 50051))
+        self.metrics_port = int(os.environ.get('METRICS_PORT', 8000))
         self.workers = int(os.environ.get('WORKERS', 1))
+        self.counter = ShardedCounter(shards=int(os.environ.get('COUNTER_SHARDS', 1)))
+        self.cache = FibonacciCache(
+            max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            checkpoint_interval=int(os.environ.get('CACHE_CHECKPOINT_INTERVAL', 256)),
+            checkpoint_max_bytes=int(os.environ.get('CACHE_CHECKPOINT_MAX_BYTES', 16 * 1024 * 1024)),
+        )
+        self.dispatcher = FibonacciDispatcher(
+            inline_max_n=int(os.environ.get('DISPATCH_INLINE_MAX_N', 4096)),
+            thread_max_n=int(os.environ.get('DISPATCH_THREAD_MAX_N', 65536)),
+            threads=int(os.environ.get('DISPATCH_THREADS', self.workers)),
+            processes=int(os.environ.get('DISPATCH_PROCESSES', min(self.workers, os.cpu_count() or 1))),
+            check_interval=int(os.environ.get('CANCELLATION_CHECK_INTERVAL_MS', 50)) / 1000,
+            server_name=self.server_name,
+            mode=self.mode,
+        )
+        self.admission = AsyncAdmissionController(
+            # The work is CPU-bound, far more concurrent RPCs than cores only add contention
+            max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 4 * (os.cpu_count() or 1))),
+            max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 100)),
+            max_work=int(os.environ.get('ADMISSION_MAX_WORK', 0)),
+            queue_timeout=int(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', 1000)) / 1000,
+        )
+        self.retry_after_ms = int(os.environ.get('ADMISSION_RETRY_AFTER_MS', 100))
+        self.single_flight = AsyncSingleFlight()
+        self.request_logs = {method: RequestLogSampler(self.logger, method) for method in (
+            'Increment', 'IncrementBy', 'Fibonacci', 'FibonacciBatch', 'FibonacciRange', 'FibonacciStream',
+        )}
+        self.stream_max_in_flight = int(os.environ.get('STREAM_MAX_IN_FLIGHT', 64))
+
+    def _store_fibonacci(self, n, pair):
+        """
+        Offers a computed pair to the cache as a checkpoint and caches its value.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        pair (tuple): The Fibonacci values F(n) and F(n + 1).
+
+        Returns:
+        int: The Fibonacci value F(n).
+        """
+        self.cache.add_checkpoint(n, pair)
+        evicted = self.cache.put(n, pair[0])
+        if evicted:
+            cache_evictions_counter.labels(server_name=self.server_name, mode=self.mode).inc(evicted)
+        return pair[0]
+
+    async def _compute_fibonacci(self, n, token):
+        """
+        Calculates F(n) on a cache miss, starting from the nearest checkpoint pair.
+
+        The computation runs on the dispatcher tier chosen for `n` and stops early once every RPC waiting for it is gone.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        token (CancellationToken): The cancellation check of the RPCs waiting for the value.
+
+        Returns:
+        int: The calculated Fibonacci value.
+        """
+        cache_misses_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+        k, pair = self.cache.nearest_checkpoint(n)
+        pair = await self.dispatcher.run_async(n, fibonacci_pair_from, k, pair, n, check=token)
+        return self._store_fibonacci(n, pair)
+
+    async def _fibonacci(self, n, context):
+        """
+        Returns F(n) from the cache or calculates it on a miss.
+
+        Concurrent misses for the same `n` share a single computation.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        context: The gRPC context of the RPC waiting for the value.
+
+        Returns:
+        int: The Fibonacci value.
+
+        Raises:
+        ComputationAbandoned: If the deadline of every RPC waiting for the value has passed.
+        """
+        result = self.cache.get(n)
+        if result is not None:
+            cache_hits_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+            return result
+        result, shared = await self.single_flight.do(n, self._compute_fibonacci, n, time_remaining=context.time_remaining())
+        if shared:
+            coalesced_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+        return result
+
+    async def _fibonacci_many(self, ns, context):
+        """
+        Returns F(n) for several sorted, distinct positions.
+
+        Cached values are reused and all misses are calculated in a single forward sweep that
+        starts at the checkpoint nearest to the smallest miss, on the dispatcher tier chosen for
+        the largest one.
+
+        Parameters:
+        ns (list): The Fibonacci positions in ascending order, without duplicates.
+        context: The gRPC context of the RPC waiting for the values.
+
+        Returns:
+        dict: The Fibonacci values keyed by position.
+
+        Raises:
+        ComputationAbandoned: If the RPC's deadline passed before the sweep finished.
+        """
+        results = {}
+        misses = []
+        for n in ns:
+            result = self.cache.get(n)
+            if result is None:
+                misses.append(n)
+            else:
+                results[n] = result
+        cache_hits_counter.labels(server_name=self.server_name, mode=self.mode).inc(len(ns) - len(misses))
+        if misses:
+            cache_misses_counter.labels(server_name=self.server_name, mode=self.mode).inc(len(misses))
+            k, pair = self.cache.nearest_checkpoint(misses[0])
+            token = CancellationToken()
+            token.join(context.time_remaining())
+            try:
+                pairs = await self.dispatcher.run_async(misses[-1], fibonacci_sweep, k, pair, misses, check=token)
+            except asyncio.CancelledError:
+                # Stop the sweep if it is already running on the thread pool
+                token.leave()
+                raise
+            for n, pair in zip(misses, pairs):
+                results[n] = self._store_fibonacci(n, pair)
+        return results
+
+    async def _fibonacci_range(self, start, end, step, token):
+        """
+        Generates (n, F(n)) for every n in `start..end` (inclusive) with the given step.
+
+        Works like `fibonacci_range`, but the initial jump to `start`, F(step) and every jump
+        of a large step run on the dispatcher tier chosen for their position, so a range of
+        large values does not block the event loop. Steps below `FAST_DOUBLING_THRESHOLD` are
+        a few additions, about as cheap as encoding the value, and stay on the event loop.
+
+        Parameters:
+        start (int): The first Fibonacci position.
+        end (int): The last Fibonacci position.
+        step (int): The distance between two positions, at least 1.
+        token (CancellationToken): The cancellation check of the RPC.
+
+        Yields:
+        tuple: The Fibonacci position and its value.
+
+        Raises:
+        ComputationAbandoned: If the RPC's deadline passed.
+        """
+        if start > end:
+            return
+        k, pair = self.cache.nearest_checkpoint(start)
+        pair = await self.dispatcher.run_async(start, fibonacci_pair_from, k, pair, start, check=token)
+        step_pair = await self.dispatcher.run_async(step, fibonacci_pair, step, check=token) if step >= FAST_DOUBLING_THRESHOLD else None
+        for n in range(start, end + 1, step):
+            yield n, pair[0]
+            if n + step > end:
+                break
+            if step_pair is None:
+                pair = fibonacci_advance(pair, step)
+            else:
+                pair = await self.dispatcher.run_async(n + step, fibonacci_advance, pair, step, step_pair, check=token)
+
+    async def _reject(self, context, method, rejection):
+        """
+        Counts an RPC rejected by admission control and fails it fast.
+
+        The RPC is aborted with `RESOURCE_EXHAUSTED` and a `retry-after-ms` hint in the trailing metadata,
+        repeated as `grpc-retry-pushback-ms` for clients retrying through gRPC's retry policy.
+
+        Parameters:
+        context: The gRPC context.
+        method (str): The name of the rejected method.
+        rejection (AdmissionRejected): The rejection raised by admission control.
+        """
+        admission_rejected_counter.labels(method=method, reason=rejection.reason, server_name=self.server_name, mode=self.mode).inc()
+        # grpc-retry-pushback-ms makes gRPC's own retries (retryPolicy of the client's service config) wait as long
+        context.set_trailing_metadata((('retry-after-ms', str(self.retry_after_ms)), ('grpc-retry-pushback-ms', str(self.retry_after_ms))))
+        await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(rejection))
+
+    async def _abandon(self, context, method, stage):
+        """
+        Counts work abandoned because the caller is gone and ends the RPC without a response.
+
+        Parameters:
+        context: The gRPC context.
+        method (str): The name of the method.
+        stage (str): `compute` if the computation stopped early, `response` if a finished result was not encoded.
+        """
+        abandoned_counter.labels(method=method, stage=stage, server_name=self.server_name, mode=self.mode).inc()
+        await context.abort(grpc.StatusCode.CANCELLED, "Caller is gone, work abandoned")
+
+    def _encode_value(self, result, encoding):
+        """
+        Encodes a Fibonacci value in the encoding requested by the client.
+
+        Only `VALUE_ENCODING_DECIMAL` pays for the quadratic int-to-decimal conversion;
+        hex is linear and `VALUE_ENCODING_BYTES_LE` puts the raw little-endian bytes into `raw_value`.
+
+        Parameters:
+        result (int): The Fibonacci value.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested by the client.
+
+        Returns:
+        dict: The `value` or `raw_value` field of a `FibonacciResponse` or `FibonacciValue`.
+
+        Raises:
+        ValueError: If the decimal value exceeds the interpreter's integer string conversion limit.
+        """
+        if encoding == fibonacci_pb2.VALUE_ENCODING_BYTES_LE:
+            return {'raw_value': result.to_bytes((result.bit_length() + 7) // 8, 'little')}
+        if encoding == fibonacci_pb2.VALUE_ENCODING_HEX:
+            return {'value': format(result, 'x')}
+        return {'value': str(result)}
 
     async def Increment(self, request, context):
         """
@@ -48,81 +297,307 @@ class FibonacciService(fibonacci_pb2_grpc.FibonacciServiceServicer):
         Returns:
         fibonacci_pb2.IncrementResponse: The response containing the new counter value and the server name.
         """
-        # Increment the request counter for Prometheus metrics
-        request_counter.labels(method='Increment', server_name=self.server_name, mode=self.mode).inc()
-
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
         # Increment the counter and log the response
-        self.counter += 1
-        self.logger.info(f"Server: {self.server_name} responded to client {request.name} with number {self.counter}")
+        _, number = self.counter.add()
+        if self.request_logs['Increment'].observe(start):
+            self.logger.info("Server: %s responded to client %s with number %s", self.server_name, request.name, number)
 
         # Return the response with the new counter value
-        return fibonacci_pb2.IncrementResponse(number=self.counter, server_name=self.server_name)
+        return fibonacci_pb2.IncrementResponse(number=number, server_name=self.server_name)
+
+    async def IncrementBy(self, request, context):
+        """
+        Handles IncrementBy requests asynchronously.
+
+        Reserves `delta` consecutive counter values in one call; a `delta` of 0 is rejected with `INVALID_ARGUMENT`.
+
+        Parameters:
+        request (fibonacci_pb2.IncrementByRequest): The gRPC request object containing the client name and `delta`.
+        context: The gRPC context.
+
+        Returns:
+        fibonacci_pb2.IncrementByResponse: The response containing the first and last reserved value and the server name.
+        """
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
+        # A delta of 0 would reserve nothing, so it is rejected instead of silently reserving one value
+        if request.delta <= 0:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT, "delta must be at least 1")
+        # Reserve the values and log the response
+        first, last = self.counter.add(request.delta)
+        if self.request_logs['IncrementBy'].observe(start):
+            self.logger.info("Server: %s responded to client %s with numbers %s..%s", self.server_name, request.name, first, last)
+
+        # Return the response with the reserved range
+        return fibonacci_pb2.IncrementByResponse(first=first, last=last, server_name=self.server_name)
 
     async def Fibonacci(self, request, context):
         """
         Handles Fibonacci requests asynchronously.
 
-        Calculates the Fibonacci number for the given input `n`.
+        Returns the Fibonacci number for the given input `n`, served from the cache when possible.
+        The request is subject to admission control with `n` as its estimated work. The computation
+        stops early once the caller cancels or its deadline expires, and no response is encoded for
+        a caller that is already gone.
 
         Parameters:
         request (fibonacci_pb2.FibonacciRequest): The gRPC request object containing the Fibonacci position `n`.
         context: The gRPC context.
 
         Returns:
-        fibonacci_pb2.FibonacciResponse: The response containing the calculated Fibonacci value and the server name.
+        fibonacci_pb2.FibonacciResponse: The response containing the calculated Fibonacci value, in the requested encoding, and the server name.
         """
-        # Increment the request counter for Prometheus metrics
-        request_counter.labels(method='Fibonacci', server_name=self.server_name, mode=self.mode).inc()
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
+        # Serve cache hits directly, dispatch misses by their estimated cost once admitted
+        try:
+            async with self.admission.admit(request.n, context.time_remaining()):
+                result = await self._fibonacci(request.n, context)
+        except AdmissionRejected as rejection:
+            await self._reject(context, 'Fibonacci', rejection)
+        except ComputationAbandoned:
+            await self._abandon(context, 'Fibonacci', 'compute')
+        except asyncio.CancelledError:
+            # grpc cancels the handler when the caller cancels or its deadline expires
+            abandoned_counter.labels(method='Fibonacci', stage='compute', server_name=self.server_name, mode=self.mode).inc()
+            raise
+        if context.cancelled():
+            await self._abandon(context, 'Fibonacci', 'response')
 
-        # Define the Fibonacci function
-        def fibonacci(n):
-            """
-            Calculates the Fibonacci number for a given input `n`.
+        # Log the response, the value itself is only formatted when debug logging is enabled
+        self.logger.debug("Server: %s responded to client with Fibonacci(%s) = %x", self.server_name, request.n, result)
+        if self.request_logs['Fibonacci'].observe(start, request.n):
+            self.logger.info("Server: %s responded to client with Fibonacci(%s)", self.server_name, request.n)
 
-            Parameters:
-            n (int): The Fibonacci position.
+        # Return the response with the calculated Fibonacci value in the requested encoding
+        try:
+            return fibonacci_pb2.FibonacciResponse(server_name=self.server_name, **self._encode_value(result, request.encoding))
+        except ValueError as error:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
 
-            Returns:
-            int: The calculated Fibonacci value.
-            """
-            a, b = 0, 1
-            for _ in range(n):
-                a, b = b, a + b
-            return a
+    async def FibonacciBatch(self, request, context):
+        """
+        Handles FibonacciBatch requests asynchronously.
+
+        De-duplicates and sorts the requested positions, then calculates all of them in one forward sweep
+        that stops early once the caller cancels or its deadline expires.
 
-        # Calculate the Fibonacci number in a separate thread using asyncio
-        result = await asyncio.to_thread(fibonacci, request.n)
+        Parameters:
+        request (fibonacci_pb2.FibonacciBatchRequest): The gRPC request object containing the Fibonacci positions `n`.
+        context: The gRPC context.
 
-        # Log the response
-        self.logger.info(f"Server: {self.server_name} responded to client with Fibonacci({request.n}) = {result}")
+        Returns:
+        fibonacci_pb2.FibonacciBatchResponse: The response containing one value per distinct position, in ascending order, and the server name.
+        """
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
+        # Calculate every distinct position once, in ascending order
+        ns = sorted(set(request.n))
+        try:
+            async with self.admission.admit(max(ns, default=0) + len(ns), context.time_remaining()):
+                results = await self._fibonacci_many(ns, context)
+        except AdmissionRejected as rejection:
+            await self._reject(context, 'FibonacciBatch', rejection)
+        except ComputationAbandoned:
+            await self._abandon(context, 'FibonacciBatch', 'compute')
+        except asyncio.CancelledError:
+            abandoned_counter.labels(method='FibonacciBatch', stage='compute', server_name=self.server_name, mode=self.mode).inc()
+            raise
+        if context.cancelled():
+            await self._abandon(context, 'FibonacciBatch', 'response')
+        if self.request_logs['FibonacciBatch'].observe(start):
+            self.logger.info("Server: %s responded to client with %s Fibonacci values for %s positions", self.server_name, len(ns), len(request.n))
 
-        # Return the response with the calculated Fibonacci value
-        return fibonacci_pb2.FibonacciResponse(value=str(result), server_name=self.server_name)
+        # Return the values in the requested encoding
+        try:
+            values = [fibonacci_pb2.FibonacciValue(n=n, **self._encode_value(results[n], request.encoding)) for n in ns]
+        except ValueError as error:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        return fibonacci_pb2.FibonacciBatchResponse(values=values, server_name=self.server_name)
 
-    async def serve(self):
+    async def FibonacciRange(self, request, context):
+        """
+        Handles FibonacciRange requests with an async generator.
+
+        Streams F(n) for every n from `start` to `end` (inclusive) in steps of `step` (0 means 1).
+        Each value is advanced from the previous one only after the previous message has been
+        written, so gRPC flow control paces the computation and memory stays flat. Large jumps
+        run on the dispatcher, so other RPCs are served while the range is computed. Calculating
+        the first value is subject to admission control with `start` plus `step` as its estimated
+        work; the slot is released before streaming, so a slow reader does not hold it for the
+        whole range.
+
+        Parameters:
+        request (fibonacci_pb2.FibonacciRangeRequest): The gRPC request object containing the range.
+        context: The gRPC context.
+
+        Yields:
+        fibonacci_pb2.FibonacciValue: One message per position in the range.
+        """
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
+
+        # Start from the checkpoint nearest to the first position, large jumps run on the dispatcher
+        step = request.step or 1
+        token = CancellationToken()
+        token.join(context.time_remaining())
+        values = self._fibonacci_range(request.start, request.end, step, token)
+        try:
+            # The first value includes the jump to `start` and F(step), the later ones are paced by the reader
+            async with self.admission.admit(request.start + step, context.time_remaining()):
+                value = await anext(values, None)
+            # The server name is sent once as initial metadata instead of with every value,
+            # only once admitted, so gRPC can still retry a rejected range
+            await context.send_initial_metadata((('server-name', self.server_name),))
+            while value is not None:
+                n, result = value
+                yield fibonacci_pb2.FibonacciValue(n=n, **self._encode_value(result, request.encoding))
+                value = await anext(values, None)
+        except AdmissionRejected as rejection:
+            await self._reject(context, 'FibonacciRange', rejection)
+        except ValueError as error:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        except ComputationAbandoned:
+            await self._abandon(context, 'FibonacciRange', 'compute')
+        except asyncio.CancelledError:
+            # Stop a jump that is already running on the thread pool
+            token.leave()
+            raise
+
+        if self.request_logs['FibonacciRange'].observe(start):
+            self.logger.info("Server: %s streamed Fibonacci(%s..%s, step %s) to client", self.server_name, request.start, request.end, step)
+
+    async def FibonacciStream(self, request_iterator, context):
+        """
+        Handles FibonacciStream requests asynchronously.
+
+        Requests are read as they arrive and up to `stream_max_in_flight` of them are computed
+        concurrently, so responses are written in completion order and carry the request `id`
+        for correlation. Reading pauses while the limit is reached, which lets gRPC flow control
+        slow the client down. Every request is subject to admission control with its `n` as the
+        estimated work, and a rejected request ends the stream.
+
+        Parameters:
+        request_iterator: The async iterator of fibonacci_pb2.FibonacciStreamRequest messages.
+        context: The gRPC context.
+
+        Yields:
+        fibonacci_pb2.FibonacciStreamResponse: One response per request.
+        """
+        # Start timing the request for the sampled request log
+        start = time.perf_counter()
+        # The server name is sent once as initial metadata instead of with every response
+        await context.send_initial_metadata((('server-name', self.server_name),))
+
+        responses = asyncio.Queue()
+        in_flight = asyncio.Semaphore(self.stream_max_in_flight)
+
+        async def answer(request):
+            try:
+                async with self.admission.admit(request.n, context.time_remaining()):
+                    result = await self._fibonacci(request.n, context)
+                await responses.put(fibonacci_pb2.FibonacciStreamResponse(id=request.id, n=request.n, **self._encode_value(result, request.encoding)))
+            except Exception as error:
+                # Passed on at once, so the stream ends without answering the remaining requests first
+                await responses.put(error)
+            finally:
+                in_flight.release()
+
+        async def read():
+            # Only the requests in flight are kept, so a long-lived stream does not grow
+            tasks = set()
+            try:
+                async for request in request_iterator:
+                    await in_flight.acquire()
+                    task = asyncio.create_task(answer(request))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                await asyncio.gather(*tasks)
+            finally:
+                # Requests still being computed are abandoned together with the stream
+                for task in list(tasks):
+                    task.cancel()
+                await responses.put(None)
+
+        # Yield responses until every request has been answered or one has failed
+        reader = asyncio.create_task(read())
+        count = 0
+        try:
+            while (response := await responses.get()) is not None:
+                if isinstance(response, Exception):
+                    raise response
+                count += 1
+                yield response
+            await reader
+        except AdmissionRejected as rejection:
+            await self._reject(context, 'FibonacciStream', rejection)
+        except ValueError as error:
+            await context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        except ComputationAbandoned:
+            await self._abandon(context, 'FibonacciStream', 'compute')
+        finally:
+            reader.cancel()
+
+        if self.request_logs['FibonacciStream'].observe(start):
+            self.logger.info("Server: %s responded to client with %s Fibonacci values over a stream", self.server_name, count)
+
+    async def serve(self, start_metrics=True):
         """
         Starts the asynchronous gRPC server and the Prometheus metrics server.
 
-        The gRPC server listens on `0.0.0.0:50051`, and the Prometheus metrics server listens on `0.0.0.0:8000`.
+        The gRPC server listens on `0.0.0.0:GRPC_PORT` (default 50051) with `SO_REUSEPORT`, so several
+        server processes can share the port, and the Prometheus metrics server listens on
+        `0.0.0.0:METRICS_PORT` (default 8000). Client connections are limited in age and idle time
+        by the `GRPC_MAX_CONNECTION_*` environment variables, see `connection_options`. Response
+        compression is set by the `GRPC_COMPRESSION*` environment variables, see `AsyncCompressionInterceptor`.
+
+        Parameters:
+        start_metrics (bool): Whether to start the metrics server, False when the parent process serves the metrics of all processes.
         """
-        # Create an asynchronous gRPC server using grpc
-        server = grpc.aio.server()
+        # Start the dispatcher pools before any gRPC thread exists
+        self.dispatcher.start()
+
+        # Responses above GRPC_COMPRESSION_MIN_BYTES are compressed with GRPC_COMPRESSION, if set
+        compression = AsyncCompressionInterceptor(self.server_name, self.mode)
+
+        # Create an asynchronous gRPC server using grpc, RPCs beyond the admission limits are rejected by grpc itself,
+        # and every RPC is measured by the metrics interceptor
+        self.server = server = grpc.aio.server(
+            maximum_concurrent_rpcs=self.admission.max_concurrent + self.admission.max_queue,
+            options=[('grpc.so_reuseport', 1), *connection_options()],
+            interceptors=[AsyncMetricsInterceptor(self.server_name, self.mode), *([compression] if compression.enabled else [])],
+        )
 
         # Add the FibonacciService to the server
         fibonacci_pb2_grpc.add_FibonacciServiceServicer_to_server(self, server)
 
         # Bind the server to the specified address
-        server_address = '0.0.0.0:50051'
+        server_address = f'0.0.0.0:{self.grpc_port}'
         server.add_insecure_port(server_address)
 
         # Start the asynchronous gRPC server
         await server.start()
-        self.logger.info(f"Async gRPC server started on {server_address}")
+        self.logger.info("Async gRPC server %s started on %s", self.server_name, server_address)
 
-        # Start the Prometheus metrics server
-        metrics_address = '0.0.0.0:8000'
-        start_http_server(8000)
-        self.logger.info(f"Metrics server started on {metrics_address}")
+        # Start the Prometheus metrics server unless the parent process serves it
+        if start_metrics:
+            metrics_address = f'0.0.0.0:{self.metrics_port}'
+            start_http_server(self.metrics_port)
+            self.logger.info("Metrics server started on %s", metrics_address)
 
         # Keep the server running indefinitely
-        await server.wait_for_termination()
+        try:
+            await server.wait_for_termination()
+        finally:
+            self.dispatcher.shutdown()
+
+    async def stop(self, grace=None):
+        """
+        Stops the asynchronous gRPC server started by `serve`, which makes `serve` return.
+
+        Parameters:
+        grace (float): The time in seconds in-flight RPCs get to finish, None aborts them right away.
+        """
+        await self.server.stop(grace)
@@ -1,11 +1,33 @@
+import os
+import copy
+import time
+import queue
+import atexit
+import random
+import signal
 import logging
+import logging.handlers
 import threading
-import traceback
+from collections import Counter as KeyCounter
+from prometheus_client import Counter
+
+dropped_records_counter = Counter('log_records_dropped_total', 'Total number of log records dropped because the log queue was full', ['level'])
+
+# Records waiting for the listener thread, beyond this records are dropped instead of blocking the caller
+LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE', 10000))
+# Every LOG_SAMPLE_RATE-th request is logged at INFO, all of them once a logger is at DEBUG
+LOG_SAMPLE_RATE = int(os.environ.get('LOG_SAMPLE_RATE', 100))
+# Seconds between two summary lines of a RequestLogSampler, 0 disables the summaries
+LOG_SUMMARY_INTERVAL_S = float(os.environ.get('LOG_SUMMARY_INTERVAL_S', 60))
+
+# The levels the log level signals step through, from most to least verbose
+LOG_LEVELS = (logging.DEBUG, logging.INFO, logging.WARNING, logging.ERROR, logging.CRITICAL)
 
 class LogFormatter(logging.Formatter):
     """A custom log formatter for colored console output.
 
     This formatter adds color coding to log messages based on their log level.
+    One `logging.Formatter` is built per level when the formatter is created.
 
     Attributes:
         grey (str): ANSI escape code for grey color.
@@ -38,41 +60,238 @@ class LogFormatter(logging.Formatter):
         logging.CRITICAL: bold_red + log_format + reset
     }
 
+    def __init__(self):
+        super().__init__()
+        self.formatters = {level: logging.Formatter(log_fmt) for level, log_fmt in self.FORMATS.items()}
+        self.default_formatter = logging.Formatter(self.log_format)
+
     def format(self, record: logging.LogRecord) -> str:
         """Format a log record with color-coded log level.
 
+        The traceback of a record with `exc_info` is appended by `logging.Formatter` itself.
+
         Args:
             record (logging.LogRecord): The log record to format.
 
         Returns:
             str: The formatted log message with color coding.
         """
-        log_fmt = self.FORMATS.get(record.levelno)
-        formatter = logging.Formatter(log_fmt)
-        if record.levelno == logging.ERROR:
-            exc_info = record.exc_info
-            if exc_info:
-                # Include the traceback in the log message
-                traceback_text = "\n".join(traceback.format_exception(*exc_info))
-                record.msg += "\n" + traceback_text
-        return formatter.format(record)
+        return self.formatters.get(record.levelno, self.default_formatter).format(record)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """A queue handler that never blocks the logging thread.
+
+    Records are put on a bounded queue without waiting. When the queue is full the record
+    is dropped and counted in `log_records_dropped_total`.
+    """
+
+    def prepare(self, record):
+        """Prepare a record for the listener thread.
+
+        Only the message arguments are merged and the traceback is rendered, so that the
+        record no longer references mutable objects of the caller. Timestamps, colors and
+        the final line are formatted on the listener thread.
+
+        Args:
+            record (logging.LogRecord): The log record to enqueue.
+
+        Returns:
+            logging.LogRecord: A copy of the record that is safe to hand to another thread.
+        """
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = _stream_handler.formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
 
+    def enqueue(self, record):
+        self.queue.put_nowait(record)
+
+    def emit(self, record):
+        try:
+            self.enqueue(self.prepare(record))
+        except queue.Full:
+            dropped_records_counter.labels(level=record.levelname).inc()
+        except Exception:
+            self.handleError(record)
+
+
+class BlockingStopQueueListener(logging.handlers.QueueListener):
+    """A queue listener whose stop sentinel waits for room on the bounded queue."""
+
+    def enqueue_sentinel(self):
+        self.queue.put(self._sentinel)
+
+
+_queue = queue.Queue(LOG_QUEUE_SIZE)
+_stream_handler = logging.StreamHandler()
+_stream_handler.setFormatter(LogFormatter())
+_listener = BlockingStopQueueListener(_queue, _stream_handler)
+_listener_lock = threading.Lock()
+_listener_started = False
+
+
+def _start_listener():
+    """Start the listener thread writing queued records, once per process."""
+    global _listener_started
+    with _listener_lock:
+        if not _listener_started:
+            _listener_started = True
+            _listener.start()
+            # Flush the records still queued when the interpreter exits
+            atexit.register(_listener.stop)
+
+
+_logger_names = set()
+_runtime_level = None
+
+
+def set_log_level(level):
+    """Change the level of every logger created by `get_logger` in this process.
+
+    Args:
+        level (int): The new log level, such as logging.DEBUG.
+    """
+    global _runtime_level
+    _runtime_level = level
+    for name in list(_logger_names):
+        logging.getLogger(name).setLevel(_runtime_level)
 
 
-class ThreadSafeLogger(logging.Logger):
-    """ this class take care of thread safe logging"""
-    def __init__(self, name, level=logging.NOTSET):
-        super().__init__(name, level)
-        self.lock = threading.Lock()
+def step_log_level(steps):
+    """Make every logger more (negative steps) or less (positive steps) verbose.
+
+    The step starts from the level of the most verbose logger and is clamped to `LOG_LEVELS`.
+
+    Args:
+        steps (int): The number of entries of `LOG_LEVELS` to move by.
+    """
+    current = min((logging.getLogger(name).level for name in list(_logger_names)), default=logging.INFO)
+    index = min(range(len(LOG_LEVELS)), key=lambda i: abs(LOG_LEVELS[i] - current))
+    level = LOG_LEVELS[max(0, min(len(LOG_LEVELS) - 1, index + steps))]
+    set_log_level(level)
+    # Logged at the new level, so the change is visible unless everything but CRITICAL is off
+    get_logger(__name__).log(level, "Log level changed to %s", logging.getLevelName(level))
+
+
+def install_log_level_signals():
+    """Let SIGUSR1 make this process's logging more verbose and SIGUSR2 less verbose.
+
+    Must be called from the main thread. Each signal moves one step along `LOG_LEVELS`,
+    e.g. `kill -USR1 <pid>` switches an INFO process to DEBUG without a restart. The change
+    runs on a short-lived thread, because the interrupted main thread may hold the log queue's lock.
+    """
+    signal.signal(signal.SIGUSR1, lambda signum, frame: threading.Thread(target=step_log_level, args=(-1,)).start())
+    signal.signal(signal.SIGUSR2, lambda signum, frame: threading.Thread(target=step_log_level, args=(1,)).start())
+
+
+class RequestLogSampler:
+    """Samples the per-request log lines of one method and summarizes all of its requests.
+
+    `observe` is called once per request and `sample` once per log line without a request of
+    its own, such as one line per value of a batch. Both return True for every `sample_rate`-th
+    call, or for every call while the logger is at DEBUG, and the caller only writes its log
+    line then. Every `interval` seconds the next request observed also writes one summary line
+    with the number of requests, their median and p99 latency and the most frequent keys (such
+    as `n`). The latencies come from a bounded reservoir, so memory stays flat at any request rate.
+
+    Attributes:
+        name (str): The name of the summarized method.
+    """
+
+    def __init__(self, logger, name, sample_rate=None, interval=None, top=5, reservoir_size=1024):
+        """Initialize the sampler with an empty interval.
+
+        Args:
+            logger (logging.Logger): The logger the summaries are written to.
+            name (str): The name of the summarized method.
+            sample_rate (int, optional): Log one in this many requests (default is `LOG_SAMPLE_RATE`).
+            interval (float, optional): Seconds between summaries (default is `LOG_SUMMARY_INTERVAL_S`).
+            top (int, optional): The number of most frequent keys in a summary (default is 5).
+            reservoir_size (int, optional): The number of latencies kept per interval (default is 1024).
+        """
+        self.logger = logger
+        self.name = name
+        self.sample_rate = max(sample_rate or LOG_SAMPLE_RATE, 1)
+        self.interval = LOG_SUMMARY_INTERVAL_S if interval is None else interval
+        self.top = top
+        self.reservoir_size = reservoir_size
+        self._lock = threading.Lock()
+        self._calls = 0
+        self._reset(time.monotonic())
+
+    def _reset(self, now):
+        self._started = now
+        self._count = 0
+        self._latencies = []
+        self._keys = KeyCounter()
+
+    def sample(self):
+        """Decide whether to write one log line, without recording a request.
+
+        Returns:
+            bool: True for every `sample_rate`-th call, or for every call while the logger is at DEBUG.
+        """
+        with self._lock:
+            self._calls += 1
+            sampled = self._calls % self.sample_rate == 0
+        return sampled or self.logger.isEnabledFor(logging.DEBUG)
+
+    def observe(self, start, key=None):
+        """Record a finished request and decide whether to log it.
+
+        Args:
+            start (float): The `time.perf_counter()` at which the request started.
+            key (optional): The value to count in the summary, such as `n`, or None.
+
+        Returns:
+            bool: True if the caller should write the log line of this request.
+        """
+        elapsed = time.perf_counter() - start
+        now = time.monotonic()
+        summary = None
+        with self._lock:
+            self._calls += 1
+            sampled = self._calls % self.sample_rate == 0
+            if self.interval:
+                self._count += 1
+                if len(self._latencies) < self.reservoir_size:
+                    self._latencies.append(elapsed)
+                else:
+                    slot = random.randrange(self._count)
+                    if slot < self.reservoir_size:
+                        self._latencies[slot] = elapsed
+                if key is not None:
+                    self._keys[key] += 1
+                if now - self._started >= self.interval:
+                    summary = (now - self._started, self._count, self._latencies, self._keys)
+                    self._reset(now)
+        if summary:
+            self._log_summary(*summary)
+        return sampled or self.logger.isEnabledFor(logging.DEBUG)
+
+    def _log_summary(self, period, count, latencies, keys):
+        if not self.logger.isEnabledFor(logging.INFO):
+            return
+        latencies.sort()
+        p50 = latencies[len(latencies) // 2]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        top = ", ".join(f"{key} x{calls}" for key, calls in keys.most_common(self.top)) or "-"
+        self.logger.info(
+            "Summary: %s %s requests in %.0fs, p50 %.2f ms, p99 %.2f ms, top: %s",
+            self.name, count, period, p50 * 1000, p99 * 1000, top, stacklevel=3,
+        )
 
-    def handle(self, record):
-        with self.lock:
-            super().handle(record)
 
 def get_logger(filename, log_level=logging.INFO):
     """Get a configured logger for the specified filename.
 
     Retrieves a logger instance configured with a specified log level and log format.
+    The logger only puts records on a bounded queue; a single listener thread per process
+    formats them and writes them to the console, so logging never waits for I/O.
 
     Args:
         filename (str): The name of the logger (e.g., filename or module name).
@@ -82,10 +301,12 @@ def get_logger(filename, log_level=logging.INFO):
         logging.Logger: A configured logger instance.
     """
     filename = filename if filename else 'root'
-    log = ThreadSafeLogger(filename, log_level)
+    log = logging.getLogger(filename)
+    log.setLevel(_runtime_level or log_level)
     log.propagate = False
 
-    ch = logging.StreamHandler()
-    ch.setFormatter(LogFormatter())
-    log.addHandler(ch)
-    return log
\ No newline at end of file
+    if not any(isinstance(handler, DroppingQueueHandler) for handler in log.handlers):
+        log.addHandler(DroppingQueueHandler(_queue))
+    _logger_names.add(filename)
+    _start_listener()
+    return log
@@ -0,0 +1,324 @@
+import time
+import asyncio
+import grpc
+from prometheus_client import Counter, Gauge, Histogram
+from modules.proto import fibonacci_pb2
+from modules.connections import ConnectionTracker
+
+request_counter = Counter('grpc_requests_total', 'Total number of gRPC requests', ['method', 'server_name', 'mode'])
+handling_seconds = Histogram(
+    'grpc_server_handling_seconds', 'Time from receiving a gRPC request until its last response was sent',
+    ['method', 'code', 'n_bucket', 'server_name', 'mode'],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+)
+in_flight_gauge = Gauge('grpc_server_in_flight', 'Number of gRPC requests being handled', ['method', 'server_name', 'mode'], multiprocess_mode='livesum')
+request_bytes = Histogram(
+    'grpc_server_request_bytes', 'Size of received gRPC request messages', ['method', 'server_name', 'mode'],
+    buckets=tuple(64 * 4 ** i for i in range(11)),
+)
+response_bytes = Histogram(
+    'grpc_server_response_bytes', 'Size of sent gRPC response messages', ['method', 'server_name', 'mode'],
+    buckets=tuple(64 * 4 ** i for i in range(11)),
+)
+attempts_counter = Counter(
+    'grpc_server_attempts_total', 'Total number of gRPC requests that were a retry or a hedge of an earlier attempt of the same call',
+    ['method', 'kind', 'server_name', 'mode'],
+)
+
+# Request metadata marking a repeated attempt: gRPC sets the first on retries, the clients set the second on hedges
+ATTEMPT_METADATA = {'grpc-previous-rpc-attempts': 'retry', 'hedge-attempt': 'hedge'}
+
+# Upper bounds of the `n_bucket` label, aligned with the default dispatcher tiers
+N_BUCKETS = (64, 4096, 65536, 1048576)
+N_BUCKET_LABELS = tuple(str(bound) for bound in N_BUCKETS) + ('+Inf', 'none')
+
+
+def n_bucket(request):
+    """
+    Returns the `n_bucket` label of a request.
+
+    The size of a request is its `n`, the largest `n` of a batch, or the `end` of a range.
+
+    Parameters:
+    request: The deserialized request message, or None for client-streaming methods.
+
+    Returns:
+    str: The smallest upper bound in `N_BUCKETS` not below the size, `+Inf` above all of them, or `none` without a size.
+    """
+    n = getattr(request, 'n', None)
+    if n is None:
+        n = getattr(request, 'end', None)
+    if n is None:
+        return 'none'
+    if not isinstance(n, int):
+        n = max(n, default=0)
+    for bound, label in zip(N_BUCKETS, N_BUCKET_LABELS):
+        if n <= bound:
+            return label
+    return '+Inf'
+
+
+def _status(context, outcome):
+    """
+    Returns the status code name of a finished RPC.
+
+    Parameters:
+    context: The gRPC context.
+    outcome (str): The code to report if the handler did not set one, `OK`, `CANCELLED` or `UNKNOWN`.
+
+    Returns:
+    str: The name of the status code.
+    """
+    code = context.code()
+    if code is None:
+        return outcome
+    return code.name if isinstance(code, grpc.StatusCode) else grpc.StatusCode(code).name
+
+
+class _MethodMetrics:
+    """
+    The metric children of one gRPC method, bound once so a call only pays for dict lookups.
+
+    Attributes:
+    name (str): The short name of the method.
+    """
+
+    def __init__(self, name, server_name, mode, connections):
+        self.name = name
+        self._connections = connections
+        self._server_name = server_name
+        self._mode = mode
+        self.requests = request_counter.labels(method=name, server_name=server_name, mode=mode)
+        self.in_flight = in_flight_gauge.labels(method=name, server_name=server_name, mode=mode)
+        self.request_bytes = request_bytes.labels(method=name, server_name=server_name, mode=mode)
+        self.response_bytes = response_bytes.labels(method=name, server_name=server_name, mode=mode)
+        self.attempts = {kind: attempts_counter.labels(method=name, kind=kind, server_name=server_name, mode=mode) for kind in ATTEMPT_METADATA.values()}
+        self._latency = {
+            ('OK', bucket): handling_seconds.labels(method=name, code='OK', n_bucket=bucket, server_name=server_name, mode=mode)
+            for bucket in N_BUCKET_LABELS
+        }
+
+    def start(self, context):
+        """
+        Counts a started RPC, and whether it is a retried or hedged attempt.
+
+        Parameters:
+        context: The gRPC context.
+
+        Returns:
+        float: The start time for `finish`.
+        """
+        self._connections.seen(context.peer())
+        self.requests.inc()
+        self.in_flight.inc()
+        for key, _ in context.invocation_metadata() or ():
+            kind = ATTEMPT_METADATA.get(key)
+            if kind is not None:
+                self.attempts[kind].inc()
+        return time.perf_counter()
+
+    def finish(self, context, start, code, bucket):
+        """
+        Records the latency of a finished RPC.
+
+        Parameters:
+        context: The gRPC context.
+        start (float): The start time returned by `start`.
+        code (str): The name of the status code.
+        bucket (str): The `n_bucket` label.
+        """
+        elapsed = time.perf_counter() - start
+        # A long stream keeps its connection active
+        self._connections.seen(context.peer())
+        self.in_flight.dec()
+        child = self._latency.get((code, bucket))
+        if child is None:
+            child = self._latency[(code, bucket)] = handling_seconds.labels(
+                method=self.name, code=code, n_bucket=bucket, server_name=self._server_name, mode=self._mode
+            )
+        child.observe(elapsed)
+
+    def wrap_deserializer(self, deserializer):
+        """
+        Returns a request deserializer that records the size of every received message.
+        """
+        def deserialize(data):
+            self.request_bytes.observe(len(data))
+            return deserializer(data) if deserializer else data
+        return deserialize
+
+    def wrap_serializer(self, serializer):
+        """
+        Returns a response serializer that records the size of every sent message.
+        """
+        def serialize(message):
+            data = serializer(message) if serializer else message
+            self.response_bytes.observe(len(data))
+            return data
+        return serialize
+
+
+def _method_metrics(server_name, mode):
+    """
+    Binds the metric children of every FibonacciService method, sharing one connection tracker.
+
+    Returns:
+    dict: The _MethodMetrics keyed by full method name, such as `/fibonacci.FibonacciService/Fibonacci`.
+    """
+    service = fibonacci_pb2.DESCRIPTOR.services_by_name['FibonacciService']
+    connections = ConnectionTracker(server_name, mode)
+    return {f'/{service.full_name}/{method.name}': _MethodMetrics(method.name, server_name, mode, connections) for method in service.methods}
+
+
+def _wrap_handler(handler, metrics, wrap_unary, wrap_stream):
+    """
+    Returns a copy of a method handler whose behavior and (de)serializers record metrics.
+
+    Parameters:
+    handler (grpc.RpcMethodHandler): The handler of the method.
+    metrics (_MethodMetrics): The metric children of the method.
+    wrap_unary (callable): Wraps a behavior with a single response.
+    wrap_stream (callable): Wraps a behavior with streamed responses.
+
+    Returns:
+    grpc.RpcMethodHandler: The wrapped handler.
+    """
+    if handler.unary_unary:
+        fields = {'unary_unary': wrap_unary(handler.unary_unary, metrics, streaming_request=False)}
+    elif handler.stream_unary:
+        fields = {'stream_unary': wrap_unary(handler.stream_unary, metrics, streaming_request=True)}
+    elif handler.unary_stream:
+        fields = {'unary_stream': wrap_stream(handler.unary_stream, metrics, streaming_request=False)}
+    else:
+        fields = {'stream_stream': wrap_stream(handler.stream_stream, metrics, streaming_request=True)}
+    return handler._replace(
+        request_deserializer=metrics.wrap_deserializer(handler.request_deserializer),
+        response_serializer=metrics.wrap_serializer(handler.response_serializer),
+        **fields,
+    )
+
+
+class MetricsInterceptor(grpc.ServerInterceptor):
+    """
+    Records request counts, retried and hedged attempts, latency by status code and `n` bucket, in-flight requests, message sizes and
+    connection churn for the threaded server.
+
+    Message sizes are taken from the serialized bytes by wrapping the method's (de)serializers,
+    so nothing is serialized twice. Streaming responses are timed until the last message.
+    """
+
+    def __init__(self, server_name, mode):
+        """
+        Initializes the interceptor and binds the metric children of every method.
+
+        Parameters:
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        """
+        self._metrics = _method_metrics(server_name, mode)
+        self._handlers = {}
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        metrics = self._metrics.get(handler_call_details.method)
+        if handler is None or metrics is None:
+            return handler
+        wrapped = self._handlers.get(handler)
+        if wrapped is None:
+            wrapped = self._handlers[handler] = _wrap_handler(handler, metrics, self._wrap_unary, self._wrap_stream)
+        return wrapped
+
+    @staticmethod
+    def _wrap_unary(behavior, metrics, streaming_request):
+        def wrapper(request, context):
+            bucket = 'none' if streaming_request else n_bucket(request)
+            start = metrics.start(context)
+            outcome = 'UNKNOWN'
+            try:
+                response = behavior(request, context)
+                outcome = 'OK'
+                return response
+            finally:
+                metrics.finish(context, start, _status(context, outcome), bucket)
+        return wrapper
+
+    @staticmethod
+    def _wrap_stream(behavior, metrics, streaming_request):
+        def wrapper(request, context):
+            bucket = 'none' if streaming_request else n_bucket(request)
+            start = metrics.start(context)
+            outcome = 'UNKNOWN'
+            try:
+                yield from behavior(request, context)
+                outcome = 'OK'
+            except GeneratorExit:
+                outcome = 'CANCELLED'
+                raise
+            finally:
+                metrics.finish(context, start, _status(context, outcome), bucket)
+        return wrapper
+
+
+class AsyncMetricsInterceptor(grpc.aio.ServerInterceptor):
+    """
+    Records request counts, retried and hedged attempts, latency by status code and `n` bucket, in-flight requests, message sizes and
+    connection churn for the asyncio server.
+
+    Message sizes are taken from the serialized bytes by wrapping the method's (de)serializers,
+    so nothing is serialized twice. Streaming responses are timed until the last message.
+    """
+
+    def __init__(self, server_name, mode):
+        """
+        Initializes the interceptor and binds the metric children of every method.
+
+        Parameters:
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        """
+        self._metrics = _method_metrics(server_name, mode)
+        self._handlers = {}
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        metrics = self._metrics.get(handler_call_details.method)
+        if handler is None or metrics is None:
+            return handler
+        wrapped = self._handlers.get(handler)
+        if wrapped is None:
+            wrapped = self._handlers[handler] = _wrap_handler(handler, metrics, self._wrap_unary, self._wrap_stream)
+        return wrapped
+
+    @staticmethod
+    def _wrap_unary(behavior, metrics, streaming_request):
+        async def wrapper(request, context):
+            bucket = 'none' if streaming_request else n_bucket(request)
+            start = metrics.start(context)
+            outcome = 'UNKNOWN'
+            try:
+                response = await behavior(request, context)
+                outcome = 'OK'
+                return response
+            except asyncio.CancelledError:
+                outcome = 'CANCELLED'
+                raise
+            finally:
+                metrics.finish(context, start, _status(context, outcome), bucket)
+        return wrapper
+
+    @staticmethod
+    def _wrap_stream(behavior, metrics, streaming_request):
+        async def wrapper(request, context):
+            bucket = 'none' if streaming_request else n_bucket(request)
+            start = metrics.start(context)
+            outcome = 'UNKNOWN'
+            try:
+                async for response in behavior(request, context):
+                    yield response
+                outcome = 'OK'
+            except (asyncio.CancelledError, GeneratorExit):
+                outcome = 'CANCELLED'
+                raise
+            finally:
+                metrics.finish(context, start, _status(context, outcome), bucket)
+        return wrapper
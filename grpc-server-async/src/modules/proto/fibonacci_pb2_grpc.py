@@ -19,11 +19,31 @@ class FibonacciServiceStub(object):
                 request_serializer=proto_dot_fibonacci__pb2.IncrementRequest.SerializeToString,
                 response_deserializer=proto_dot_fibonacci__pb2.IncrementResponse.FromString,
                 )
+        self.IncrementBy = channel.unary_unary(
+                '/fibonacci.FibonacciService/IncrementBy',
+                request_serializer=proto_dot_fibonacci__pb2.IncrementByRequest.SerializeToString,
+                response_deserializer=proto_dot_fibonacci__pb2.IncrementByResponse.FromString,
+                )
         self.Fibonacci = channel.unary_unary(
                 '/fibonacci.FibonacciService/Fibonacci',
                 request_serializer=proto_dot_fibonacci__pb2.FibonacciRequest.SerializeToString,
                 response_deserializer=proto_dot_fibonacci__pb2.FibonacciResponse.FromString,
                 )
+        self.FibonacciBatch = channel.unary_unary(
+                '/fibonacci.FibonacciService/FibonacciBatch',
+                request_serializer=proto_dot_fibonacci__pb2.FibonacciBatchRequest.SerializeToString,
+                response_deserializer=proto_dot_fibonacci__pb2.FibonacciBatchResponse.FromString,
+                )
+        self.FibonacciRange = channel.unary_stream(
+                '/fibonacci.FibonacciService/FibonacciRange',
+                request_serializer=proto_dot_fibonacci__pb2.FibonacciRangeRequest.SerializeToString,
+                response_deserializer=proto_dot_fibonacci__pb2.FibonacciValue.FromString,
+                )
+        self.FibonacciStream = channel.stream_stream(
+                '/fibonacci.FibonacciService/FibonacciStream',
+                request_serializer=proto_dot_fibonacci__pb2.FibonacciStreamRequest.SerializeToString,
+                response_deserializer=proto_dot_fibonacci__pb2.FibonacciStreamResponse.FromString,
+                )
 
 
 class FibonacciServiceServicer(object):
@@ -35,12 +55,36 @@ class FibonacciServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def IncrementBy(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def Fibonacci(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def FibonacciBatch(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FibonacciRange(self, request, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def FibonacciStream(self, request_iterator, context):
+        """Missing associated documentation comment in .proto file."""
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_FibonacciServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -49,11 +93,31 @@ def add_FibonacciServiceServicer_to_server(servicer, server):
                     request_deserializer=proto_dot_fibonacci__pb2.IncrementRequest.FromString,
                     response_serializer=proto_dot_fibonacci__pb2.IncrementResponse.SerializeToString,
             ),
+            'IncrementBy': grpc.unary_unary_rpc_method_handler(
+                    servicer.IncrementBy,
+                    request_deserializer=proto_dot_fibonacci__pb2.IncrementByRequest.FromString,
+                    response_serializer=proto_dot_fibonacci__pb2.IncrementByResponse.SerializeToString,
+            ),
             'Fibonacci': grpc.unary_unary_rpc_method_handler(
                     servicer.Fibonacci,
                     request_deserializer=proto_dot_fibonacci__pb2.FibonacciRequest.FromString,
                     response_serializer=proto_dot_fibonacci__pb2.FibonacciResponse.SerializeToString,
             ),
+            'FibonacciBatch': grpc.unary_unary_rpc_method_handler(
+                    servicer.FibonacciBatch,
+                    request_deserializer=proto_dot_fibonacci__pb2.FibonacciBatchRequest.FromString,
+                    response_serializer=proto_dot_fibonacci__pb2.FibonacciBatchResponse.SerializeToString,
+            ),
+            'FibonacciRange': grpc.unary_stream_rpc_method_handler(
+                    servicer.FibonacciRange,
+                    request_deserializer=proto_dot_fibonacci__pb2.FibonacciRangeRequest.FromString,
+                    response_serializer=proto_dot_fibonacci__pb2.FibonacciValue.SerializeToString,
+            ),
+            'FibonacciStream': grpc.stream_stream_rpc_method_handler(
+                    servicer.FibonacciStream,
+                    request_deserializer=proto_dot_fibonacci__pb2.FibonacciStreamRequest.FromString,
+                    response_serializer=proto_dot_fibonacci__pb2.FibonacciStreamResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'fibonacci.FibonacciService', rpc_method_handlers)
@@ -81,6 +145,23 @@ class FibonacciService(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def IncrementBy(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/fibonacci.FibonacciService/IncrementBy',
+            proto_dot_fibonacci__pb2.IncrementByRequest.SerializeToString,
+            proto_dot_fibonacci__pb2.IncrementByResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def Fibonacci(request,
             target,
@@ -97,3 +178,54 @@ class FibonacciService(object):
             proto_dot_fibonacci__pb2.FibonacciResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FibonacciBatch(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_unary(request, target, '/fibonacci.FibonacciService/FibonacciBatch',
+            proto_dot_fibonacci__pb2.FibonacciBatchRequest.SerializeToString,
+            proto_dot_fibonacci__pb2.FibonacciBatchResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FibonacciRange(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/fibonacci.FibonacciService/FibonacciRange',
+            proto_dot_fibonacci__pb2.FibonacciRangeRequest.SerializeToString,
+            proto_dot_fibonacci__pb2.FibonacciValue.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def FibonacciStream(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(request_iterator, target, '/fibonacci.FibonacciService/FibonacciStream',
+            proto_dot_fibonacci__pb2.FibonacciStreamRequest.SerializeToString,
+            proto_dot_fibonacci__pb2.FibonacciStreamResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
@@ -0,0 +1,74 @@
+import itertools
+import threading
+
+
+class _Shard:
+    """
+    One stripe of a ShardedCounter with its own lock.
+
+    Attributes:
+    lock (threading.Lock): Guards the shard.
+    count (int): The number of values handed out through this shard.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.count = 0
+
+
+class ShardedCounter:
+    """
+    A counter that hands out exact, unique and contiguous values.
+
+    The values come from one sequence guarded by a single lock, so a reservation is always the
+    next `delta` numbers and the last number handed out equals the count. The lock is held only
+    for one addition. Every calling thread is assigned one of `shards` stripes in turn on its first
+    call, and the stripes only count the values handed out through them; `value` sums the stripes.
+    """
+
+    def __init__(self, shards):
+        """
+        Initializes the counter at zero.
+
+        Parameters:
+        shards (int): The number of stripes.
+        """
+        self._shards = [_Shard() for _ in range(max(shards, 1))]
+        self._lock = threading.Lock()
+        self._last = 0
+        # Thread idents are aligned addresses, so their remainders would map every thread onto the same stripe
+        self._stripes = itertools.count()
+        self._local = threading.local()
+
+    def add(self, delta=1):
+        """
+        Reserves `delta` consecutive values.
+
+        Parameters:
+        delta (int): The number of values to reserve, at least 1.
+
+        Returns:
+        tuple: The first and the last reserved value.
+        """
+        with self._lock:
+            first = self._last + 1
+            self._last += delta
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._shards[next(self._stripes) % len(self._shards)]
+        with shard.lock:
+            shard.count += delta
+        return first, first + delta - 1
+
+    def value(self):
+        """
+        Returns the number of values handed out so far.
+
+        Returns:
+        int: The sum over all stripes.
+        """
+        total = 0
+        for shard in self._shards:
+            with shard.lock:
+                total += shard.count
+        return total
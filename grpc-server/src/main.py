@@ -1,4 +1,18 @@
-from modules.grpc_server import FibonacciService
+import os
+from modules.multiprocess import serve_processes
+from modules.logger import install_log_level_signals
+
+def run_server(process_index=None, start_metrics=True):
+    # Imported here, so the parent process of PROCESSES mode never imports grpc
+    from modules.grpc_server import FibonacciService
+    server = FibonacciService(process_index)
+    # SIGUSR1 and SIGUSR2 make the logging more or less verbose at runtime
+    install_log_level_signals()
+    server.serve(start_metrics)
+
 if __name__ == '__main__':
-    server = FibonacciService()
-    server.serve()
+    processes = int(os.environ.get('PROCESSES', 1))
+    if processes > 1:
+        serve_processes(processes, run_server)
+    else:
+        run_server()
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when admission control rejects an RPC.
+
+    Attributes:
+    reason (str): Why the RPC was rejected, `queue_full` or `queue_timeout`.
+    """
+
+    def __init__(self, reason):
+        super().__init__(f"Server overloaded: {reason}")
+        self.reason = reason
+
+
+class _AdmissionState:
+    """
+    The limits and counters shared by the threaded and asyncio admission controllers.
+
+    An RPC is admitted while fewer than `max_concurrent` RPCs are running and the estimated
+    work in flight stays within `max_work`. Otherwise it waits in a queue of at most `max_queue`
+    RPCs for at most `queue_timeout` seconds (or its own deadline, if shorter).
+
+    Attributes:
+    max_concurrent (int): The number of RPCs allowed to run at the same time.
+    max_queue (int): The number of RPCs allowed to wait for admission.
+    max_work (int): The budget of estimated work in flight, 0 disables it.
+    queue_timeout (float): The longest time in seconds an RPC waits for admission.
+    active (int): The number of admitted RPCs that are still running.
+    waiting (int): The number of RPCs waiting for admission.
+    work (int): The estimated work of the admitted RPCs.
+    """
+
+    def __init__(self, max_concurrent, max_queue, max_work, queue_timeout):
+        self.max_concurrent = max(max_concurrent, 1)
+        self.max_queue = max(max_queue, 0)
+        self.max_work = max_work
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.work = 0
+
+    def _fits(self, cost):
+        # A single RPC larger than the whole budget is still admitted once nothing else runs.
+        if self.active >= self.max_concurrent:
+            return False
+        return self.max_work <= 0 or self.work == 0 or self.work + cost <= self.max_work
+
+    def _timeout(self, time_remaining):
+        if time_remaining is None:
+            return self.queue_timeout
+        return max(min(time_remaining, self.queue_timeout), 0)
+
+
+class AdmissionController(_AdmissionState):
+    """
+    Admission control for the threaded gRPC server.
+    """
+
+    def __init__(self, max_concurrent, max_queue, max_work, queue_timeout):
+        super().__init__(max_concurrent, max_queue, max_work, queue_timeout)
+        self._condition = threading.Condition()
+
+    @contextmanager
+    def admit(self, cost, time_remaining=None):
+        """
+        Admits an RPC for the duration of the `with` block.
+
+        Parameters:
+        cost (int): The estimated work of the RPC.
+        time_remaining (float): The time left until the RPC's deadline, or None.
+
+        Raises:
+        AdmissionRejected: If the queue is full or the RPC could not be admitted in time.
+        """
+        with self._condition:
+            if not self._fits(cost):
+                if self.waiting >= self.max_queue:
+                    raise AdmissionRejected('queue_full')
+                self.waiting += 1
+                try:
+                    if not self._condition.wait_for(lambda: self._fits(cost), timeout=self._timeout(time_remaining)):
+                        raise AdmissionRejected('queue_timeout')
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.work += cost
+        try:
+            yield
+        finally:
+            with self._condition:
+                self.active -= 1
+                self.work -= cost
+                self._condition.notify_all()
+
+
+class AsyncAdmissionController(_AdmissionState):
+    """
+    Admission control for the asyncio gRPC server.
+    """
+
+    def __init__(self, max_concurrent, max_queue, max_work, queue_timeout):
+        super().__init__(max_concurrent, max_queue, max_work, queue_timeout)
+        self._condition = asyncio.Condition()
+
+    @asynccontextmanager
+    async def admit(self, cost, time_remaining=None):
+        """
+        Admits an RPC for the duration of the `async with` block.
+
+        Parameters:
+        cost (int): The estimated work of the RPC.
+        time_remaining (float): The time left until the RPC's deadline, or None.
+
+        Raises:
+        AdmissionRejected: If the queue is full or the RPC could not be admitted in time.
+        """
+        async with self._condition:
+            if not self._fits(cost):
+                if self.waiting >= self.max_queue:
+                    raise AdmissionRejected('queue_full')
+                self.waiting += 1
+                try:
+                    await asyncio.wait_for(self._condition.wait_for(lambda: self._fits(cost)), self._timeout(time_remaining))
+                except asyncio.TimeoutError:
+                    raise AdmissionRejected('queue_timeout') from None
+                finally:
+                    self.waiting -= 1
+            self.active += 1
+            self.work += cost
+        try:
+            yield
+        finally:
+            async with self._condition:
+                self.active -= 1
+                self.work -= cost
+                self._condition.notify_all()
@@ -0,0 +1,249 @@
+import os
+import time
+import zlib
+import random
+import grpc
+from prometheus_client import Counter, Histogram
+from modules.proto import fibonacci_pb2
+
+compressed_messages = Counter(
+    'grpc_server_compressed_messages_total', 'Total number of response messages sent compressed', ['method', 'algorithm', 'server_name', 'mode'],
+)
+sampled_bytes = Counter(
+    'grpc_server_compression_sampled_bytes_total', 'Size of the sampled response messages before and after compression',
+    ['method', 'size_bucket', 'stage', 'server_name', 'mode'],
+)
+compression_seconds = Histogram(
+    'grpc_server_compression_seconds', 'Time to compress a sampled response message', ['method', 'size_bucket', 'server_name', 'mode'],
+    buckets=(0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1),
+)
+
+ALGORITHMS = {
+    'none': grpc.Compression.NoCompression,
+    'deflate': grpc.Compression.Deflate,
+    'gzip': grpc.Compression.Gzip,
+}
+# zlib window bits producing the format of each algorithm on the wire
+WBITS = {'deflate': zlib.MAX_WBITS, 'gzip': zlib.MAX_WBITS | 16}
+
+# Upper bounds of the `size_bucket` label in bytes of the uncompressed message
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536)
+
+
+def size_bucket(size):
+    """
+    Returns the `size_bucket` label of a message size.
+
+    Parameters:
+    size (int): The uncompressed size of the message in bytes.
+
+    Returns:
+    str: The smallest upper bound in `SIZE_BUCKETS` not below the size, or `+Inf`.
+    """
+    for bound in SIZE_BUCKETS:
+        if size <= bound:
+            return str(bound)
+    return '+Inf'
+
+
+class _MethodCompression:
+    """
+    The compression decision and metric children of one gRPC method.
+
+    Attributes:
+    name (str): The short name of the method.
+    """
+
+    def __init__(self, name, algorithm, min_bytes, sample_rate, server_name, mode):
+        self.name = name
+        self.compression = ALGORITHMS[algorithm]
+        self.min_bytes = min_bytes
+        self._wbits = WBITS[algorithm]
+        self._sample_rate = sample_rate
+        self._server_name = server_name
+        self._mode = mode
+        self.compressed = compressed_messages.labels(method=name, algorithm=algorithm, server_name=server_name, mode=mode)
+
+    def compress(self, response):
+        """
+        Returns whether a response message is large enough to be sent compressed, and counts it if so.
+        """
+        if self.min_bytes > 0 and response.ByteSize() < self.min_bytes:
+            return False
+        self.compressed.inc()
+        return True
+
+    def wrap_serializer(self, serializer):
+        """
+        Returns a response serializer that compresses a sample of the serialized messages to measure size and time.
+
+        gRPC compresses messages inside its C core without reporting sizes or time, so the sampled
+        messages are compressed once more with zlib, in the format of the configured algorithm.
+        """
+        def serialize(message):
+            data = serializer(message) if serializer else message
+            if random.random() < self._sample_rate:
+                self._sample(data)
+            return data
+        return serialize
+
+    def _sample(self, data):
+        bucket = size_bucket(len(data))
+        start = time.perf_counter()
+        compressor = zlib.compressobj(wbits=self._wbits)
+        compressed = len(compressor.compress(data)) + len(compressor.flush())
+        compression_seconds.labels(method=self.name, size_bucket=bucket, server_name=self._server_name, mode=self._mode).observe(time.perf_counter() - start)
+        sampled_bytes.labels(method=self.name, size_bucket=bucket, stage='uncompressed', server_name=self._server_name, mode=self._mode).inc(len(data))
+        sampled_bytes.labels(method=self.name, size_bucket=bucket, stage='compressed', server_name=self._server_name, mode=self._mode).inc(compressed)
+
+
+def _method_compression(server_name, mode):
+    """
+    Reads the compression settings from the environment and binds them for every FibonacciService method.
+
+    Returns:
+    dict: The _MethodCompression keyed by full method name, or None if `GRPC_COMPRESSION` is `none`.
+    """
+    algorithm = os.environ.get('GRPC_COMPRESSION', 'none')
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f"Unknown GRPC_COMPRESSION {algorithm!r}, expected one of {', '.join(ALGORITHMS)}")
+    if algorithm == 'none':
+        return None
+    min_bytes = int(os.environ.get('GRPC_COMPRESSION_MIN_BYTES', 1024))
+    sample_rate = float(os.environ.get('GRPC_COMPRESSION_SAMPLE_RATE', 0.01))
+    service = fibonacci_pb2.DESCRIPTOR.services_by_name['FibonacciService']
+    return {
+        f'/{service.full_name}/{method.name}': _MethodCompression(method.name, algorithm, min_bytes, sample_rate, server_name, mode)
+        for method in service.methods
+    }
+
+
+def _wrap_handler(handler, compression, wrap_unary, wrap_stream):
+    """
+    Returns a copy of a method handler whose behavior chooses the compression of its responses.
+    """
+    if handler.unary_unary:
+        fields = {'unary_unary': wrap_unary(handler.unary_unary, compression)}
+    elif handler.stream_unary:
+        fields = {'stream_unary': wrap_unary(handler.stream_unary, compression)}
+    elif handler.unary_stream:
+        fields = {'unary_stream': wrap_stream(handler.unary_stream, compression)}
+    else:
+        fields = {'stream_stream': wrap_stream(handler.stream_stream, compression)}
+    return handler._replace(response_serializer=compression.wrap_serializer(handler.response_serializer), **fields)
+
+
+class CompressionInterceptor(grpc.ServerInterceptor):
+    """
+    Compresses the responses of the threaded server that are at least `GRPC_COMPRESSION_MIN_BYTES` large.
+
+    Small messages cost compression CPU and gain next to nothing, so a unary response is only
+    compressed above the threshold, and a streamed message below it is sent uncompressed.
+    A `GRPC_COMPRESSION_SAMPLE_RATE` share of the messages is compressed once more to export
+    the compressed size and compression time by message size.
+    """
+
+    def __init__(self, server_name, mode):
+        """
+        Initializes the interceptor from the environment.
+
+        Parameters:
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        """
+        self._compression = _method_compression(server_name, mode) or {}
+        self._handlers = {}
+
+    @property
+    def enabled(self):
+        """
+        Whether `GRPC_COMPRESSION` selects an algorithm.
+        """
+        return bool(self._compression)
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        compression = self._compression.get(handler_call_details.method)
+        if handler is None or compression is None:
+            return handler
+        wrapped = self._handlers.get(handler)
+        if wrapped is None:
+            wrapped = self._handlers[handler] = _wrap_handler(handler, compression, self._wrap_unary, self._wrap_stream)
+        return wrapped
+
+    @staticmethod
+    def _wrap_unary(behavior, compression):
+        def wrapper(request, context):
+            response = behavior(request, context)
+            if response is not None and compression.compress(response):
+                context.set_compression(compression.compression)
+            return response
+        return wrapper
+
+    @staticmethod
+    def _wrap_stream(behavior, compression):
+        def wrapper(request, context):
+            context.set_compression(compression.compression)
+            for response in behavior(request, context):
+                if not compression.compress(response):
+                    context.disable_next_message_compression()
+                yield response
+        return wrapper
+
+
+class AsyncCompressionInterceptor(grpc.aio.ServerInterceptor):
+    """
+    Compresses the responses of the asyncio server that are at least `GRPC_COMPRESSION_MIN_BYTES` large.
+
+    Small messages cost compression CPU and gain next to nothing, so a unary response is only
+    compressed above the threshold, and a streamed message below it is sent uncompressed.
+    A `GRPC_COMPRESSION_SAMPLE_RATE` share of the messages is compressed once more to export
+    the compressed size and compression time by message size.
+    """
+
+    def __init__(self, server_name, mode):
+        """
+        Initializes the interceptor from the environment.
+
+        Parameters:
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        """
+        self._compression = _method_compression(server_name, mode) or {}
+        self._handlers = {}
+
+    @property
+    def enabled(self):
+        """
+        Whether `GRPC_COMPRESSION` selects an algorithm.
+        """
+        return bool(self._compression)
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        compression = self._compression.get(handler_call_details.method)
+        if handler is None or compression is None:
+            return handler
+        wrapped = self._handlers.get(handler)
+        if wrapped is None:
+            wrapped = self._handlers[handler] = _wrap_handler(handler, compression, self._wrap_unary, self._wrap_stream)
+        return wrapped
+
+    @staticmethod
+    def _wrap_unary(behavior, compression):
+        async def wrapper(request, context):
+            response = await behavior(request, context)
+            if response is not None and compression.compress(response):
+                context.set_compression(compression.compression)
+            return response
+        return wrapper
+
+    @staticmethod
+    def _wrap_stream(behavior, compression):
+        async def wrapper(request, context):
+            context.set_compression(compression.compression)
+            async for response in behavior(request, context):
+                if not compression.compress(response):
+                    context.disable_next_message_compression()
+                yield response
+        return wrapper
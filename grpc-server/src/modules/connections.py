@@ -0,0 +1,110 @@
+import os
+import time
+import threading
+from prometheus_client import Counter, Gauge, Histogram
+
+connections_counter = Counter('grpc_server_connections_total', 'Total number of client connections that sent their first RPC', ['server_name', 'mode'])
+connections_gauge = Gauge(
+    'grpc_server_connections_active', 'Number of client connections that sent an RPC recently', ['server_name', 'mode'],
+    multiprocess_mode='livesum',
+)
+connection_age = Histogram(
+    'grpc_server_connection_age_seconds', 'Time between the first and the last RPC of a client connection that went quiet',
+    ['server_name', 'mode'],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 7200),
+)
+
+# Server channel options for the connection lifetime, each set only if its environment variable is positive
+CONNECTION_OPTIONS = (
+    # A connection is sent GOAWAY after this long, so the client reconnects and may land on another server
+    ('grpc.max_connection_age_ms', 'GRPC_MAX_CONNECTION_AGE_MS'),
+    # RPCs still running on a connection sent GOAWAY get this long to finish before it is closed
+    ('grpc.max_connection_age_grace_ms', 'GRPC_MAX_CONNECTION_AGE_GRACE_MS'),
+    # A connection without any RPC for this long is sent GOAWAY
+    ('grpc.max_connection_idle_ms', 'GRPC_MAX_CONNECTION_IDLE_MS'),
+)
+
+
+def connection_options():
+    """
+    Returns the connection lifetime options of the gRPC server from the environment.
+
+    A client connection lives as long as the client keeps it by default, so clients stay on the
+    servers that existed when they connected. With `GRPC_MAX_CONNECTION_AGE_MS` the server sends
+    GOAWAY to connections older than that (jittered by gRPC by +-10%), the clients reconnect
+    transparently, and the service places the new connections across all current servers.
+
+    Returns:
+    list: The `(option, value)` pairs to pass to `grpc.server` or `grpc.aio.server`.
+    """
+    options = []
+    for option, variable in CONNECTION_OPTIONS:
+        value = int(os.environ.get(variable, 0))
+        if value > 0:
+            options.append((option, value))
+    return options
+
+
+class ConnectionTracker:
+    """
+    Derives connection churn metrics from the peer addresses of the RPCs.
+
+    gRPC Python does not report connections to the application, but the peer of an RPC, such as
+    `ipv4:10.0.0.7:51234`, is unique per client connection. A peer seen for the first time counts
+    as a new connection, and a peer without any RPC for `quiet_after` seconds is taken as closed:
+    it leaves `grpc_server_connections_active` and the time between its first and last RPC is
+    recorded in `grpc_server_connection_age_seconds`. Idle but open connections are therefore
+    counted as closed, and again as new once they send their next RPC. The metrics are updated
+    as RPCs start and finish.
+
+    Attributes:
+    quiet_after (float): The seconds without an RPC after which a connection is taken as closed.
+    """
+
+    def __init__(self, server_name, mode, quiet_after=None):
+        """
+        Initializes the tracker without any connection.
+
+        Parameters:
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        quiet_after (float): The seconds without an RPC after which a connection is taken as closed
+            (default is the `CONNECTION_QUIET_AFTER_S` environment variable or 60).
+        """
+        self.quiet_after = float(os.environ.get('CONNECTION_QUIET_AFTER_S', 60)) if quiet_after is None else quiet_after
+        self._opened = connections_counter.labels(server_name=server_name, mode=mode)
+        self._active = connections_gauge.labels(server_name=server_name, mode=mode)
+        self._age = connection_age.labels(server_name=server_name, mode=mode)
+        self._lock = threading.Lock()
+        # Peer -> [time of the first RPC, time of the last RPC]
+        self._peers = {}
+        self._next_sweep = 0
+
+    def seen(self, peer):
+        """
+        Records an RPC of a peer.
+
+        Parameters:
+        peer (str): The peer of the RPC, as returned by `context.peer()`.
+        """
+        now = time.monotonic()
+        with self._lock:
+            times = self._peers.get(peer)
+            changed = times is None
+            if changed:
+                self._peers[peer] = [now, now]
+                self._opened.inc()
+            else:
+                times[1] = now
+            if now >= self._next_sweep:
+                changed = self._sweep(now) or changed
+            if changed:
+                self._active.set(len(self._peers))
+
+    def _sweep(self, now):
+        self._next_sweep = now + min(self.quiet_after, 1)
+        quiet = [peer for peer, (_, last) in self._peers.items() if now - last >= self.quiet_after]
+        for peer in quiet:
+            first, last = self._peers.pop(peer)
+            self._age.observe(last - first)
+        return bool(quiet)
@@ -0,0 +1,254 @@
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError
+from prometheus_client import Counter, Gauge
+from modules.fibonacci import fibonacci_pair
+from modules.cancellation import ComputationAbandoned
+
+dispatch_counter = Counter('fibonacci_dispatch_total', 'Total number of Fibonacci computations per dispatch tier', ['tier', 'server_name', 'mode'])
+dispatch_queue_depth = Gauge('fibonacci_dispatch_queue_depth', 'Number of Fibonacci computations submitted to a pool and not finished yet', ['tier', 'server_name', 'mode'], multiprocess_mode='livesum')
+
+TIER_INLINE = 'inline'
+TIER_THREAD = 'thread'
+TIER_PROCESS = 'process'
+
+# The cancellation flags shared with the process pool, one slot per computation in flight
+CANCEL_SLOTS = 1024
+_cancel_flags = None
+
+
+def _init_process(cancel_flags):
+    global _cancel_flags
+    _cancel_flags = cancel_flags
+
+
+class _ProcessCheck:
+    """
+    The picklable cancellation check of a computation on the process pool.
+
+    The parent abandons the computation by setting its slot in the shared cancellation flags;
+    the deadline is checked by the worker itself.
+    """
+
+    def __init__(self, slot, deadline):
+        self.slot = slot
+        self.deadline = deadline
+
+    def __call__(self):
+        if self.slot is not None and _cancel_flags[self.slot]:
+            raise ComputationAbandoned('cancelled')
+        self.deadline()
+
+
+class FibonacciDispatcher:
+    """
+    Dispatches Fibonacci computations to an execution tier based on their estimated cost.
+
+    The cost of a computation grows with `n`, so `n` is used as the estimate:
+    - `inline`: `n` up to `inline_max_n` runs in the calling thread (or on the event loop).
+    - `thread`: `n` up to `thread_max_n` runs on a bounded thread pool.
+    - `process`: anything larger runs on a warm process pool, outside of the GIL.
+
+    A cancellation check is passed to pooled computations as their `check` keyword argument;
+    the process tier gets a picklable check backed by a shared flag and the deadline instead.
+    Inline computations are too short to be worth checking.
+
+    Attributes:
+    inline_max_n (int): The largest `n` computed inline.
+    thread_max_n (int): The largest `n` computed on the thread pool.
+    threads (int): The size of the thread pool.
+    processes (int): The size of the process pool.
+    check_interval (float): How often in seconds `run` checks for cancellation while it waits for a pool.
+    server_name (str): The name of the server, used in metrics.
+    mode (str): The mode of the server, used in metrics.
+    """
+
+    def __init__(self, inline_max_n, thread_max_n, threads, processes, check_interval, server_name, mode):
+        """
+        Initializes the dispatcher; the pools are created by `start`.
+
+        Parameters:
+        inline_max_n (int): The largest `n` computed inline.
+        thread_max_n (int): The largest `n` computed on the thread pool.
+        threads (int): The size of the thread pool.
+        processes (int): The size of the process pool.
+        check_interval (float): How often in seconds `run` checks for cancellation while it waits for a pool.
+        server_name (str): The name of the server, used in metrics.
+        mode (str): The mode of the server, used in metrics.
+        """
+        self.inline_max_n = inline_max_n
+        self.thread_max_n = thread_max_n
+        self.threads = max(threads, 1)
+        self.processes = max(processes, 1)
+        self.check_interval = check_interval
+        self.server_name = server_name
+        self.mode = mode
+        self._pools = {}
+        self._slots_lock = threading.Lock()
+        self._free_slots = list(range(CANCEL_SLOTS))
+        self._slots = {}
+
+    def start(self):
+        """
+        Creates the thread and process pools and warms the process pool.
+
+        The process pool uses the `forkserver` start method, so its workers never inherit
+        gRPC threads, and every worker is started upfront so the first expensive request
+        does not pay for process creation. The workers share one cancellation flag per slot with the server.
+        """
+        context = multiprocessing.get_context('forkserver')
+        self._cancel_flags = context.RawArray('b', CANCEL_SLOTS)
+        self._pools[TIER_THREAD] = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix='fibonacci')
+        self._pools[TIER_PROCESS] = ProcessPoolExecutor(
+            max_workers=self.processes, mp_context=context, initializer=_init_process, initargs=(self._cancel_flags,)
+        )
+        warmup = [self._pools[TIER_PROCESS].submit(fibonacci_pair, 1) for _ in range(self.processes)]
+        for future in warmup:
+            future.result()
+
+    def shutdown(self):
+        """
+        Shuts down the thread and process pools.
+        """
+        for pool in self._pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._pools = {}
+
+    def tier(self, n):
+        """
+        Returns the execution tier for a computation of the given size.
+
+        Parameters:
+        n (int): The Fibonacci position, used as the cost estimate.
+
+        Returns:
+        str: One of `inline`, `thread` or `process`.
+        """
+        if n <= self.inline_max_n or not self._pools:
+            return TIER_INLINE
+        if n <= self.thread_max_n:
+            return TIER_THREAD
+        return TIER_PROCESS
+
+    def submit(self, n, fn, *args, check=None):
+        """
+        Submits `fn(*args, check=check)` to the pool of the tier chosen for `n`.
+
+        Parameters:
+        n (int): The Fibonacci position, used as the cost estimate.
+        fn (callable): The function to run, it must be picklable for the process tier.
+        *args: The arguments of `fn`.
+        check (CancellationToken): The cancellation check of the computation, or None.
+
+        Returns:
+        concurrent.futures.Future: The future of the computation, or None for the inline tier.
+        """
+        tier = self.tier(n)
+        dispatch_counter.labels(tier=tier, server_name=self.server_name, mode=self.mode).inc()
+        if tier == TIER_INLINE:
+            return None
+        queue_depth = dispatch_queue_depth.labels(tier=tier, server_name=self.server_name, mode=self.mode)
+        queue_depth.inc()
+        slot = None
+        if tier == TIER_PROCESS and check is not None:
+            with self._slots_lock:
+                slot = self._free_slots.pop() if self._free_slots else None
+                if slot is not None:
+                    self._cancel_flags[slot] = 0
+            check = _ProcessCheck(slot, check.deadline())
+        future = self._pools[tier].submit(fn, *args, check=check)
+        if slot is not None:
+            with self._slots_lock:
+                self._slots[future] = slot
+        future.add_done_callback(lambda _: queue_depth.dec())
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _release_slot(self, future):
+        """
+        Returns the cancellation slot of a finished computation, if it had one.
+
+        Parameters:
+        future (concurrent.futures.Future): The future of the computation.
+        """
+        with self._slots_lock:
+            slot = self._slots.pop(future, None)
+            if slot is not None:
+                self._free_slots.append(slot)
+
+    def _abandon(self, future):
+        """
+        Cancels a pooled computation that has not started yet, or flags a running one on the process pool to stop.
+
+        Parameters:
+        future (concurrent.futures.Future): The future of the computation.
+        """
+        if future.cancel():
+            return
+        # Under the lock, so a slot released and reused meanwhile never flags another computation
+        with self._slots_lock:
+            slot = self._slots.get(future)
+            if slot is not None:
+                self._cancel_flags[slot] = 1
+
+    def run(self, n, fn, *args, check=None):
+        """
+        Runs `fn(*args)` on the tier chosen for `n` and waits for the result.
+
+        While waiting for a pool, `check` is called every `check_interval` seconds; once it raises,
+        the computation is cancelled if it has not started yet and abandoned otherwise.
+
+        Parameters:
+        n (int): The Fibonacci position, used as the cost estimate.
+        fn (callable): The function to run.
+        *args: The arguments of `fn`.
+        check (CancellationToken): The cancellation check of the computation, or None.
+
+        Returns:
+        The result of `fn(*args)`.
+
+        Raises:
+        ComputationAbandoned: If the computation was abandoned.
+        """
+        future = self.submit(n, fn, *args, check=check)
+        if future is None:
+            return fn(*args)
+        if check is None:
+            return future.result()
+        while True:
+            try:
+                return future.result(timeout=self.check_interval)
+            except TimeoutError:
+                try:
+                    check()
+                except ComputationAbandoned:
+                    self._abandon(future)
+                    raise
+
+    async def run_async(self, n, fn, *args, check=None):
+        """
+        Runs `fn(*args)` on the tier chosen for `n` without blocking the event loop.
+
+        Cancelling the awaiting task abandons the computation; a running one stops at its next `check`.
+
+        Parameters:
+        n (int): The Fibonacci position, used as the cost estimate.
+        fn (callable): The function to run.
+        *args: The arguments of `fn`.
+        check (CancellationToken): The cancellation check of the computation, or None.
+
+        Returns:
+        The result of `fn(*args)`.
+
+        Raises:
+        ComputationAbandoned: If the computation was abandoned.
+        """
+        future = self.submit(n, fn, *args, check=check)
+        if future is None:
+            return fn(*args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
@@ -0,0 +1,122 @@
+import sys
+import bisect
+import threading
+from collections import OrderedDict
+
+
+class FibonacciCache:
+    """
+    A memory-bounded, thread-safe cache of Fibonacci results.
+
+    Values are kept in LRU order and evicted once their total size in bytes exceeds
+    `max_bytes`, since F(n) grows linearly in size with `n`. Next to the values, a sparse
+    table of checkpoint pairs (F(k), F(k + 1)) is kept so a miss can be computed forward
+    from the nearest lower checkpoint instead of from zero.
+
+    Attributes:
+    max_bytes (int): The byte budget for cached values, 0 disables value caching.
+    checkpoint_interval (int): The minimum distance between two checkpoints.
+    checkpoint_max_bytes (int): The byte budget for checkpoint pairs; once reached, no new checkpoints are added.
+    size_bytes (int): The current size of the cached values in bytes.
+    """
+
+    def __init__(self, max_bytes, checkpoint_interval, checkpoint_max_bytes):
+        """
+        Initializes an empty cache.
+
+        Parameters:
+        max_bytes (int): The byte budget for cached values.
+        checkpoint_interval (int): The minimum distance between two checkpoints.
+        checkpoint_max_bytes (int): The byte budget for checkpoint pairs.
+        """
+        self.max_bytes = max_bytes
+        self.checkpoint_interval = max(checkpoint_interval, 1)
+        self.checkpoint_max_bytes = checkpoint_max_bytes
+        self.size_bytes = 0
+        self._values = OrderedDict()
+        self._checkpoint_keys = [0]
+        self._checkpoints = {0: (0, 1)}
+        self._checkpoint_bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, n):
+        """
+        Returns the cached F(n) and marks it as recently used.
+
+        Parameters:
+        n (int): The Fibonacci position.
+
+        Returns:
+        int: The cached Fibonacci value, or None on a miss.
+        """
+        with self._lock:
+            value = self._values.get(n)
+            if value is not None:
+                self._values.move_to_end(n)
+            return value
+
+    def put(self, n, value):
+        """
+        Stores F(n) and evicts least recently used values until the cache fits `max_bytes`.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        value (int): The Fibonacci value F(n).
+
+        Returns:
+        int: The number of evicted values.
+        """
+        size = sys.getsizeof(value)
+        if size > self.max_bytes:
+            return 0
+        evicted = 0
+        with self._lock:
+            previous = self._values.pop(n, None)
+            if previous is not None:
+                self.size_bytes -= sys.getsizeof(previous)
+            self._values[n] = value
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                _, old = self._values.popitem(last=False)
+                self.size_bytes -= sys.getsizeof(old)
+                evicted += 1
+        return evicted
+
+    def nearest_checkpoint(self, n):
+        """
+        Returns the closest checkpoint at or below `n`.
+
+        Parameters:
+        n (int): The Fibonacci position.
+
+        Returns:
+        tuple: The checkpoint position `k` and the pair (F(k), F(k + 1)).
+        """
+        with self._lock:
+            k = self._checkpoint_keys[bisect.bisect_right(self._checkpoint_keys, n) - 1]
+            return k, self._checkpoints[k]
+
+    def add_checkpoint(self, n, pair):
+        """
+        Records (F(n), F(n + 1)) as a checkpoint if no other checkpoint lies within `checkpoint_interval`.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        pair (tuple): The Fibonacci values F(n) and F(n + 1).
+
+        Returns:
+        bool: True if the pair was recorded.
+        """
+        size = sys.getsizeof(pair[0]) + sys.getsizeof(pair[1])
+        with self._lock:
+            if self._checkpoint_bytes + size > self.checkpoint_max_bytes:
+                return False
+            index = bisect.bisect_right(self._checkpoint_keys, n)
+            if n - self._checkpoint_keys[index - 1] < self.checkpoint_interval:
+                return False
+            if index < len(self._checkpoint_keys) and self._checkpoint_keys[index] - n < self.checkpoint_interval:
+                return False
+            self._checkpoint_keys.insert(index, n)
+            self._checkpoints[n] = pair
+            self._checkpoint_bytes += size
+            return True
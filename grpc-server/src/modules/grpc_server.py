@@ -1,49 +1,261 @@
 import os
+import time
 from concurrent import futures
 import grpc
 from prometheus_client import start_http_server, Counter
 from modules.proto import fibonacci_pb2, fibonacci_pb2_grpc
-from modules.logger import get_logger
+from modules.logger import get_logger, RequestLogSampler
+from modules.fibonacci import fibonacci_pair_from, fibonacci_sweep, fibonacci_range
+from modules.fibonacci_cache import FibonacciCache
+from modules.dispatcher import FibonacciDispatcher
+from modules.admission import AdmissionController, AdmissionRejected
+from modules.single_flight import SingleFlight
+from modules.cancellation import CancellationToken, ComputationAbandoned
+from modules.sharded_counter import ShardedCounter
+from modules.metrics_interceptor import MetricsInterceptor
+from modules.compression import CompressionInterceptor
+from modules.connections import connection_options
 
-request_counter = Counter('grpc_requests_total', 'Total number of gRPC requests', ['method', 'server_name', 'mode'])
+cache_hits_counter = Counter('fibonacci_cache_hits_total', 'Total number of Fibonacci cache hits', ['server_name', 'mode'])
+cache_misses_counter = Counter('fibonacci_cache_misses_total', 'Total number of Fibonacci cache misses', ['server_name', 'mode'])
+cache_evictions_counter = Counter('fibonacci_cache_evictions_total', 'Total number of values evicted from the Fibonacci cache', ['server_name', 'mode'])
+admission_rejected_counter = Counter('grpc_admission_rejected_total', 'Total number of gRPC requests rejected by admission control', ['method', 'reason', 'server_name', 'mode'])
+coalesced_counter = Counter('fibonacci_coalesced_requests_total', 'Total number of Fibonacci requests that waited for an identical in-flight computation', ['server_name', 'mode'])
+abandoned_counter = Counter('fibonacci_abandoned_total', 'Total number of Fibonacci computations or responses abandoned because the caller was gone', ['method', 'stage', 'server_name', 'mode'])
 
 class FibonacciService(fibonacci_pb2_grpc.FibonacciServiceServicer):
     """
     A gRPC service class that implements the Fibonacci service.
 
-    This class handles two types of requests:
+    This class handles six types of requests:
     - `Increment`: Increments a counter and returns the current value.
+    - `IncrementBy`: Reserves several consecutive counter values at once.
     - `Fibonacci`: Calculates the Fibonacci number for a given input `n`.
+    - `FibonacciBatch`: Calculates the Fibonacci numbers for several inputs `n` in one sweep.
+    - `FibonacciRange`: Streams the Fibonacci numbers for a contiguous range of inputs `n`.
+    - `FibonacciStream`: Answers a bidirectional stream of Fibonacci requests, matched by correlation ID.
 
     Attributes:
-    counter (int): A counter used in the `Increment` method to track the number of requests.
+    counter (ShardedCounter): The counter used by the `Increment` and `IncrementBy` methods.
     logger: A logger for logging information about requests and server status.
     server_name (str): The name of the server, used in responses and logging.
     mode (str): The mode of the server, used in responses and logging.
+    cache (FibonacciCache): The memory-bounded cache of Fibonacci results and checkpoint pairs.
+    dispatcher (FibonacciDispatcher): Runs cache misses inline, on a thread pool or on a process pool depending on `n`.
+    admission (AdmissionController): Bounds concurrent RPCs, queued RPCs and the estimated work in flight.
+    retry_after_ms (int): The retry-after hint sent with rejected RPCs.
+    single_flight (SingleFlight): Coalesces concurrent cache misses for the same `n` into one computation.
+    request_logs (dict): The RequestLogSampler of every method, which samples its per-request log lines and logs periodic summaries.
 
     Methods:
     Increment(request, context): Handles Increment requests and returns the current counter value.
+    IncrementBy(request, context): Handles IncrementBy requests and returns the range of reserved counter values.
     Fibonacci(request, context): Handles Fibonacci requests and returns the Fibonacci value for the given input `n`.
+    FibonacciBatch(request, context): Handles FibonacciBatch requests and returns the Fibonacci values for the given inputs `n`.
+    FibonacciRange(request, context): Handles FibonacciRange requests and streams the Fibonacci values for the given range.
+    FibonacciStream(request_iterator, context): Handles FibonacciStream requests and streams one response per request.
     serve(): Starts the gRPC server and the Prometheus metrics server.
     """
 
-    def __init__(self):
+    def __init__(self, process_index=None):
         """
         Initializes the Fibonacci service.
 
-        Initializes the logger, counter, server name, and mode.
+        Initializes the logger, counter, server name, mode, result cache, dispatcher, admission control, and single-flight group.
+
+        Parameters:
+        process_index (int): The index of this process in `PROCESSES` mode, appended to the server name, or None.
         """
-        self.counter = 0
         self.logger = get_logger(__name__, log_level="INFO")
         self.server_name = os.environ.get('POD_NAME', "server")
+        if process_index is not None:
+            self.server_name = f"{self.server_name}-{process_index}"
         self.mode = os.environ.get('MODE', "Normal")
+        self.grpc_port = int(os.environ.get('GRPC_PORT', 50051))
+        self.metrics_port = int(os.environ.get('METRICS_PORT', 8000))
         self.workers = int(os.environ.get('WORKERS', 1))
+        self.counter = ShardedCounter(shards=int(os.environ.get('COUNTER_SHARDS', self.workers)))
+        self.cache = FibonacciCache(
+            max_bytes=int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+            checkpoint_interval=int(os.environ.get('CACHE_CHECKPOINT_INTERVAL', 256)),
+            checkpoint_max_bytes=int(os.environ.get('CACHE_CHECKPOINT_MAX_BYTES', 16 * 1024 * 1024)),
+        )
+        self.dispatcher = FibonacciDispatcher(
+            inline_max_n=int(os.environ.get('DISPATCH_INLINE_MAX_N', 4096)),
+            thread_max_n=int(os.environ.get('DISPATCH_THREAD_MAX_N', 65536)),
+            threads=int(os.environ.get('DISPATCH_THREADS', self.workers)),
+            processes=int(os.environ.get('DISPATCH_PROCESSES', min(self.workers, os.cpu_count() or 1))),
+            check_interval=int(os.environ.get('CANCELLATION_CHECK_INTERVAL_MS', 50)) / 1000,
+            server_name=self.server_name,
+            mode=self.mode,
+        )
+        self.admission = AdmissionController(
+            # The work is CPU-bound, far more concurrent RPCs than cores only add contention
+            max_concurrent=int(os.environ.get('ADMISSION_MAX_CONCURRENT', 4 * (os.cpu_count() or 1))),
+            max_queue=int(os.environ.get('ADMISSION_MAX_QUEUE', 100)),
+            max_work=int(os.environ.get('ADMISSION_MAX_WORK', 0)),
+            queue_timeout=int(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', 1000)) / 1000,
+        )
+        self.retry_after_ms = int(os.environ.get('ADMISSION_RETRY_AFTER_MS', 100))
+        self.single_flight = SingleFlight(check_interval=self.dispatcher.check_interval)
+        self.request_logs = {method: RequestLogSampler(self.logger, method) for method in (
+            'Increment', 'IncrementBy', 'Fibonacci', 'FibonacciBatch', 'FibonacciRange', 'FibonacciStream',
+        )}
+
+    def _store_fibonacci(self, n, pair):
+        """
+        Offers a computed pair to the cache as a checkpoint and caches its value.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        pair (tuple): The Fibonacci values F(n) and F(n + 1).
+
+        Returns:
+        int: The Fibonacci value F(n).
+        """
+        self.cache.add_checkpoint(n, pair)
+        evicted = self.cache.put(n, pair[0])
+        if evicted:
+            cache_evictions_counter.labels(server_name=self.server_name, mode=self.mode).inc(evicted)
+        return pair[0]
+
+    def _compute_fibonacci(self, n, token):
+        """
+        Calculates F(n) on a cache miss, starting from the nearest checkpoint pair.
+
+        The computation runs on the dispatcher tier chosen for `n` and stops early once every RPC waiting for it is gone.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        token (CancellationToken): The cancellation check of the RPCs waiting for the value.
+
+        Returns:
+        int: The calculated Fibonacci value.
+        """
+        cache_misses_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+        k, pair = self.cache.nearest_checkpoint(n)
+        pair = self.dispatcher.run(n, fibonacci_pair_from, k, pair, n, check=token)
+        return self._store_fibonacci(n, pair)
+
+    def _fibonacci(self, n, context):
+        """
+        Returns F(n) from the cache or calculates it on a miss.
+
+        Concurrent misses for the same `n` share a single computation.
+
+        Parameters:
+        n (int): The Fibonacci position.
+        context: The gRPC context of the RPC waiting for the value.
+
+        Returns:
+        int: The Fibonacci value.
+
+        Raises:
+        ComputationAbandoned: If every RPC waiting for the value is gone.
+        """
+        result = self.cache.get(n)
+        if result is not None:
+            cache_hits_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+            return result
+        result, shared = self.single_flight.do(n, self._compute_fibonacci, n, time_remaining=context.time_remaining(), is_active=context.is_active)
+        if shared:
+            coalesced_counter.labels(server_name=self.server_name, mode=self.mode).inc()
+        return result
+
+    def _fibonacci_many(self, ns, context):
+        """
+        Returns F(n) for several sorted, distinct positions.
+
+        Cached values are reused and all misses are calculated in a single forward sweep that
+        starts at the checkpoint nearest to the smallest miss, on the dispatcher tier chosen for
+        the largest one.
+
+        Parameters:
+        ns (list): The Fibonacci positions in ascending order, without duplicates.
+        context: The gRPC context of the RPC waiting for the values.
+
+        Returns:
+        dict: The Fibonacci values keyed by position.
+
+        Raises:
+        ComputationAbandoned: If the RPC is gone before the sweep finished.
+        """
+        results = {}
+        misses = []
+        for n in ns:
+            result = self.cache.get(n)
+            if result is None:
+                misses.append(n)
+            else:
+                results[n] = result
+        cache_hits_counter.labels(server_name=self.server_name, mode=self.mode).inc(len(ns) - len(misses))
+        if misses:
+            cache_misses_counter.labels(server_name=self.server_name, mode=self.mode).inc(len(misses))
+            k, pair = self.cache.nearest_checkpoint(misses[0])
+            token = CancellationToken()
+            token.join(context.time_remaining(), context.is_active)
+            pairs = self.dispatcher.run(misses[-1], fibonacci_sweep, k, pair, misses, check=token)
+            for n, pair in zip(misses, pairs):
+                results[n] = self._store_fibonacci(n, pair)
+        return results
+
+    def _reject(self, context, method, rejection):
+        """
+        Counts an RPC rejected by admission control and fails it fast.
+
+        The RPC is aborted with `RESOURCE_EXHAUSTED` and a `retry-after-ms` hint in the trailing metadata,
+        repeated as `grpc-retry-pushback-ms` for clients retrying through gRPC's retry policy.
+
+        Parameters:
+        context: The gRPC context.
+        method (str): The name of the rejected method.
+        rejection (AdmissionRejected): The rejection raised by admission control.
+        """
+        admission_rejected_counter.labels(method=method, reason=rejection.reason, server_name=self.server_name, mode=self.mode).inc()
+        # grpc-retry-pushback-ms makes gRPC's own retries (retryPolicy of the client's service config) wait as long
+        context.set_trailing_metadata((('retry-after-ms', str(self.retry_after_ms)), ('grpc-retry-pushback-ms', str(self.retry_after_ms))))
+        context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, str(rejection))
+
+    def _abandon(self, context, method, stage):
+        """
+        Counts work abandoned because the caller is gone and ends the RPC without a response.
+
+        Parameters:
+        context: The gRPC context.
+        method (str): The name of the method.
+        stage (str): `compute` if the computation stopped early, `response` if a finished result was not encoded.
+        """
+        abandoned_counter.labels(method=method, stage=stage, server_name=self.server_name, mode=self.mode).inc()
+        context.abort(grpc.StatusCode.CANCELLED, "Caller is gone, work abandoned")
+
+    def _encode_value(self, result, encoding):
+        """
+        Encodes a Fibonacci value in the encoding requested by the client.
+
+        Only `VALUE_ENCODING_DECIMAL` pays for the quadratic int-to-decimal conversion;
+        hex is linear and `VALUE_ENCODING_BYTES_LE` puts the raw little-endian bytes into `raw_value`.
+
+        Parameters:
+        result (int): The Fibonacci value.
+        encoding (fibonacci_pb2.ValueEncoding): The encoding requested by the client.
+
+        Returns:
+        dict: The `value` or `raw_value` field of a `FibonacciResponse` or `FibonacciValue`.
+
+        Raises:
+        ValueError: If the decimal value exceeds the interpreter's integer string conversion limit.
+        """
+        if encoding == fibonacci_pb2.VALUE_ENCODING_BYTES_LE:
+            return {'raw_value': result.to_bytes((result.bit_length() + 7) // 8, 'little')}
+        if encoding == fibonacci_pb2.VALUE_ENCODING_HEX:
+            return {'value': format(result, 'x')}
+        return {'value': str(result)}
 
     def Increment(self, request, context):
         """
         Handles Increment requests.
 
-        Increments the internal counter and returns the new counter value.
+        Increments the sharded counter and returns the new counter value.
 
         Parameters:
         request (fibonacci_pb2.IncrementRequest): The gRPC request object containing the client name.
@@ -52,64 +264,217 @@ class FibonacciService(fibonacci_pb2_grpc.FibonacciServiceServicer):
         Returns:
         fibonacci_pb2.IncrementResponse: The response containing the new counter value and the server name.
         """
-        request_counter.labels(method='Increment', server_name=self.server_name, mode=self.mode).inc()
+        start = time.perf_counter()
+        _, number = self.counter.add()
+        if self.request_logs['Increment'].observe(start):
+            self.logger.info("Server: %s Answered to client %s with number %s", self.server_name, request.name, number)
+        return fibonacci_pb2.IncrementResponse(number=number, server_name=self.server_name)
 
-        self.counter += 1
-        self.logger.info(f"Server: {self.server_name} Answered to client {request.name} with number {self.counter}")
-        return fibonacci_pb2.IncrementResponse(number=self.counter, server_name=self.server_name)
+    def IncrementBy(self, request, context):
+        """
+        Handles IncrementBy requests.
+
+        Reserves `delta` consecutive counter values in one call; a `delta` of 0 is rejected with `INVALID_ARGUMENT`.
+
+        Parameters:
+        request (fibonacci_pb2.IncrementByRequest): The gRPC request object containing the client name and `delta`.
+        context: The gRPC context.
+
+        Returns:
+        fibonacci_pb2.IncrementByResponse: The response containing the first and last reserved value and the server name.
+        """
+        start = time.perf_counter()
+        if request.delta <= 0:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT, "delta must be at least 1")
+        first, last = self.counter.add(request.delta)
+        if self.request_logs['IncrementBy'].observe(start):
+            self.logger.info("Server: %s Answered to client %s with numbers %s..%s", self.server_name, request.name, first, last)
+        return fibonacci_pb2.IncrementByResponse(first=first, last=last, server_name=self.server_name)
 
     def Fibonacci(self, request, context):
         """
         Handles Fibonacci requests.
 
-        Calculates the Fibonacci number for the given input `n`.
+        Returns the Fibonacci number for the given input `n`, served from the cache when possible.
+        The request is subject to admission control with `n` as its estimated work. The computation
+        stops early once the caller cancels or its deadline expires, and no response is encoded for
+        a caller that is already gone.
 
         Parameters:
         request (fibonacci_pb2.FibonacciRequest): The gRPC request object containing the Fibonacci position `n`.
         context: The gRPC context.
 
         Returns:
-        fibonacci_pb2.FibonacciResponse: The response containing the calculated Fibonacci value and the server name.
+        fibonacci_pb2.FibonacciResponse: The response containing the calculated Fibonacci value, in the requested encoding, and the server name.
         """
-        request_counter.labels(method='Fibonacci', server_name=self.server_name, mode=self.mode).inc()
+        start = time.perf_counter()
+        try:
+            with self.admission.admit(request.n, context.time_remaining()):
+                result = self._fibonacci(request.n, context)
+        except AdmissionRejected as rejection:
+            self._reject(context, 'Fibonacci', rejection)
+        except ComputationAbandoned:
+            self._abandon(context, 'Fibonacci', 'compute')
+        if not context.is_active():
+            self._abandon(context, 'Fibonacci', 'response')
+        self.logger.debug("Server: %s Answered to client with Fibonacci(%s) = %x", self.server_name, request.n, result)
+        if self.request_logs['Fibonacci'].observe(start, request.n):
+            self.logger.info("Server: %s Answered to client with Fibonacci(%s)", self.server_name, request.n)
 
-        def fibonacci(n):
-            """
-            Calculates the Fibonacci number for a given input `n`.
+        try:
+            return fibonacci_pb2.FibonacciResponse(server_name=self.server_name, **self._encode_value(result, request.encoding))
+        except ValueError as error:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
 
-            Parameters:
-            n (int): The Fibonacci position.
+    def FibonacciBatch(self, request, context):
+        """
+        Handles FibonacciBatch requests.
 
-            Returns:
-            int: The calculated Fibonacci value.
-            """
-            a, b = 0, 1
-            for _ in range(n):
-                a, b = b, a + b
-            return a
+        De-duplicates and sorts the requested positions, then calculates all of them in one forward sweep
+        that stops early once the caller cancels or its deadline expires.
 
-        result = fibonacci(request.n)
-        self.logger.debug(f"Server: {self.server_name} Answered to client with Fibonacci({request.n}) = {result}")
-        self.logger.info(f"Server: {self.server_name} Answered to client with Fibonacci({request.n})")
+        Parameters:
+        request (fibonacci_pb2.FibonacciBatchRequest): The gRPC request object containing the Fibonacci positions `n`.
+        context: The gRPC context.
 
+        Returns:
+        fibonacci_pb2.FibonacciBatchResponse: The response containing one value per distinct position, in ascending order, and the server name.
+        """
+        start = time.perf_counter()
+        ns = sorted(set(request.n))
+        try:
+            with self.admission.admit(max(ns, default=0) + len(ns), context.time_remaining()):
+                results = self._fibonacci_many(ns, context)
+        except AdmissionRejected as rejection:
+            self._reject(context, 'FibonacciBatch', rejection)
+        except ComputationAbandoned:
+            self._abandon(context, 'FibonacciBatch', 'compute')
+        if not context.is_active():
+            self._abandon(context, 'FibonacciBatch', 'response')
+        if self.request_logs['FibonacciBatch'].observe(start):
+            self.logger.info("Server: %s Answered to client with %s Fibonacci values for %s positions", self.server_name, len(ns), len(request.n))
+
+        try:
+            values = [fibonacci_pb2.FibonacciValue(n=n, **self._encode_value(results[n], request.encoding)) for n in ns]
+        except ValueError as error:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        return fibonacci_pb2.FibonacciBatchResponse(values=values, server_name=self.server_name)
+
+    def FibonacciRange(self, request, context):
+        """
+        Handles FibonacciRange requests with a generator.
+
+        Streams F(n) for every n from `start` to `end` (inclusive) in steps of `step` (0 means 1).
+        Each value is advanced from the previous one only when gRPC asks for the next message,
+        so flow control paces the computation and memory stays flat. Calculating the first value
+        is subject to admission control with `start` plus `step` as its estimated work; the slot
+        is released before streaming, so a slow reader does not hold it for the whole range.
+
+        Parameters:
+        request (fibonacci_pb2.FibonacciRangeRequest): The gRPC request object containing the range.
+        context: The gRPC context.
+
+        Yields:
+        fibonacci_pb2.FibonacciValue: One message per position in the range.
+        """
+        start = time.perf_counter()
+        step = request.step or 1
+        k, pair = self.cache.nearest_checkpoint(request.start)
+        token = CancellationToken()
+        token.join(context.time_remaining(), context.is_active)
+        values = fibonacci_range(k, pair, request.start, request.end, step, token)
+        try:
+            # The first value includes the jump to `start` and F(step), the later ones are paced by the reader
+            with self.admission.admit(request.start + step, context.time_remaining()):
+                value = next(values, None)
+            # Sent once admitted, so gRPC can still retry a rejected range
+            context.send_initial_metadata((('server-name', self.server_name),))
+            while value is not None:
+                n, result = value
+                yield fibonacci_pb2.FibonacciValue(n=n, **self._encode_value(result, request.encoding))
+                value = next(values, None)
+        except AdmissionRejected as rejection:
+            self._reject(context, 'FibonacciRange', rejection)
+        except ValueError as error:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        except ComputationAbandoned:
+            self._abandon(context, 'FibonacciRange', 'compute')
+
+        if self.request_logs['FibonacciRange'].observe(start):
+            self.logger.info("Server: %s Streamed Fibonacci(%s..%s, step %s) to client", self.server_name, request.start, request.end, step)
 
-        return fibonacci_pb2.FibonacciResponse(value=str(result), server_name=self.server_name)
+    def FibonacciStream(self, request_iterator, context):
+        """
+        Handles FibonacciStream requests.
+
+        The client can keep many requests in flight on one stream; they are answered in arrival
+        order on the handler thread, and every response carries the request `id` for correlation.
+        Every request is subject to admission control with its `n` as the estimated work, and a
+        rejected request ends the stream.
+
+        Parameters:
+        request_iterator: The iterator of fibonacci_pb2.FibonacciStreamRequest messages.
+        context: The gRPC context.
 
-    def serve(self):
+        Yields:
+        fibonacci_pb2.FibonacciStreamResponse: One response per request.
+        """
+        start = time.perf_counter()
+        context.send_initial_metadata((('server-name', self.server_name),))
+
+        count = 0
+        try:
+            for request in request_iterator:
+                with self.admission.admit(request.n, context.time_remaining()):
+                    result = self._fibonacci(request.n, context)
+                count += 1
+                yield fibonacci_pb2.FibonacciStreamResponse(id=request.id, n=request.n, **self._encode_value(result, request.encoding))
+        except AdmissionRejected as rejection:
+            self._reject(context, 'FibonacciStream', rejection)
+        except ValueError as error:
+            context.abort(grpc.StatusCode.OUT_OF_RANGE, f"{error}, request a hex or bytes encoding instead")
+        except ComputationAbandoned:
+            self._abandon(context, 'FibonacciStream', 'compute')
+
+        if self.request_logs['FibonacciStream'].observe(start):
+            self.logger.info("Server: %s Answered to client with %s Fibonacci values over a stream", self.server_name, count)
+
+    def serve(self, start_metrics=True):
         """
         Starts the gRPC server and the Prometheus metrics server.
 
-        The gRPC server listens on `0.0.0.0:50051`, and the Prometheus metrics server listens on `0.0.0.0:8000`.
+        The gRPC server listens on `0.0.0.0:GRPC_PORT` (default 50051) with `SO_REUSEPORT`, so several
+        server processes can share the port, and the Prometheus metrics server listens on
+        `0.0.0.0:METRICS_PORT` (default 8000). Client connections are limited in age and idle time
+        by the `GRPC_MAX_CONNECTION_*` environment variables, see `connection_options`. Response
+        compression is set by the `GRPC_COMPRESSION*` environment variables, see `CompressionInterceptor`.
+
+        Parameters:
+        start_metrics (bool): Whether to start the metrics server, False when the parent process serves the metrics of all processes.
         """
-        server = grpc.server(futures.ThreadPoolExecutor(max_workers=self.workers))
-        fibonacci_pb2_grpc.add_FibonacciServiceServicer_to_server(FibonacciService(), server)
-        server_address = '0.0.0.0:50051'
+        self.dispatcher.start()
+        # Queued RPCs wait for admission on their own handler thread, anything beyond that is rejected by grpc itself
+        max_rpcs = self.admission.max_concurrent + self.admission.max_queue
+        # Responses above GRPC_COMPRESSION_MIN_BYTES are compressed with GRPC_COMPRESSION, if set
+        compression = CompressionInterceptor(self.server_name, self.mode)
+        server = grpc.server(
+            futures.ThreadPoolExecutor(max_workers=max(self.workers, max_rpcs)),
+            maximum_concurrent_rpcs=max_rpcs,
+            options=[('grpc.so_reuseport', 1), *connection_options()],
+            interceptors=[MetricsInterceptor(self.server_name, self.mode), *([compression] if compression.enabled else [])],
+        )
+        fibonacci_pb2_grpc.add_FibonacciServiceServicer_to_server(self, server)
+        server_address = f'0.0.0.0:{self.grpc_port}'
         server.add_insecure_port(server_address)
         server.start()
-        self.logger.info(f"Server started on {server_address}")
+        self.logger.info("Server %s started on %s", self.server_name, server_address)
 
-        metrics_address = '0.0.0.0:8000'
-        start_http_server(8000)
-        self.logger.info(f"Metrics server started on {metrics_address}")
+        if start_metrics:
+            metrics_address = f'0.0.0.0:{self.metrics_port}'
+            start_http_server(self.metrics_port)
+            self.logger.info("Metrics server started on %s", metrics_address)
 
-        server.wait_for_termination()
+        try:
+            server.wait_for_termination()
+        finally:
+            self.dispatcher.shutdown()
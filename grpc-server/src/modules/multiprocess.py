@@ -0,0 +1,92 @@
+import os
+import shutil
+import signal
+import tempfile
+import multiprocessing
+import multiprocessing.connection
+from modules.logger import get_logger
+
+logger = get_logger(__name__, log_level="INFO")
+
+
+def prepare_metrics_dir():
+    """
+    Points prometheus_client at an empty multiprocess metrics directory.
+
+    Must run before the server processes are spawned. prometheus_client chooses the value class
+    of every metric when it is imported, and the spawned processes import it afresh with the
+    variable set. The calling process has already imported it through `modules.logger`, so its
+    own metrics stay in memory and are not aggregated. The directory is
+    `PROMETHEUS_MULTIPROC_DIR` if set, otherwise a new temporary one.
+
+    Returns:
+    str: The metrics directory.
+    """
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR') or tempfile.mkdtemp(prefix='prometheus-multiproc-')
+    # Files left by a previous run would be aggregated as if their processes were still alive
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = path
+    return path
+
+
+def serve_processes(processes, target):
+    """
+    Runs `processes` gRPC server processes and serves their aggregated metrics.
+
+    Every child calls `target(process_index, False)`, binds the gRPC port itself with
+    `grpc.so_reuseport` so the kernel spreads connections across them, and skips its own
+    metrics server. The parent serves all processes' metrics on `0.0.0.0:METRICS_PORT` through
+    prometheus_client's multiprocess collector, and forwards SIGUSR1 and SIGUSR2 (log level
+    changes) to the children. Children are started with `spawn`, so none of them inherits
+    gRPC state. If one child exits, the others are stopped as well so the pod can be
+    restarted as a whole.
+
+    Parameters:
+    processes (int): The number of server processes.
+    target (callable): The module-level function running one server process.
+    """
+    metrics_dir = prepare_metrics_dir()
+    grpc_port = int(os.environ.get('GRPC_PORT', 50051))
+    metrics_port = int(os.environ.get('METRICS_PORT', 8000))
+    from prometheus_client import CollectorRegistry, start_http_server, multiprocess
+
+    context = multiprocessing.get_context('spawn')
+    children = [context.Process(target=target, args=(index, False), name=f'grpc-server-{index}') for index in range(processes)]
+    for child in children:
+        child.start()
+    logger.info("Started %s gRPC server processes sharing port %s", processes, grpc_port)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(metrics_port, registry=registry)
+    logger.info("Metrics server for %s processes started on 0.0.0.0:%s", processes, metrics_port)
+
+    def stop(signum, frame):
+        for child in children:
+            child.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    def forward(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signum)
+
+    # Log level changes apply to every server process
+    signal.signal(signal.SIGUSR1, forward)
+    signal.signal(signal.SIGUSR2, forward)
+
+    try:
+        alive = list(children)
+        while alive:
+            for sentinel in multiprocessing.connection.wait([child.sentinel for child in alive]):
+                child = next(child for child in alive if child.sentinel == sentinel)
+                child.join()
+                alive.remove(child)
+                multiprocess.mark_process_dead(child.pid)
+                logger.info("gRPC server process %s exited with code %s", child.name, child.exitcode)
+                stop(None, None)
+    finally:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -14,21 +14,39 @@ _sym_db = _symbol_database.Default()
 
 
 
-DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15proto/fibonacci.proto\x12\tfibonacci\" \n\x10IncrementRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\"8\n\x11IncrementResponse\x12\x0e\n\x06number\x18\x01 \x01(\r\x12\x13\n\x0bserver_name\x18\x02 \x01(\t\"\x1d\n\x10\x46ibonacciRequest\x12\t\n\x01n\x18\x01 \x01(\r\"7\n\x11\x46ibonacciResponse\x12\r\n\x05value\x18\x01 \x01(\t\x12\x13\n\x0bserver_name\x18\x02 \x01(\t2\xa2\x01\n\x10\x46ibonacciService\x12\x46\n\tIncrement\x12\x1b.fibonacci.IncrementRequest\x1a\x1c.fibonacci.IncrementResponse\x12\x46\n\tFibonacci\x12\x1b.fibonacci.FibonacciRequest\x1a\x1c.fibonacci.FibonacciResponseb\x06proto3')
+DESCRIPTOR = _descriptor_pool.Default().AddSerializedFile(b'\n\x15proto/fibonacci.proto\x12\tfibonacci\" \n\x10IncrementRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\"8\n\x11IncrementResponse\x12\x0e\n\x06number\x18\x01 \x01(\r\x12\x13\n\x0bserver_name\x18\x02 \x01(\t\"1\n\x12IncrementByRequest\x12\x0c\n\x04name\x18\x01 \x01(\t\x12\r\n\x05\x64\x65lta\x18\x02 \x01(\r\"G\n\x13IncrementByResponse\x12\r\n\x05\x66irst\x18\x01 \x01(\r\x12\x0c\n\x04last\x18\x02 \x01(\r\x12\x13\n\x0bserver_name\x18\x03 \x01(\t\"I\n\x10\x46ibonacciRequest\x12\t\n\x01n\x18\x01 \x01(\r\x12*\n\x08\x65ncoding\x18\x02 \x01(\x0e\x32\x18.fibonacci.ValueEncoding\"]\n\x11\x46ibonacciResponse\x12\r\n\x05value\x18\x01 \x01(\t\x12\x13\n\x0bserver_name\x18\x02 \x01(\t\x12\x16\n\traw_value\x18\x03 \x01(\x0cH\x00\x88\x01\x01\x42\x0c\n\n_raw_value\"N\n\x15\x46ibonacciBatchRequest\x12\t\n\x01n\x18\x01 \x03(\r\x12*\n\x08\x65ncoding\x18\x02 \x01(\x0e\x32\x18.fibonacci.ValueEncoding\"P\n\x0e\x46ibonacciValue\x12\t\n\x01n\x18\x01 \x01(\r\x12\r\n\x05value\x18\x02 \x01(\t\x12\x16\n\traw_value\x18\x03 \x01(\x0cH\x00\x88\x01\x01\x42\x0c\n\n_raw_value\"X\n\x16\x46ibonacciBatchResponse\x12)\n\x06values\x18\x01 \x03(\x0b\x32\x19.fibonacci.FibonacciValue\x12\x13\n\x0bserver_name\x18\x02 \x01(\t\"m\n\x15\x46ibonacciRangeRequest\x12\r\n\x05start\x18\x01 \x01(\r\x12\x0b\n\x03\x65nd\x18\x02 \x01(\r\x12\x0c\n\x04step\x18\x03 \x01(\r\x12*\n\x08\x65ncoding\x18\x04 \x01(\x0e\x32\x18.fibonacci.ValueEncoding\"[\n\x16\x46ibonacciStreamRequest\x12\n\n\x02id\x18\x01 \x01(\x04\x12\t\n\x01n\x18\x02 \x01(\r\x12*\n\x08\x65ncoding\x18\x03 \x01(\x0e\x32\x18.fibonacci.ValueEncoding\"e\n\x17\x46ibonacciStreamResponse\x12\n\n\x02id\x18\x01 \x01(\x04\x12\t\n\x01n\x18\x02 \x01(\r\x12\r\n\x05value\x18\x03 \x01(\t\x12\x16\n\traw_value\x18\x04 \x01(\x0cH\x00\x88\x01\x01\x42\x0c\n\n_raw_value*`\n\rValueEncoding\x12\x1a\n\x16VALUE_ENCODING_DECIMAL\x10\x00\x12\x16\n\x12VALUE_ENCODING_HEX\x10\x01\x12\x1b\n\x17VALUE_ENCODING_BYTES_LE\x10\x02\x32\xf6\x03\n\x10\x46ibonacciService\x12\x46\n\tIncrement\x12\x1b.fibonacci.IncrementRequest\x1a\x1c.fibonacci.IncrementResponse\x12L\n\x0bIncrementBy\x12\x1d.fibonacci.IncrementByRequest\x1a\x1e.fibonacci.IncrementByResponse\x12\x46\n\tFibonacci\x12\x1b.fibonacci.FibonacciRequest\x1a\x1c.fibonacci.FibonacciResponse\x12U\n\x0e\x46ibonacciBatch\x12 .fibonacci.FibonacciBatchRequest\x1a!.fibonacci.FibonacciBatchResponse\x12O\n\x0e\x46ibonacciRange\x12 .fibonacci.FibonacciRangeRequest\x1a\x19.fibonacci.FibonacciValue0\x01\x12\\\n\x0f\x46ibonacciStream\x12!.fibonacci.FibonacciStreamRequest\x1a\".fibonacci.FibonacciStreamResponse(\x01\x30\x01\x62\x06proto3')
 
 _globals = globals()
 _builder.BuildMessageAndEnumDescriptors(DESCRIPTOR, _globals)
 _builder.BuildTopDescriptorsAndMessages(DESCRIPTOR, 'proto.fibonacci_pb2', _globals)
 if _descriptor._USE_C_DESCRIPTORS == False:
   DESCRIPTOR._options = None
+  _globals['_VALUEENCODING']._serialized_start=981
+  _globals['_VALUEENCODING']._serialized_end=1077
   _globals['_INCREMENTREQUEST']._serialized_start=36
   _globals['_INCREMENTREQUEST']._serialized_end=68
   _globals['_INCREMENTRESPONSE']._serialized_start=70
   _globals['_INCREMENTRESPONSE']._serialized_end=126
-  _globals['_FIBONACCIREQUEST']._serialized_start=128
-  _globals['_FIBONACCIREQUEST']._serialized_end=157
-  _globals['_FIBONACCIRESPONSE']._serialized_start=159
-  _globals['_FIBONACCIRESPONSE']._serialized_end=214
-  _globals['_FIBONACCISERVICE']._serialized_start=217
-  _globals['_FIBONACCISERVICE']._serialized_end=379
+  _globals['_INCREMENTBYREQUEST']._serialized_start=128
+  _globals['_INCREMENTBYREQUEST']._serialized_end=177
+  _globals['_INCREMENTBYRESPONSE']._serialized_start=179
+  _globals['_INCREMENTBYRESPONSE']._serialized_end=250
+  _globals['_FIBONACCIREQUEST']._serialized_start=252
+  _globals['_FIBONACCIREQUEST']._serialized_end=325
+  _globals['_FIBONACCIRESPONSE']._serialized_start=327
+  _globals['_FIBONACCIRESPONSE']._serialized_end=420
+  _globals['_FIBONACCIBATCHREQUEST']._serialized_start=422
+  _globals['_FIBONACCIBATCHREQUEST']._serialized_end=500
+  _globals['_FIBONACCIVALUE']._serialized_start=502
+  _globals['_FIBONACCIVALUE']._serialized_end=582
+  _globals['_FIBONACCIBATCHRESPONSE']._serialized_start=584
+  _globals['_FIBONACCIBATCHRESPONSE']._serialized_end=672
+  _globals['_FIBONACCIRANGEREQUEST']._serialized_start=674
+  _globals['_FIBONACCIRANGEREQUEST']._serialized_end=783
+  _globals['_FIBONACCISTREAMREQUEST']._serialized_start=785
+  _globals['_FIBONACCISTREAMREQUEST']._serialized_end=876
+  _globals['_FIBONACCISTREAMRESPONSE']._serialized_start=878
+  _globals['_FIBONACCISTREAMRESPONSE']._serialized_end=979
+  _globals['_FIBONACCISERVICE']._serialized_start=1080
+  _globals['_FIBONACCISERVICE']._serialized_end=1582
 # @@protoc_insertion_point(module_scope)
@@ -0,0 +1,135 @@
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError
+from modules.cancellation import CancellationToken, ComputationAbandoned, Deadline
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key in a threaded server.
+
+    The first caller for a key runs the function; callers arriving while it is still running
+    wait for that result instead of computing it again. Every caller joins the call's
+    CancellationToken, so the call is only abandoned once all of them are gone. A waiting
+    caller checks every `check_interval` seconds whether it is still active and within its
+    deadline, and otherwise stops waiting, so it does not hold its thread until the call ends.
+
+    Attributes:
+    check_interval (float): How often in seconds a waiting caller checks whether it is gone.
+    """
+
+    def __init__(self, check_interval):
+        """
+        Initializes the single-flight group without calls in flight.
+
+        Parameters:
+        check_interval (float): How often in seconds a waiting caller checks whether it is gone.
+        """
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, time_remaining=None, is_active=None):
+        """
+        Runs `fn(*args, token)` unless a call for `key` is already in flight, in which case its result is shared.
+
+        Parameters:
+        key: The key identifying identical calls.
+        fn (callable): The function to run, it gets the call's CancellationToken as its last argument.
+        *args: The arguments of `fn`.
+        time_remaining (float): The time left until the caller's deadline, or None.
+        is_active (callable): Returns whether the caller is still waiting, or None.
+
+        Returns:
+        tuple: The result and whether it was shared from another caller.
+
+        Raises:
+        ComputationAbandoned: If the caller is gone while it waits for a shared call.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = (Future(), CancellationToken())
+            future, token = call
+            token.join(time_remaining, is_active)
+        if not leader:
+            return self._wait(future, time_remaining, is_active), True
+
+        try:
+            result = fn(*args, token)
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _wait(self, future, time_remaining, is_active):
+        # The call goes on for the other callers, the token notices this one is gone by itself
+        deadline = Deadline(None if time_remaining is None else time.time() + time_remaining)
+        while True:
+            try:
+                return future.result(timeout=self.check_interval)
+            except TimeoutError:
+                if is_active is not None and not is_active():
+                    raise ComputationAbandoned('cancelled')
+                deadline()
+
+
+class AsyncSingleFlight:
+    """
+    Coalesces concurrent calls for the same key on an asyncio event loop.
+
+    The first caller for a key starts the coroutine as a task; every caller, the first one
+    included, awaits that task through `asyncio.shield`, so a cancelled caller never cancels
+    the computation the others are waiting for. Once the last caller is cancelled, the task
+    is cancelled too and its CancellationToken stops any work offloaded to a pool. The key is
+    removed before the task is cancelled, so a caller arriving meanwhile starts a new call
+    instead of joining the cancelled one.
+    """
+
+    def __init__(self):
+        """
+        Initializes the single-flight group without calls in flight.
+        """
+        self._calls = {}
+
+    async def do(self, key, fn, *args, time_remaining=None):
+        """
+        Awaits `fn(*args, token)` unless a call for `key` is already in flight, in which case its result is shared.
+
+        Parameters:
+        key: The key identifying identical calls.
+        fn (callable): The coroutine function to run, it gets the call's CancellationToken as its last argument.
+        *args: The arguments of `fn`.
+        time_remaining (float): The time left until the caller's deadline, or None.
+
+        Returns:
+        tuple: The result and whether it was shared from another caller.
+        """
+        call = self._calls.get(key)
+        shared = call is not None
+        if not shared:
+            token = CancellationToken()
+            task = asyncio.ensure_future(fn(*args, token))
+            call = self._calls[key] = (task, token)
+            task.add_done_callback(lambda _: self._forget(key, call))
+        task, token = call
+        token.join(time_remaining)
+        try:
+            return await asyncio.shield(task), shared
+        except asyncio.CancelledError:
+            if token.leave():
+                self._forget(key, call)
+                task.cancel()
+            raise
+
+    def _forget(self, key, call):
+        # A newer call for the same key may already have taken its place
+        if self._calls.get(key) is call:
+            del self._calls[key]
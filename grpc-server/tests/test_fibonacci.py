@@ -0,0 +1,104 @@
+import pytest
+from modules.fibonacci import (
+    FAST_DOUBLING_THRESHOLD, fibonacci, fibonacci_pair, fibonacci_pair_from, fibonacci_sweep, fibonacci_advance, fibonacci_range,
+)
+
+SMALL_MAX = 2000
+LARGE = [10_000, 54_321, 100_003]
+# start, end (exclusive) and step of a range of large positions
+LARGE_RANGE = (10_000, 100_004, 22_501)
+
+
+def reference(limit):
+    """
+    Returns F(0) .. F(limit + 1) from the definition F(n + 2) = F(n + 1) + F(n).
+    """
+    values = [0, 1]
+    for _ in range(limit):
+        values.append(values[-1] + values[-2])
+    return values
+
+
+FIB = reference(SMALL_MAX)
+
+
+@pytest.fixture(scope='module')
+def large():
+    """
+    Returns (F(n), F(n + 1)) for the positions of `LARGE_RANGE` and `LARGE`, walked with the addition loop.
+    """
+    wanted = set(LARGE) | set(range(*LARGE_RANGE))
+    pairs = {}
+    a, b = 0, 1
+    for n in range(max(wanted) + 1):
+        if n in wanted:
+            pairs[n] = (a, b)
+        a, b = b, a + b
+    return pairs
+
+
+def test_fibonacci_small():
+    assert [fibonacci(n) for n in range(SMALL_MAX + 1)] == FIB[:SMALL_MAX + 1]
+
+
+def test_fibonacci_pair_small():
+    for n in range(SMALL_MAX):
+        assert fibonacci_pair(n) == (FIB[n], FIB[n + 1])
+
+
+def test_fibonacci_large(large):
+    for n, pair in large.items():
+        assert fibonacci(n) == pair[0]
+        assert fibonacci_pair(n) == pair
+
+
+@pytest.mark.parametrize('k', [0, 1, FAST_DOUBLING_THRESHOLD - 1, 256, 1000])
+def test_fibonacci_pair_from(k):
+    # Gaps below and above FAST_DOUBLING_THRESHOLD take different paths
+    for n in range(k, SMALL_MAX):
+        assert fibonacci_pair_from(k, (FIB[k], FIB[k + 1]), n) == (FIB[n], FIB[n + 1])
+
+
+def test_fibonacci_pair_from_large(large):
+    for n, pair in large.items():
+        assert fibonacci_pair_from(1000, (FIB[1000], FIB[1001]), n) == pair
+
+
+def test_fibonacci_sweep():
+    ns = [0, 3, 3, 23, 24, 25, 100, 512, 513, 1999]
+    assert fibonacci_sweep(0, (0, 1), ns) == [(FIB[n], FIB[n + 1]) for n in ns]
+
+
+def test_fibonacci_sweep_large(large):
+    assert fibonacci_sweep(0, (0, 1), LARGE) == [large[n] for n in LARGE]
+
+
+@pytest.mark.parametrize('step', [1, 2, FAST_DOUBLING_THRESHOLD - 1, FAST_DOUBLING_THRESHOLD, 97])
+def test_fibonacci_advance(step):
+    step_pair = (FIB[step], FIB[step + 1])
+    for n in range(0, SMALL_MAX - step, 7):
+        expected = (FIB[n + step], FIB[n + step + 1])
+        assert fibonacci_advance((FIB[n], FIB[n + 1]), step) == expected
+        assert fibonacci_advance((FIB[n], FIB[n + 1]), step, step_pair) == expected
+
+
+@pytest.mark.parametrize('start, end, step', [
+    (0, SMALL_MAX, 1),
+    (5, 1500, 3),
+    (100, SMALL_MAX, FAST_DOUBLING_THRESHOLD),
+    (7, SMALL_MAX, 333),
+    (1000, 1000, 1),
+    (10, 5, 1),
+])
+def test_fibonacci_range(start, end, step):
+    expected = [(n, FIB[n]) for n in range(start, end + 1, step)]
+    assert list(fibonacci_range(0, (0, 1), start, end, step)) == expected
+    # Starting from a checkpoint below `start`
+    k = start // 2
+    assert list(fibonacci_range(k, (FIB[k], FIB[k + 1]), start, end, step)) == expected
+
+
+def test_fibonacci_range_large(large):
+    start, end, step = LARGE_RANGE
+    expected = [(n, large[n][0]) for n in range(start, end, step)]
+    assert list(fibonacci_range(0, (0, 1), start, end - 1, step)) == expected
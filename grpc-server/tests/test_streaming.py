@@ -0,0 +1,85 @@
+import os
+import random
+import socket
+import subprocess
+import sys
+import grpc
+import pytest
+from modules.proto import fibonacci_pb2, fibonacci_pb2_grpc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RANGE_END = 3000
+
+
+def reference(limit):
+    """
+    Returns F(0) .. F(limit) from the definition F(n + 2) = F(n + 1) + F(n).
+    """
+    values = [0, 1]
+    for _ in range(limit - 1):
+        values.append(values[-1] + values[-2])
+    return values
+
+
+FIB = reference(RANGE_END)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def decode(message):
+    return int.from_bytes(message.raw_value, 'little')
+
+
+@pytest.fixture(scope='module', params=['grpc-server', 'grpc-server-async'])
+def stub(request):
+    """
+    Starts `main.py` of the sync or the async server on ephemeral ports and returns a stub connected to it.
+    """
+    port = free_port()
+    env = dict(os.environ, GRPC_PORT=str(port), METRICS_PORT=str(free_port()), POD_NAME='test-server', PROCESSES='1')
+    server = subprocess.Popen(
+        [sys.executable, 'main.py'], cwd=os.path.join(ROOT, request.param, 'src'), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    channel = grpc.insecure_channel(f'127.0.0.1:{port}')
+    try:
+        grpc.channel_ready_future(channel).result(timeout=30)
+        yield fibonacci_pb2_grpc.FibonacciServiceStub(channel)
+    finally:
+        channel.close()
+        server.terminate()
+        server.wait(timeout=30)
+
+
+@pytest.mark.parametrize('start, end, step', [(0, RANGE_END, 1), (17, RANGE_END, 29), (2500, 2500, 1), (10, 5, 1)])
+def test_fibonacci_range(stub, start, end, step):
+    call = stub.FibonacciRange(fibonacci_pb2.FibonacciRangeRequest(start=start, end=end, step=step, encoding=fibonacci_pb2.VALUE_ENCODING_BYTES_LE), timeout=30)
+    values = [(value.n, decode(value)) for value in call]
+    assert values == [(n, FIB[n]) for n in range(start, end + 1, step)]
+    assert dict(call.initial_metadata()).get('server-name') == 'test-server'
+
+
+def test_fibonacci_range_decimal(stub):
+    values = stub.FibonacciRange(fibonacci_pb2.FibonacciRangeRequest(start=0, end=100), timeout=30)
+    assert [(value.n, int(value.value)) for value in values] == [(n, FIB[n]) for n in range(101)]
+
+
+def test_fibonacci_stream(stub):
+    # Duplicate positions and an unordered mix of sizes, answered in any order and matched by id
+    positions = [random.Random(7).randint(0, RANGE_END) for _ in range(500)] + [0, 1, 1, RANGE_END]
+    requests = [fibonacci_pb2.FibonacciStreamRequest(id=i, n=n, encoding=fibonacci_pb2.VALUE_ENCODING_BYTES_LE) for i, n in enumerate(positions)]
+    responses = list(stub.FibonacciStream(iter(requests), timeout=30))
+    assert sorted(response.id for response in responses) == list(range(len(positions)))
+    for response in responses:
+        assert response.n == positions[response.id]
+        assert decode(response) == FIB[response.n]
+
+
+def test_fibonacci_stream_hex(stub):
+    requests = [fibonacci_pb2.FibonacciStreamRequest(id=n, n=n, encoding=fibonacci_pb2.VALUE_ENCODING_HEX) for n in range(0, RANGE_END, 97)]
+    responses = list(stub.FibonacciStream(iter(requests), timeout=30))
+    assert {response.n: int(response.value, 16) for response in responses} == {n: FIB[n] for n in range(0, RANGE_END, 97)}